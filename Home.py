@@ -1,5 +1,4 @@
 # Home.py
-import io
 import pandas as pd
 import streamlit as st
 import mysql.connector
@@ -7,6 +6,12 @@ import os
 from streamlit_player import st_player
 # style_metric_cards is not needed if style.css is handling it
 from streamlit_extras.add_vertical_space import add_vertical_space
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.data_version import load_data_version
+from utils.export import EXPORT_FORMATS, export_job, export_url
+from utils.jobs import JobRejected, show_job_progress, submit_job
+from utils.search import entity_search
 
 # --- Page Config ---
 st.set_page_config(
@@ -28,40 +33,13 @@ def load_css(file_name):
         st.error(f"CSS file '{file_name}' not found.")
 load_css("style.css") # Load custom CSS
 
-# --- NEW DB Credentials (using Streamlit Secrets) ---
-DB_HOST = st.secrets["database"]["host"]
-DB_PORT = st.secrets["database"]["port"]      # Added port
-DB_USER = st.secrets["database"]["user"]
-DB_PASSWORD = st.secrets["database"]["password"]
-DB_NAME = st.secrets["database"]["db_name"]
-DB_SSL_CA = st.secrets["database"]["ssl_ca"]  # Added SSL CA file
-
 # --- DB Fetch Function ---
 @st.cache_data(ttl=3600) # Cache data for 1 hour
 def fetch_data(query):
     try:
-        # This connection now includes port and SSL info
-        conn = mysql.connector.connect(
-            host=DB_HOST, 
-            port=DB_PORT,
-            user=DB_USER, 
-            password=DB_PASSWORD, 
-            database=DB_NAME,
-            ssl_ca=DB_SSL_CA,            # This is the new, critical part
-            ssl_verify_cert=True         # Force SSL verification
-        )
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        # Safe numeric conversion
-        for col in df.select_dtypes(include=['number']).columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        # Convert Pincode to string if exists
-        if 'Pincode' in df.columns:
-            df['Pincode'] = df['Pincode'].astype(str)
-        return df
-    
-    except mysql.connector.Error as err:
+        # Compact dtypes (categoricals, small ints, pyarrow Pincode strings)
+        return optimize_dtypes(run_query(query))
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
         # Show the error on the Streamlit app itself
         st.error(f"Database Error: {err}") 
         return pd.DataFrame() # Return empty on error
@@ -80,6 +58,7 @@ def format_number_cr(num):
 # --- === PAGE START === ---
 
 st.title(':violet[PhonePe Data Visualization]')
+entity_search()
 add_vertical_space(1)
 
 phonepe_description = """
@@ -150,39 +129,32 @@ if not df_selected.empty:
 
     with tab2:
         st.subheader(f"Download Full '{selected_display_name}' Data")
-        col_dl1_home, col_dl2_home, col_dl3_home = st.columns(3)
-
-        @st.cache_data(ttl=600)
-        def get_full_data(tbl_name):
-            with st.spinner(f"Fetching full data for {tbl_name}..."): # Add spinner for full download fetch
-                 return fetch_data(f"SELECT * FROM {tbl_name}")
-
-        # Add a button to trigger full data fetch and download preparation
-        if st.button(f"Prepare Full '{selected_display_name}' for Download", key=f"prep_{table_name}"):
-            df_full = get_full_data(table_name)
-            if not df_full.empty:
-                csv = df_full.to_csv(index=False).encode('utf-8')
-                json_data = df_full.to_json(orient='records').encode('utf-8')
-                excel_buffer = io.BytesIO()
-                with pd.ExcelWriter(excel_buffer, engine='xlsxwriter') as writer:
-                    df_full.to_excel(writer, index=False, sheet_name='Sheet1')
-                excel_bytes = excel_buffer.getvalue()
-
-                # Store prepared data in session state
-                st.session_state[f'csv_{table_name}'] = csv
-                st.session_state[f'json_{table_name}'] = json_data
-                st.session_state[f'excel_{table_name}'] = excel_bytes
-                st.success("Download files ready!")
+        col_fmt_home, col_prep_home, buff_dl_home = st.columns([1, 1, 2])
+        export_format = col_fmt_home.selectbox("Format", list(EXPORT_FORMATS), key=f'export_format_{table_name}')
+        export_key = f'export_{table_name}_{export_format}'
+
+        # Only the chosen format is written, streamed from the database in chunks to a file shared by all
+        # sessions (one per data version); the browser downloads it from static/ without going through memory.
+        # The export runs as a background job: sessions asking for the same file share one job, and only
+        # a few exports run at once (utils.jobs.JOB_LIMITS).
+        if col_prep_home.button(f"Prepare {export_format} Download", key=f"prep_{table_name}"):
+            data_version = load_data_version()
+            try:
+                st.session_state[export_key] = submit_job('export', (table_name, export_format, data_version),
+                                                          export_job, table_name, export_format, data_version)
+            except JobRejected as err:
+                st.warning(str(err))
+
+        export = st.session_state.get(export_key)
+        if export is not None:
+            if not export.finished:
+                show_job_progress(export, f"Exporting {selected_display_name} as {export_format}...")
+            elif export.status == 'failed':
+                st.error(f"Could not export data: {export.error}")
             else:
-                st.error("Could not fetch full data.")
-
-        # Display download buttons only if data is prepared
-        if f'csv_{table_name}' in st.session_state:
-            col_dl1_home.download_button(label="Download CSV", data=st.session_state[f'csv_{table_name}'], file_name=f'{selected_display_name}.csv', mime='text/csv', key=f'home_csv_dl_{table_name}')
-        if f'json_{table_name}' in st.session_state:
-            col_dl2_home.download_button(label="Download JSON", data=st.session_state[f'json_{table_name}'], file_name=f'{selected_display_name}.json', mime='application/json', key=f'home_json_dl_{table_name}')
-        if f'excel_{table_name}' in st.session_state:
-            col_dl3_home.download_button(label="Download Excel", data=st.session_state[f'excel_{table_name}'], file_name=f'{selected_display_name}.xlsx', mime='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', key=f'home_excel_dl_{table_name}')
+                extension = EXPORT_FORMATS[export_format][0]
+                st.markdown(f'<a href="{export_url(export.result)}" download="{selected_display_name}.{extension}">'
+                            f'Download {export_format} ({selected_display_name}.{extension})</a>', unsafe_allow_html=True)
 
 else:
     st.warning(f"Could not fetch sample data for table: {table_name}")
@@ -0,0 +1,2 @@
+# benchmarks/__init__.py
+"""Offline benchmarks; run from the repo root, e.g. `python -m benchmarks.bench_dtypes`."""
@@ -0,0 +1,48 @@
+# benchmarks/bench_anomalies.py
+"""Time of the anomaly stage (utils.anomalies.build_anomaly_rows) over the full map_* history.
+
+Needs the database configured in .streamlit/secrets.toml. The frames are read once; the scoring of every
+district x quarter x metric cell is timed at the real size and with the districts replicated SCALES times
+(as if the data had that many more districts), against SCORING_BUDGET_S. Queries are not timed.
+
+    python -m benchmarks.bench_anomalies
+"""
+import time
+import pandas as pd
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.anomalies import ANOMALY_METRICS, anomaly_query, build_anomaly_rows
+
+SCALES = (1, 10)
+SCORING_BUDGET_S = 1.0 # Every ingest runs the stage
+REPEATS = 5
+
+
+def _replicate(frame, times):
+    """The frame with its districts copied times over under new names."""
+    if times == 1:
+        return frame
+    frame = frame.astype({'District': str})
+    return pd.concat([frame.assign(District=frame['District'] + f" #{i}") for i in range(times)], ignore_index=True)
+
+
+def main():
+    tables = sorted({table for table, _, _ in ANOMALY_METRICS.values()})
+    frames = {table: optimize_dtypes(run_query(anomaly_query(table))) for table in tables}
+    print(f"{'scale':>6}{'cells':>12}{'best of ' + str(REPEATS):>12}{'cells/s':>14}{'anomalies':>11}")
+    for scale in SCALES:
+        scaled = {table: _replicate(frame, scale) for table, frame in frames.items()}
+        cells = sum(len(scaled[table]) for table, _, _ in ANOMALY_METRICS.values())
+        timings = []
+        for _ in range(REPEATS):
+            start = time.perf_counter()
+            anomalies = build_anomaly_rows(scaled)
+            timings.append(time.perf_counter() - start)
+        best = min(timings)
+        flag = "  OVER BUDGET" if best > SCORING_BUDGET_S else ""
+        print(f"{scale:>5}x{cells:>12,}{best * 1000:>10.0f}ms{cells / best:>14,.0f}{len(anomalies):>11,}{flag}")
+
+
+if __name__ == "__main__":
+    main()
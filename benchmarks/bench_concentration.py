@@ -0,0 +1,53 @@
+# benchmarks/bench_concentration.py
+"""The one-pass concentration measures (utils.concentration.concentration) against a per-group loop.
+
+Needs the database configured in .streamlit/secrets.toml. Each dataset's rows are read once; the pass over
+every State x Year x Quarter group is timed against sorting each group separately with pandas (what a page
+would do per selection, repeated for every state), best of REPEATS, and the Gini values are checked to agree.
+Queries are not timed.
+
+    python -m benchmarks.bench_concentration
+"""
+import time
+import numpy as np
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.concentration import CONCENTRATION_DATASETS, concentration, concentration_query
+
+REPEATS = 5
+
+
+def _gini(values):
+    x = np.sort(np.clip(values.to_numpy(dtype=float), 0, None))
+    n = len(x)
+    return (2 * np.arange(1, n + 1) - n - 1).dot(x) / (n * x.sum()) if x.sum() > 0 else np.nan
+
+
+def _per_group(df):
+    return df.groupby(['State', 'Year', 'Quarter'], observed=True)['Value'].apply(_gini)
+
+
+def _best(func, df):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(df)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    print(f"{'dataset':<50}{'rows':>9}{'groups':>8}{'per group':>12}{'one pass':>11}  same Gini")
+    for name, (table, unit, metrics) in CONCENTRATION_DATASETS.items():
+        column = next(iter(metrics.values()))
+        df = optimize_dtypes(run_query(concentration_query(table, unit, column)))
+        loop_s, loop = _best(_per_group, df)
+        pass_s, (summary, _) = _best(concentration, df)
+        quarters = summary[summary['Quarter'] != 0].set_index(['State', 'Year', 'Quarter'])['Gini']
+        same = np.allclose(quarters.sort_index().to_numpy(), loop.sort_index().to_numpy(), equal_nan=True)
+        print(f"{name + ' / ' + column:<50}{len(df):>9,}{len(quarters):>8,}{loop_s * 1000:>10.1f}ms{pass_s * 1000:>9.1f}ms  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
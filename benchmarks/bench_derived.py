@@ -0,0 +1,60 @@
+# benchmarks/bench_derived.py
+"""The derived-metrics stage (utils.derived) against correlating each state and period with pandas.
+
+Needs the database configured in .streamlit/secrets.toml. The joined map_* frame is read once (not timed).
+Both sides correlate the same log values within every State x Year x Quarter group (quarters and whole
+years): one sorted pass over all groups (grouped_correlations) against groupby(...).corr(), best of REPEATS,
+checked to agree. The full stage (ratios, states and the country) is timed too.
+
+    python -m benchmarks.bench_derived
+"""
+import time
+import numpy as np
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.derived import (JOINED_QUERY, METRIC_LABELS, MIN_DISTRICTS, build_correlation_rows, build_derived_rows, centred_logs,
+                           grouped_correlations, with_years)
+
+REPEATS = 3
+KEYS = ['State', 'Year', 'Quarter']
+
+
+def _one_pass(rows, values):
+    return grouped_correlations(values, rows.groupby(KEYS, observed=True, sort=True).ngroup().to_numpy())
+
+
+def _pandas(rows, values):
+    metrics = list(METRIC_LABELS)
+    logs = rows[KEYS].assign(**dict(zip(metrics, values.T)))
+    return logs.groupby(KEYS, observed=True, sort=True)[metrics].corr(min_periods=MIN_DISTRICTS)
+
+
+def _best(func, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    joined = optimize_dtypes(run_query(JOINED_QUERY))
+    stage_s, _ = _best(lambda: build_correlation_rows(build_derived_rows(joined)))
+    rows = with_years(build_derived_rows(joined))
+    values = centred_logs(rows[list(METRIC_LABELS)].to_numpy(dtype=float))
+    pass_s, (_, correlations, _) = _best(_one_pass, rows, values)
+    pandas_s, reference = _best(_pandas, rows, values)
+    metrics = len(METRIC_LABELS)
+    upper = np.triu_indices(metrics, 1) # itertools.combinations order
+    expected = reference.to_numpy().reshape(-1, metrics, metrics)[:, upper[0], upper[1]]
+    same = np.allclose(correlations, expected, equal_nan=True)
+    print(f"{len(rows):,} district periods, {len(correlations):,} state periods, {correlations.shape[1]} metric pairs")
+    print(f"one pass:           {pass_s * 1000:8.1f}ms")
+    print(f"pandas groupby.corr:{pandas_s * 1000:8.1f}ms  same values: {'yes' if same else 'NO'}")
+    print(f"full stage (ratios, states + India): {stage_s * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_dtypes.py
+"""Cache footprint of page query results before/after utils.frames.optimize_dtypes.
+
+Builds the result sets the pages cache (one per filter combination) from the local Pulse JSON,
+shaped the way mysql-connector returns them (DECIMAL/SUM() as decimal.Decimal objects).
+"""
+import decimal
+import pandas as pd
+
+import etl_script
+from utils.frames import optimize_dtypes, frame_memory
+
+
+def _as_mysql_result(df):
+    """Mimics mysql-connector output: DECIMAL columns come back as Decimal objects."""
+    df = df.copy()
+    for col in ('Transaction_amount', 'Amount', 'TotalAmount', 'TotalCount'):
+        if col in df.columns:
+            df[col] = df[col].map(lambda v: decimal.Decimal(str(v))).astype(object)
+    return df
+
+
+def page_result_sets():
+    """One result frame per (query shape, year, quarter) the pages issue and cache."""
+    map_trans = etl_script.process_map_transaction()
+    map_user = etl_script.process_map_user()
+    agg_trans = etl_script.process_aggregated_transaction()
+    top_ins = etl_script.process_top_insurance()
+    results = []
+    for (year, quarter), part in map_trans.groupby(['Year', 'Quarter']):
+        results.append(part.groupby(['State', 'District', 'Quarter'], as_index=False)
+                       .agg(TotalAmount=('Transaction_amount', 'sum'), TotalCount=('Transaction_count', 'sum')))
+    for (year, quarter), part in map_user.groupby(['Year', 'Quarter']):
+        results.append(part.groupby(['State', 'District', 'Quarter'], as_index=False)
+                       .agg(TotalRegisteredUsers=('RegisteredUsers', 'sum')))
+    for (state, year), part in agg_trans.groupby(['State', 'Year']):
+        results.append(part.groupby(['Transaction_type', 'Quarter'], as_index=False)
+                       .agg(TotalAmount=('Transaction_amount', 'sum'), TotalCount=('Transaction_count', 'sum')))
+    for (year, quarter), part in top_ins.groupby(['Year', 'Quarter']):
+        results.append(part[['State', 'Year', 'Quarter', 'Pincode', 'Count', 'Amount']].reset_index(drop=True))
+    results.append(agg_trans) # 5_Comparision caches the whole table
+    return [_as_mysql_result(df) for df in results]
+
+
+def main():
+    results = page_result_sets()
+    before = sum(frame_memory(df) for df in results)
+    optimized = [optimize_dtypes(df.copy()) for df in results]
+    after = sum(frame_memory(df) for df in optimized)
+    # Shared categories live once per process, so count them once rather than once per frame
+    shared = sum(frame_memory(pd.DataFrame({c: df[c].cat.categories})) for df in optimized[:1]
+                 for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype))
+    codes_only = sum(int(df.memory_usage(index=True, deep=False).sum()) for df in optimized)
+    print(f"Cached result sets: {len(results)}")
+    print(f"Before (object/int64/Decimal): {before / 1e6:8.2f} MB")
+    print(f"After  (deep, categories per frame): {after / 1e6:8.2f} MB")
+    print(f"After  (codes + shared categories): {(codes_only + shared) / 1e6:8.2f} MB")
+    print(f"Reduction: {before / max(after, 1):.1f}x (deep), {before / max(codes_only + shared, 1):.1f}x (shared)")
+
+
+if __name__ == "__main__":
+    main()
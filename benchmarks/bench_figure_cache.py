@@ -0,0 +1,58 @@
+# benchmarks/bench_figure_cache.py
+"""Per-view cost of a section figure: query + build vs. loading the serialized figure from the cache.
+
+Needs the database configured in .streamlit/secrets.toml (run from the repo root).
+"""
+import json
+import time
+import statistics
+import plotly.io as pio
+
+from utils.catalog import load_catalog
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.geo import GEOJSON_RESOLUTIONS, read_geojson, state_boundaries_file
+from utils.figure_cache import build_payload
+from utils.figures import SECTIONS
+
+SAMPLE = 10 # Filter combinations timed per section
+
+
+def _fetch(query):
+    return optimize_dtypes(run_query(query))
+
+
+def _load(payload):
+    """What a cache hit costs on the page: parse the payload and rebuild the figure object."""
+    payload = json.loads(payload)
+    if payload['kind'] == 'plotly':
+        return pio.from_json(payload['spec'])
+    return json.loads(payload['spec'])
+
+
+def main():
+    catalog = load_catalog()
+    resources = {'geojson': {resolution: read_geojson(state_boundaries_file(resolution)) for resolution in GEOJSON_RESOLUTIONS}}
+    print(f"{'section':<26}{'build':>10}{'cached':>10}{'speedup':>9}{'payload':>10}")
+    for section, spec in SECTIONS.items():
+        if spec['filters'] is None:
+            continue
+        builds, loads, sizes = [], [], []
+        for filters in spec['filters'](catalog, False)[:SAMPLE]:
+            start = time.perf_counter()
+            payload = build_payload(section, _fetch, resources, filters)
+            if json.loads(payload)['kind'] == 'none':
+                continue # No figure (no data, no resolved districts or missing GeoJSON), nothing is cached
+            builds.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            _load(payload)
+            loads.append(time.perf_counter() - start)
+            sizes.append(len(payload))
+        if not builds:
+            continue
+        build, load = statistics.median(builds), statistics.median(loads)
+        print(f"{section:<26}{build * 1000:>8.0f}ms{load * 1000:>8.1f}ms{build / load:>8.1f}x{statistics.median(sizes) / 1024:>8.0f}KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+# benchmarks/bench_forecast.py
+"""Accuracy and throughput of utils.forecast on held-out quarters, per metric and level.
+
+Needs the database configured in .streamlit/secrets.toml. For each of the last HOLDOUT quarters, every
+model in utils.forecast.MODELS (and the last value, as a floor) is fitted on the quarters before it and
+scored on it (rolling origin). Reported per model: median and mean absolute percentage error (entities
+with a positive actual value; mean capped at 1000% per entity) and the share of actuals inside the 80%
+interval. Throughput times the batch fit (parameter search + forecast) against fitting entities one at
+a time.
+
+    python -m benchmarks.bench_forecast
+"""
+import time
+import numpy as np
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.forecast import FORECAST_METRICS, MODELS, PARAMETER_GRID, absolute_errors, fit_parameters, forecast_next, holt_winters, select_model
+from utils.timeseries import TrendMatrix, trend_query
+
+HOLDOUT = 4 # Quarters scored, one at a time
+LOOP_SAMPLE = 50 # Entities fitted one by one to estimate the per-entity cost
+
+
+def _score(values):
+    """{model: (APEs, 80% interval hits)} over the HOLDOUT quarters, plus the model select_model picks
+    from the quarters before them."""
+    scores = {model: ([], []) for model in list(MODELS) + ['last_value']}
+    for k in range(HOLDOUT, 0, -1):
+        train, actual = values[:, :-k], values[:, -k]
+        params = fit_parameters(train)
+        for model in MODELS:
+            forecast, lower, upper = forecast_next(train, model, params)
+            keep = np.isfinite(forecast) & np.isfinite(actual) & (actual > 0)
+            scores[model][0].append(absolute_errors(forecast, actual))
+            scores[model][1].append((actual[keep] >= lower[keep]) & (actual[keep] <= upper[keep]))
+        scores['last_value'][0].append(absolute_errors(train[:, -1], actual))
+    chosen, _ = select_model(values[:, :-HOLDOUT])
+    return {model: (np.concatenate(apes), np.concatenate(hits) if hits else np.array([])) for model, (apes, hits) in scores.items()}, chosen
+
+
+def _throughput(values):
+    """(batch seconds for what the ETL runs per matrix, estimated seconds of the Holt-Winters parameter
+    search alone when each entity is fitted separately)."""
+    start = time.perf_counter()
+    forecast_next(values, *select_model(values))
+    batch = time.perf_counter() - start
+    sample = values[:LOOP_SAMPLE]
+    start = time.perf_counter()
+    for row in sample:
+        for params in PARAMETER_GRID:
+            holt_winters(row[None, :], *params)
+    loop = (time.perf_counter() - start) / max(len(sample), 1) * len(values)
+    return batch, loop
+
+
+def main():
+    print(f"{'metric':<20}{'level':<10}{'model':<24}{'median APE':>11}{'mean APE':>10}{'80% cover':>10}")
+    for metric, (table, label) in FORECAST_METRICS.items():
+        districts = TrendMatrix.from_frame(optimize_dtypes(run_query(trend_query(table, metric))), ['State', 'District'], 'Value')
+        for level, matrix in (('District', districts), ('State', districts.rollup('State'))):
+            scores, chosen = _score(matrix.values)
+            for model, (apes, hits) in scores.items():
+                cover = f"{hits.mean():>10.0%}" if hits.size else f"{'':>10}"
+                name = model + (" *" if model == chosen else "")
+                print(f"{label:<20}{level:<10}{name:<24}{np.median(apes):>11.1%}{np.mean(np.clip(apes, 0, 10)):>10.1%}{cover}")
+            batch, loop = _throughput(matrix.values)
+            print(f"{'':<30}fit {len(matrix.values)} entities: batch {batch * 1000:.0f}ms "
+                  f"({len(matrix.values) / batch:,.0f}/s), one by one ~{loop * 1000:.0f}ms ({loop / batch:.0f}x)")
+    print("* the model select_model picks from the quarters before the holdout (what the ETL would have stored)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# benchmarks/bench_fragments.py
+"""Rerun latency of one widget change: whole page vs. the st.fragment section that owns the widget.
+
+Needs the database configured in .streamlit/secrets.toml. AppTest always reruns the whole script,
+so the fragment case is measured by letting only the owning section run (an upper bound: a real
+fragment rerun also skips the page preamble). On tabbed pages the full rerun already runs only the
+open tab (utils.lazy.lazy_tabs), so the gap there is small.
+"""
+import os
+import time
+import tomllib
+import statistics
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+SECRETS_FILE = os.path.join(".streamlit", "secrets.toml")
+RUNS = 5
+
+# (page, section function, selectbox key changed by the user, (tabs key, tab label) or None)
+SCENARIOS = [
+    ("pages/2_Transactions.py", "transaction_type_section", "quarter1_trans_type_pg2", None),
+    ("pages/2_Transactions.py", "hotspot_section", "quarter2_hotspot_pg2", None),
+    ("pages/3_Users.py", "top_districts_section", "year3_top_dist_pg3", ("users_tabs_pg3", "Top Districts")),
+    ("pages/3_Users.py", "app_opens_section", "quarter4_density_pg3", ("users_tabs_pg3", "App Opens Density")),
+    ("pages/6_Insurance.py", "top_pincodes_section", "ins_pin_qtr", ("ins_tabs", "Top Pincodes")),
+]
+
+
+def _app(page, tab=None):
+    at = AppTest.from_file(os.path.abspath(page), default_timeout=300)
+    with open(SECRETS_FILE, "rb") as f:
+        for key, value in tomllib.load(f).items():
+            at.secrets[key] = value
+    if tab is not None:
+        tabs_key, label = tab
+        at.session_state[tabs_key] = label
+    return at
+
+
+def _time_widget_changes(at, widget_key):
+    """Warm run, then time RUNS reruns that each flip the selectbox to another option."""
+    at.run()
+    box = at.selectbox(key=widget_key)
+    options = list(box.options)
+    timings = []
+    for i in range(RUNS):
+        at.selectbox(key=widget_key).set_value(options[(i + 1) % len(options)])
+        start = time.perf_counter()
+        at.run()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def _only_section(name, real_fragment):
+    """Stand-in for st.fragment that runs just the named section and turns the others into no-ops."""
+    def fragment(func=None, **kwargs):
+        if func is None:
+            return lambda f: fragment(f, **kwargs)
+        if func.__name__ == name:
+            return real_fragment(func, **kwargs)
+        return lambda *args, **kw: None
+    return fragment
+
+
+def main():
+    real_fragment = st.fragment
+    print(f"{'page':<26}{'section':<26}{'full rerun':>12}{'fragment':>12}{'speedup':>9}")
+    for page, section, widget_key, tab in SCENARIOS:
+        full = _time_widget_changes(_app(page, tab), widget_key)
+        st.fragment = _only_section(section, real_fragment)
+        try:
+            scoped = _time_widget_changes(_app(page, tab), widget_key)
+        finally:
+            st.fragment = real_fragment
+        print(f"{os.path.basename(page):<26}{section:<26}{full * 1000:>10.0f}ms{scoped * 1000:>10.0f}ms{full / scoped:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/bench_geojson.py
+"""Size of the state boundaries and of the figures that embed them, per simplification resolution.
+
+Needs india_states.geojson (or pass another GeoJSON path); no database. Run from the repo root.
+"""
+import sys
+import json
+import time
+import pandas as pd
+
+from utils.geo import GEOJSON_FILE, GEOJSON_RESOLUTIONS, read_geojson, simplify_geojson
+from utils.figures import build_overview_user_map, build_app_opens_density
+
+
+def _vertices(geojson):
+    total = 0
+    for feature in geojson['features']:
+        geometry = feature['geometry']
+        polygons = [geometry['coordinates']] if geometry['type'] == 'Polygon' else geometry['coordinates']
+        total += sum(len(ring) for polygon in polygons for ring in polygon)
+    return total
+
+
+def _payloads(geojson):
+    """Serialized size of the two figures that carry the boundaries: the choropleth and the density outline."""
+    names = [feature['properties'].get('st_nm') for feature in geojson['features']]
+    users = pd.DataFrame({'State': names, 'TotalRegisteredUsers': range(len(names))})
+    opens = pd.DataFrame({'State': names[:1], 'District': ['x'], 'lat': [20.0], 'lon': [78.0], 'TotalAppOpens': [1], 'Quarter': [1]})
+    resources = {'geojson': {resolution: geojson for resolution in GEOJSON_RESOLUTIONS}}
+    choropleth, _ = build_overview_user_map(lambda query: users.copy(), resources)
+    density, _ = build_app_opens_density(lambda query: opens.copy(), resources, year=2023, quarter=1)
+    return len(choropleth.to_json()), len(density.to_json())
+
+
+def main():
+    source = sys.argv[1] if len(sys.argv) > 1 else GEOJSON_FILE
+    geojson = read_geojson(source)
+    if geojson is None:
+        print(f"GeoJSON file '{source}' not found.")
+        return
+    print(f"{'resolution':<12}{'vertices':>10}{'file':>10}{'choropleth':>12}{'density':>10}{'simplify':>10}")
+    rows = [('full', geojson, 0.0)]
+    for resolution, (tolerance, decimals) in GEOJSON_RESOLUTIONS.items():
+        start = time.perf_counter()
+        simplified = simplify_geojson(geojson, tolerance, decimals)
+        rows.append((resolution, simplified, time.perf_counter() - start))
+    for name, data, seconds in rows:
+        size = len(json.dumps(data, separators=(',', ':')))
+        choropleth, density = _payloads(data)
+        print(f"{name:<12}{_vertices(data):>10}{size / 1024:>8.0f}KB{choropleth / 1024:>10.0f}KB{density / 1024:>8.0f}KB{seconds:>9.2f}s")
+
+
+if __name__ == "__main__":
+    main()
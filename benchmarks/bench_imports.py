@@ -0,0 +1,86 @@
+# benchmarks/bench_imports.py
+"""Cold-start cost of each page: import time and first render, in a fresh interpreter per page.
+
+Needs the database configured in .streamlit/secrets.toml. Each page runs in a child process started with
+`python -X importtime`. Only the imports triggered by the page are counted (a warm-up app loads Streamlit,
+AppTest and the pandas/pyarrow stack every page needs first); their self time is summed per top-level
+package. Pages whose imports exceed IMPORT_BUDGET_MS are flagged, so a heavy module creeping back into a
+page's top level shows up here.
+
+    python -m benchmarks.bench_imports              # every page
+    python -m benchmarks.bench_imports Home.py      # one page, with its full package breakdown
+"""
+import os
+import sys
+import json
+import time
+import tomllib
+import subprocess
+from collections import defaultdict
+
+SECRETS_FILE = os.path.join(".streamlit", "secrets.toml")
+PAGES = ["Home.py"] + sorted(os.path.join("pages", name) for name in os.listdir("pages") if name.endswith(".py"))
+IMPORT_BUDGET_MS = 750 # Per page, on top of Streamlit and pandas
+TOP_PACKAGES = 5 # Packages listed per page (all of them when a single page is given)
+_MARKER = "bench_imports: page starts"
+_WARM_UP = "import pandas as pd\nimport streamlit as st\nst.dataframe(pd.DataFrame({'a': [1]}))"
+
+
+def _child(page):
+    """Runs in the child interpreter: loads Streamlit and a trivial app first, then renders the page once."""
+    from streamlit.testing.v1 import AppTest
+    AppTest.from_string(_WARM_UP).run()
+    at = AppTest.from_file(os.path.abspath(page), default_timeout=300)
+    with open(SECRETS_FILE, "rb") as f:
+        for key, value in tomllib.load(f).items():
+            at.secrets[key] = value
+    print(_MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'render_ms': elapsed * 1000, 'exceptions': [str(e.value) for e in at.exception]}))
+
+
+def _parse_importtime(stderr):
+    """{top-level package: self import time (ms)} for the `-X importtime` lines after the marker."""
+    per_package = defaultdict(float)
+    lines = stderr.splitlines()
+    start = next((i for i, line in enumerate(lines) if line.startswith(_MARKER)), len(lines))
+    for line in lines[start + 1:]:
+        if not line.startswith("import time:"):
+            continue
+        try:
+            self_us, _, name = line[len("import time:"):].split("|")
+            per_package[name.strip().split(".")[0]] += int(self_us) / 1000
+        except ValueError: # The header line
+            continue
+    return per_package
+
+
+def measure(page):
+    """(first render ms, {package: import ms}) for one page, measured in a fresh interpreter."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-m", "benchmarks.bench_imports", "--child", page],
+                            capture_output=True, text=True, check=True)
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    if report['exceptions']:
+        print(f"  {page} raised: {report['exceptions'][0][:200]}")
+    return report['render_ms'], _parse_importtime(result.stderr)
+
+
+def main(pages):
+    top = None if len(pages) == 1 else TOP_PACKAGES
+    print(f"{'page':<26}{'first render':>14}{'imports':>10}  heaviest imports")
+    for page in pages:
+        render_ms, per_package = measure(page)
+        import_ms = sum(per_package.values())
+        heaviest = sorted(per_package.items(), key=lambda item: -item[1])[:top]
+        flag = "  OVER BUDGET" if import_ms > IMPORT_BUDGET_MS else ""
+        print(f"{os.path.basename(page):<26}{render_ms:>12.0f}ms{import_ms:>8.0f}ms  "
+              + ", ".join(f"{name} {ms:.0f}ms" for name, ms in heaviest) + flag)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "--child":
+        _child(sys.argv[2])
+    else:
+        main(sys.argv[1:] or PAGES)
@@ -0,0 +1,50 @@
+# benchmarks/bench_payload.py
+"""Serialized size of each section's figure as built (to_json) vs. after utils.payload slimming.
+
+Needs the database configured in .streamlit/secrets.toml (run from the repo root). Boundaries are linked
+by URL only when the simplified files exist in static/ (python etl_script.py --only geojson).
+"""
+import json
+import statistics
+
+from utils.catalog import load_catalog
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.geo import GEOJSON_RESOLUTIONS, read_geojson, state_boundaries_file
+from utils.figure_cache import build_payload
+from utils.figures import SECTIONS
+
+SAMPLE = 10 # Filter combinations measured per section
+
+
+def _fetch(query):
+    return optimize_dtypes(run_query(query))
+
+
+def main():
+    catalog = load_catalog()
+    resources = {'geojson': {resolution: read_geojson(state_boundaries_file(resolution)) for resolution in GEOJSON_RESOLUTIONS}}
+    print(f"{'section':<26}{'as built':>10}{'slimmed':>10}{'saved':>8}")
+    total_raw = total_slim = 0
+    for section, spec in SECTIONS.items():
+        if spec['filters'] is None:
+            continue
+        raws, slims = [], []
+        for filters in spec['filters'](catalog, False)[:SAMPLE]:
+            payload = json.loads(build_payload(section, _fetch, resources, filters))
+            if payload['kind'] == 'none':
+                continue
+            raws.append(payload['raw_bytes'])
+            slims.append(len(payload['spec']))
+        if not raws:
+            continue
+        raw, slim = statistics.median(raws), statistics.median(slims)
+        total_raw += sum(raws)
+        total_slim += sum(slims)
+        print(f"{section:<26}{raw / 1024:>8.1f}KB{slim / 1024:>8.1f}KB{1 - slim / raw:>8.0%}")
+    if total_raw:
+        print(f"{'all sampled':<26}{total_raw / 1024:>8.0f}KB{total_slim / 1024:>8.0f}KB{1 - total_slim / total_raw:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
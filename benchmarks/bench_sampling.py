@@ -0,0 +1,66 @@
+# benchmarks/bench_sampling.py
+"""Approximate previews (utils.sampling) against the exact figures they stand in for.
+
+Needs the database configured in .streamlit/secrets.toml and a sample built by the ETL
+(python etl_script.py --only samples). For every year, the "All quarters" district hotspot map is drawn
+from the sample (preview; the sample is read once, as load_sample caches it per data version) and from
+map_transaction (exact build, one query per map), best of REPEATS;
+the preview's district totals are then checked against the exact ones: how far off they are and how
+often the exact total lies within the 95% bounds.
+
+    python -m benchmarks.bench_sampling
+"""
+import time
+import numpy as np
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.figures import build_transaction_hotspots, preview_transaction_hotspots, transaction_hotspots_query
+from utils.spatial import DISTRICT_DETAIL
+from utils.sampling import STRATA_TABLE, estimate_totals, sample_table
+
+REPEATS = 3
+
+
+def _fetch(query):
+    return optimize_dtypes(run_query(query))
+
+
+def _sample(table):
+    strata = run_query(f"SELECT State, Year, Stratum_rows, Sample_rows FROM {STRATA_TABLE} WHERE Table_name = '{table}'")
+    return _fetch(f"SELECT * FROM {sample_table(table)}"), optimize_dtypes(strata)
+
+
+def _best(func, *args):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    years = sorted(_fetch("SELECT DISTINCT Year FROM map_transaction")['Year'].tolist())
+    read_s = _best(_sample, 'map_transaction')
+    rows, strata = drawn = _sample('map_transaction')
+    preview_s = _best(lambda: [preview_transaction_hotspots(lambda table: drawn, {}, year, 'All', DISTRICT_DETAIL) for year in years])
+    exact_s = _best(lambda: [build_transaction_hotspots(_fetch, {}, year, 'All', DISTRICT_DETAIL) for year in years])
+    errors, covered = [], []
+    for year in years:
+        exact = _fetch(transaction_hotspots_query(year, 'All')).groupby(['State', 'District'], observed=True)['TotalAmount'].sum()
+        estimate = estimate_totals(rows[rows['Year'] == year], strata, ['State', 'District'], ['Transaction_amount'])
+        both = estimate.join(exact, on=['State', 'District'], how='inner')
+        errors.append(np.abs(both['Transaction_amount'] / both['TotalAmount'] - 1))
+        covered.append(np.abs(both['Transaction_amount'] - both['TotalAmount']) <= both['Transaction_amount_margin'])
+    errors, covered = np.concatenate(errors), np.concatenate(covered)
+    print(f"{len(years)} years, {len(rows):,} sampled of {int(strata['Stratum_rows'].sum()):,} rows")
+    print(f"sample read (once):  {read_s * 1000:8.1f}ms")
+    print(f"previews (sample):   {preview_s * 1000:8.1f}ms")
+    print(f"exact (full table):  {exact_s * 1000:8.1f}ms")
+    print(f"district totals: median error {np.median(errors):.1%}, exact within 95% bounds {covered.mean():.1%} "
+          f"({len(errors):,} sampled districts)")
+
+
+if __name__ == "__main__":
+    main()
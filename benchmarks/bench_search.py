@@ -0,0 +1,46 @@
+# benchmarks/bench_search.py
+"""Autocomplete latency of the sidebar search (utils.search.SearchIndex) against a scan of every name.
+
+Needs the database configured in .streamlit/secrets.toml (the filter catalog is read once). Each prefix is
+completed REPEATS times with the bisect index and with a list comprehension over all entities; the budget
+is per lookup.
+
+    python -m benchmarks.bench_search
+"""
+import time
+
+from utils.catalog import load_catalog
+from utils.districts import normalize_name
+from utils.search import RESULTS, SearchIndex
+
+PREFIXES = ('a', 'ma', 'pun', 'godav', 'uttar pr', '56', '4110', 'zzz')
+LOOKUP_BUDGET_MS = 1.0
+REPEATS = 200
+
+
+def _scan(entities, keys, prefix):
+    key = normalize_name(prefix)
+    return entities[[k.startswith(key) for k in keys]].head(RESULTS)
+
+
+def main():
+    catalog = load_catalog()
+    start = time.perf_counter()
+    index = SearchIndex.from_catalog(catalog)
+    print(f"index: {len(index.entities):,} entities, {len(index.keys):,} keys, built in {(time.perf_counter() - start) * 1000:.1f}ms")
+    names = [normalize_name(name) for name in index.entities['Name']]
+    print(f"{'prefix':<12}{'matches':>8}{'scan':>10}{'index':>10}  within budget")
+    for prefix in PREFIXES:
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            _scan(index.entities, names, prefix)
+        scan_ms = (time.perf_counter() - start) * 1000 / REPEATS
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            matches = index.complete(prefix)
+        index_ms = (time.perf_counter() - start) * 1000 / REPEATS
+        print(f"{prefix:<12}{len(matches):>8}{scan_ms:>8.3f}ms{index_ms:>8.3f}ms  {'yes' if index_ms <= LOOKUP_BUDGET_MS else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
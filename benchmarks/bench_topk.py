@@ -0,0 +1,55 @@
+# benchmarks/bench_topk.py
+"""Leaderboard queries before and after the top-K index (utils.topk).
+
+Needs the database configured in .streamlit/secrets.toml, with the index built (`etl_script.py --only topk`).
+Each leaderboard is fetched with the GROUP BY ... ORDER BY ... LIMIT 10 query the pages used to run over
+the fact tables and with its key lookup, best of REPEATS, and the two results are checked to agree.
+
+    python -m benchmarks.bench_topk
+"""
+import time
+
+from utils.db import run_query
+from utils.topk import topk_query
+
+REPEATS = 5
+# Leaderboard: (query the page ran, key lookup, entity column)
+LEADERBOARDS = {
+    'Overview top states (all time)': (
+        "SELECT State, SUM(Transaction_count) as Value FROM aggregated_transaction GROUP BY State ORDER BY Value DESC LIMIT 10",
+        topk_query('aggregated_transaction', 'State', 'Transaction_count'), 'State'),
+    'Overview top districts (all time)': (
+        "SELECT State, District, SUM(Transaction_count) as Value FROM map_transaction GROUP BY State, District ORDER BY Value DESC LIMIT 10",
+        topk_query('map_transaction', 'District', 'Transaction_count'), 'District'),
+    'Top districts by users (2022)': (
+        "SELECT State, District, SUM(RegisteredUsers) as Value FROM map_user WHERE Year = 2022 GROUP BY State, District ORDER BY Value DESC LIMIT 10",
+        topk_query('map_user', 'District', 'RegisteredUsers', 2022), 'District'),
+    'Top pincodes by amount (2022 Q3)': (
+        "SELECT State, Pincode, SUM(Transaction_amount) as Value FROM top_transaction WHERE Year = 2022 AND Quarter = 3 GROUP BY State, Pincode ORDER BY Value DESC LIMIT 10",
+        topk_query('top_transaction', 'Pincode', 'Transaction_amount', 2022, 3), 'Pincode'),
+    'Top insurance pincodes (2022)': (
+        "SELECT State, Pincode, SUM(Count) as Value FROM top_insurance WHERE Year = 2022 GROUP BY State, Pincode ORDER BY Value DESC LIMIT 10",
+        topk_query('top_insurance', 'Pincode', 'Count', 2022), 'Pincode'),
+}
+
+
+def _best(query):
+    timings = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        df = run_query(query)
+        timings.append(time.perf_counter() - start)
+    return min(timings), df
+
+
+def main():
+    print(f"{'leaderboard':<36}{'GROUP BY':>10}{'lookup':>10}  same entities")
+    for name, (before, after, entity) in LEADERBOARDS.items():
+        before_s, before_df = _best(before)
+        after_s, after_df = _best(after)
+        same = before_df[entity].astype(str).tolist() == after_df[entity].astype(str).tolist()
+        print(f"{name:<36}{before_s * 1000:>8.1f}ms{after_s * 1000:>8.1f}ms  {'yes' if same else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
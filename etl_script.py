@@ -1,16 +1,48 @@
 # etl_script.py
 import os
+import sys
+import time
+import subprocess
+import hashlib
+import argparse
 import git
 import json
 import pandas as pd
 import mysql.connector
 
+from utils.catalog import CATALOG_TABLE, FilterCatalog, build_catalog
+from utils.data_version import METADATA_TABLE, build_metadata, compute_data_version
+from utils.figure_cache import FIGURE_CACHE_TABLE, payload_sizes, warm_up
+from utils.frames import optimize_dtypes
+from utils.districts import ALIASES_FILE, MAP_TABLES, read_aliases, read_district_reference, resolve_districts
+from utils.spatial import BINS_TABLE, build_district_bins
+from utils.regions import REGION_YEAR_QUERY, REGION_YEAR_TABLE, STATE_TABLE, build_state_dimension
+from utils.profiles import PROFILE_TABLE, PROFILED_TABLES, build_profile, profile_is_current, store_profile
+from utils.topk import LEADERBOARDS, TOPK_TABLE, build_topk_rows, cube_query
+from utils.anomalies import ANOMALY_TABLE, anomaly_query, build_anomaly_rows
+from utils.sampling import SAMPLED_TABLES, STRATA_COLUMNS, STRATA_TABLE, sample_table, stratified_sample
+from utils.derived import BASE_METRICS, CORRELATION_TABLE, DERIVED_TABLE, JOINED_QUERY, RATIOS, build_correlation_rows, build_derived_rows
+from utils.forecast import FORECAST_METRICS, FORECAST_TABLE, build_forecast_rows
+from utils.timeseries import TrendMatrix, trend_query
+from utils.geo import GEOJSON_RESOLUTIONS, read_geojson, state_boundaries_file, write_simplified_geojson
+
 # --- Database Credentials ---
 DB_HOST = "localhost"
 DB_USER = "root"
 DB_PASSWORD = "admin" # Using "admin" as requested
 DB_NAME = "phonepe_pulse"
 
+FULL_WARM_LOG = "warm_figures.log" # Output of the background full warm-up (start_full_warm_up)
+
+# --- Partial rebuilds (--only) ---
+# Figure-cache sections drawn from the tables each stage rebuilds; re-warmed by republish_data_version
+# (stages not listed only feed version-keyed page caches)
+STAGE_SECTIONS = {
+    'anomalies': ['anomaly_map'],
+    'topk': ['overview_state', 'overview_district', 'top_districts', 'top_categories', 'insurance_pincodes'],
+    'derived': ['metric_correlations'],
+}
+
 # --- GitHub Repository ---
 REPO_URL = "https://github.com/PhonePe/pulse.git"
 REPO_DIR = "pulse"
@@ -45,13 +77,28 @@ def create_database_and_tables():
         cursor.execute("CREATE TABLE IF NOT EXISTS aggregated_user (State VARCHAR(255), Year INT, Quarter INT, Brand VARCHAR(255), Transaction_count BIGINT, Percentage DECIMAL(10, 5), PRIMARY KEY (State, Year, Quarter, Brand))")
         cursor.execute("CREATE TABLE IF NOT EXISTS aggregated_insurance (State VARCHAR(255), Year INT, Quarter INT, Name VARCHAR(255), Count BIGINT, Amount DECIMAL(30, 2), PRIMARY KEY (State, Year, Quarter, Name))")
         # Map Tables
-        cursor.execute("CREATE TABLE IF NOT EXISTS map_transaction (State VARCHAR(255), Year INT, Quarter INT, District VARCHAR(255), Transaction_count BIGINT, Transaction_amount DECIMAL(30, 2), PRIMARY KEY (State, Year, Quarter, District))")
-        cursor.execute("CREATE TABLE IF NOT EXISTS map_user (State VARCHAR(255), Year INT, Quarter INT, District VARCHAR(255), RegisteredUsers BIGINT, AppOpens BIGINT, PRIMARY KEY (State, Year, Quarter, District))")
-        cursor.execute("CREATE TABLE IF NOT EXISTS map_insurance (State VARCHAR(255), Year INT, Quarter INT, District VARCHAR(255), Count BIGINT, Amount DECIMAL(30, 2), PRIMARY KEY (State, Year, Quarter, District))")
+        cursor.execute("CREATE TABLE IF NOT EXISTS map_transaction (State VARCHAR(255), Year INT, Quarter INT, District VARCHAR(255), Transaction_count BIGINT, Transaction_amount DECIMAL(30, 2), District_id INT, lat DECIMAL(9, 6), lon DECIMAL(9, 6), PRIMARY KEY (State, Year, Quarter, District))")
+        cursor.execute("CREATE TABLE IF NOT EXISTS map_user (State VARCHAR(255), Year INT, Quarter INT, District VARCHAR(255), RegisteredUsers BIGINT, AppOpens BIGINT, District_id INT, lat DECIMAL(9, 6), lon DECIMAL(9, 6), PRIMARY KEY (State, Year, Quarter, District))")
+        cursor.execute("CREATE TABLE IF NOT EXISTS map_insurance (State VARCHAR(255), Year INT, Quarter INT, District VARCHAR(255), Count BIGINT, Amount DECIMAL(30, 2), District_id INT, lat DECIMAL(9, 6), lon DECIMAL(9, 6), PRIMARY KEY (State, Year, Quarter, District))")
         # Top Tables
         cursor.execute("CREATE TABLE IF NOT EXISTS top_transaction (State VARCHAR(255), Year INT, Quarter INT, Pincode VARCHAR(20), Transaction_count BIGINT, Transaction_amount DECIMAL(30, 2), PRIMARY KEY (State, Year, Quarter, Pincode))") # Changed Pincode to VARCHAR
         cursor.execute("CREATE TABLE IF NOT EXISTS top_user (State VARCHAR(255), Year INT, Quarter INT, Pincode VARCHAR(20), RegisteredUsers BIGINT, PRIMARY KEY (State, Year, Quarter, Pincode))") # Changed Pincode to VARCHAR
         cursor.execute("CREATE TABLE IF NOT EXISTS top_insurance (State VARCHAR(255), Year INT, Quarter INT, Pincode VARCHAR(20), Count BIGINT, Amount DECIMAL(30, 2), PRIMARY KEY (State, Year, Quarter, Pincode))") # Changed Pincode to VARCHAR
+        # Derived Tables (rebuilt on every ETL run)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {CATALOG_TABLE} (Dataset VARCHAR(64), Field VARCHAR(64), State VARCHAR(255), Value VARCHAR(255), INDEX (Dataset, Field))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {METADATA_TABLE} (Meta_key VARCHAR(64) PRIMARY KEY, Meta_value VARCHAR(255))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {BINS_TABLE} (District_id INT, Detail VARCHAR(16), Bin_q INT, Bin_r INT, Bin_lat DECIMAL(9, 6), Bin_lon DECIMAL(9, 6), PRIMARY KEY (Detail, District_id))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {STATE_TABLE} (State VARCHAR(255) PRIMARY KEY, Canonical_state VARCHAR(255), Region VARCHAR(16), Boundary_name VARCHAR(255), INDEX (Region))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {REGION_YEAR_TABLE} (Region VARCHAR(16), Year INT, Transaction_count BIGINT, Transaction_amount DECIMAL(30, 2), PRIMARY KEY (Region, Year))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {PROFILE_TABLE} (Table_name VARCHAR(64) PRIMARY KEY, Table_version VARCHAR(32), Mode VARCHAR(16), Sample_rows INT, Total_rows INT, Generated_at VARCHAR(32), Html LONGTEXT)")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {FORECAST_TABLE} (Metric VARCHAR(32), Level VARCHAR(16), State VARCHAR(255), District VARCHAR(255), Year INT, Quarter INT, Forecast DOUBLE, Lower DOUBLE, Upper DOUBLE, Model VARCHAR(64), PRIMARY KEY (Metric, Level, State, District))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {ANOMALY_TABLE} (Metric VARCHAR(32), State VARCHAR(255), District VARCHAR(255), Year INT, Quarter INT, Value DOUBLE, YoY_change DOUBLE, Score DOUBLE, Direction VARCHAR(8), lat DECIMAL(9, 6), lon DECIMAL(9, 6), PRIMARY KEY (Metric, State, District, Year, Quarter), INDEX (Metric, Year, Quarter))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {TOPK_TABLE} (Dataset VARCHAR(32), Level VARCHAR(16), Metric VARCHAR(32), Scope VARCHAR(255), Year INT, Quarter INT, Position INT, Previous_position INT, State VARCHAR(255), Entity VARCHAR(255), Value DOUBLE, PRIMARY KEY (Dataset, Level, Metric, Scope, Year, Quarter, Position))")
+        derived_columns = ', '.join(f"{column} DOUBLE" for column in [*BASE_METRICS, *RATIOS])
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {DERIVED_TABLE} (State VARCHAR(255), District VARCHAR(255), Year INT, Quarter INT, {derived_columns}, PRIMARY KEY (State, District, Year, Quarter))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {CORRELATION_TABLE} (Scope VARCHAR(255), Year INT, Quarter INT, Metric_x VARCHAR(32), Metric_y VARCHAR(32), Correlation DOUBLE, Districts INT, PRIMARY KEY (Scope, Year, Quarter, Metric_x, Metric_y))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {STRATA_TABLE} (Table_name VARCHAR(64), State VARCHAR(255), Year INT, Stratum_rows INT, Sample_rows INT, PRIMARY KEY (Table_name, State, Year))")
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {FIGURE_CACHE_TABLE} (Cache_key VARCHAR(64), Section VARCHAR(64), Data_version VARCHAR(32), Payload LONGTEXT, PRIMARY KEY (Cache_key, Data_version))")
         conn.commit()
         print("Tables checked/created successfully.")
     except mysql.connector.Error as err:
@@ -105,6 +152,314 @@ def insert_data_into_db(df, table_name):
         if conn and conn.is_connected():
             conn.close()
 
+def replace_table_data(df, table_name, where=None):
+    """Replaces the contents of a derived table with the DataFrame (unlike insert_data_into_db, never skips);
+    where limits the rows replaced, e.g. to some sections of the figure cache."""
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        cursor = conn.cursor()
+        cursor.execute(f"DELETE FROM `{table_name}`" + (f" WHERE {where}" if where else ""))
+        if not df.empty:
+            tuples = [tuple(x) for x in df.astype(object).where(df.notna(), None).to_numpy()]
+            cols = '`, `'.join(list(df.columns))
+            cols = f"`{cols}`"
+            placeholders = ','.join(['%s'] * len(df.columns))
+            cursor.executemany(f"INSERT INTO `{table_name}` ({cols}) VALUES ({placeholders})", tuples)
+        conn.commit()
+        print(f"Rebuilt {table_name} ({len(df)} rows)." if where is None else f"Rebuilt {len(df)} rows of {table_name}.")
+    except mysql.connector.Error as err:
+        print(f"Error rebuilding {table_name}: {err}")
+        if conn:
+            conn.rollback()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+def read_published_data_version():
+    """Data version recorded by the last full ETL run (None if there is none)."""
+    conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+    try:
+        df = pd.read_sql_query(f"SELECT Meta_value FROM {METADATA_TABLE} WHERE Meta_key = 'data_version'", conn)
+    finally:
+        conn.close()
+    return df['Meta_value'].iloc[0] if not df.empty else None
+
+def resolve_map_districts():
+    """Stores District_id, lat and lon on the map_* tables, so pages plot map queries without merging coordinates."""
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        cursor = conn.cursor()
+        pairs = pd.concat([pd.read_sql_query(f"SELECT DISTINCT State, District FROM {table}", conn) for table in MAP_TABLES])
+        try:
+            resolution = resolve_districts(pairs, read_district_reference(), read_aliases())
+        except (FileNotFoundError, KeyError) as e:
+            print(f"Skipping district resolution, coordinate file unusable: {e}")
+            return None
+        rows = [(None if pd.isna(r.District_id) else int(r.District_id),
+                 None if pd.isna(r.lat) else r.lat, None if pd.isna(r.lon) else r.lon, r.State, r.District)
+                for r in resolution.itertuples(index=False)]
+        for table in MAP_TABLES:
+            cursor.execute(f"SHOW COLUMNS FROM `{table}` LIKE 'District_id'")
+            if cursor.fetchone() is None: # Tables created before these columns existed
+                cursor.execute(f"ALTER TABLE `{table}` ADD COLUMN District_id INT, ADD COLUMN lat DECIMAL(9, 6), ADD COLUMN lon DECIMAL(9, 6)")
+            cursor.executemany(f"UPDATE `{table}` SET District_id = %s, lat = %s, lon = %s WHERE State = %s AND District = %s", rows)
+        conn.commit()
+    except mysql.connector.Error as err:
+        print(f"Error resolving districts: {err}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
+    # --- Report ---
+    matched = resolution['Match'].notna()
+    counts = ', '.join(f"{match}: {count}" for match, count in resolution.loc[matched, 'Match'].value_counts().items())
+    print(f"Resolved {matched.sum()} of {len(resolution)} districts ({counts}).")
+    unmatched = resolution[~matched]
+    if not unmatched.empty:
+        print(f"Unmatched districts ({len(unmatched)}); add an alias to {ALIASES_FILE} if district_coords.csv lists them under another name:")
+        for state, group in unmatched.groupby('State'):
+            print(f"  {state}: {', '.join(group['District'])}")
+    return resolution
+
+def build_region_rollups():
+    """Rebuilds the region rollup tables from the fact tables joined to the state dimension (in MySQL)."""
+    conn = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        region_year = pd.read_sql_query(REGION_YEAR_QUERY, conn)
+    except mysql.connector.Error as err:
+        print(f"Error building region rollups: {err}")
+        return
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    replace_table_data(region_year, REGION_YEAR_TABLE)
+
+def build_forecasts():
+    """Forecasts the next quarter of every FORECAST_METRICS metric for every district and state (utils.forecast)."""
+    conn = None
+    parts = []
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        for metric, (table, label) in FORECAST_METRICS.items():
+            districts = TrendMatrix.from_frame(optimize_dtypes(pd.read_sql_query(trend_query(table, metric), conn)), ['State', 'District'], 'Value')
+            rows = build_forecast_rows(metric, {'District': districts, 'State': districts.rollup('State')})
+            models = ', '.join(f"{model}: {count}" for model, count in rows['Model'].value_counts().items())
+            print(f"Forecast {label} for {len(rows)} districts and states ({models}).")
+            parts.append(rows)
+    except mysql.connector.Error as err:
+        print(f"Error building forecasts: {err}")
+        return
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    replace_table_data(pd.concat(parts, ignore_index=True), FORECAST_TABLE)
+
+def build_topk_index():
+    """Rebuilds every leaderboard (top-K entities per level, metric, period and state) from the fact tables (utils.topk)."""
+    conn = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        frames = {table: optimize_dtypes(pd.read_sql_query(cube_query(table), conn)) for table in LEADERBOARDS}
+    except mysql.connector.Error as err:
+        print(f"Error building the top-K index: {err}")
+        return
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    start = time.perf_counter()
+    rows = build_topk_rows(frames)
+    print(f"Ranked {len(rows)} leaderboard entries in {time.perf_counter() - start:.2f}s.")
+    replace_table_data(rows, TOPK_TABLE)
+
+def build_anomalies():
+    """Scores every district x quarter cell of the map_* tables and stores the anomalies (utils.anomalies)."""
+    conn = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        frames = {table: optimize_dtypes(pd.read_sql_query(anomaly_query(table), conn)) for table in ('map_transaction', 'map_user')}
+    except mysql.connector.Error as err:
+        print(f"Error building anomalies: {err}")
+        return
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    start = time.perf_counter()
+    anomalies = build_anomaly_rows(frames)
+    print(f"Scored {sum(len(df) for df in frames.values())} district quarters in {time.perf_counter() - start:.2f}s; "
+          f"{len(anomalies)} anomalies.")
+    replace_table_data(anomalies, ANOMALY_TABLE)
+
+def build_derived_metrics():
+    """Joins the map_* tables once per district quarter, stores the per-user ratios and the metric x metric
+    correlations of every state and period (utils.derived)."""
+    conn = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        joined = optimize_dtypes(pd.read_sql_query(JOINED_QUERY, conn))
+    except mysql.connector.Error as err:
+        print(f"Error building derived metrics: {err}")
+        return
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    start = time.perf_counter()
+    derived = build_derived_rows(joined)
+    correlations = build_correlation_rows(derived)
+    print(f"Derived {len(derived)} district quarters and {len(correlations)} metric correlations in {time.perf_counter() - start:.2f}s.")
+    replace_table_data(derived, DERIVED_TABLE)
+    replace_table_data(correlations, CORRELATION_TABLE)
+
+def build_samples():
+    """Stores a stratified (State x Year) sample of every table and the stratum sizes, which pages answer
+    from first while the exact result is computed (utils.sampling)."""
+    strata = []
+    for table in SAMPLED_TABLES:
+        conn = None
+        cursor = None
+        try:
+            conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+            df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
+            # Recreated from the table's current schema, so it follows migrations such as the District_id/lat/lon
+            # columns resolve_map_districts adds to map_* tables created before them
+            cursor = conn.cursor()
+            cursor.execute(f"DROP TABLE IF EXISTS {sample_table(table)}")
+            cursor.execute(f"CREATE TABLE {sample_table(table)} LIKE {table}")
+        except mysql.connector.Error as err:
+            print(f"Error sampling {table}: {err}")
+            continue
+        finally:
+            if cursor:
+                cursor.close()
+            if conn and conn.is_connected():
+                conn.close()
+        sample, sizes = stratified_sample(df)
+        replace_table_data(sample, sample_table(table))
+        strata.append(sizes.assign(Table_name=table))
+    if strata:
+        replace_table_data(pd.concat(strata, ignore_index=True)[STRATA_COLUMNS], STRATA_TABLE)
+
+def build_geojson_assets():
+    """Writes the simplified state boundary files the pages load instead of the full-resolution GeoJSON."""
+    try:
+        sizes = write_simplified_geojson()
+    except FileNotFoundError as e:
+        print(f"Skipping simplified GeoJSON: {e}")
+        return
+    for resolution, size in sizes.items():
+        print(f"Wrote {resolution} resolution state boundaries ({size / 1024:.0f} KB).")
+
+def warm_figure_cache(data_version, sections=None, full=False):
+    """Pre-renders the page-default filter combinations of every section (or only the given ones) into the figure
+    cache table; full=True renders every combination and replaces the data version's rows."""
+    geojson = {resolution: read_geojson(state_boundaries_file(resolution)) for resolution in GEOJSON_RESOLUTIONS}
+    resources = {'geojson': geojson}
+    conn = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        catalog = FilterCatalog(pd.read_sql_query(f"SELECT Dataset, Field, State, Value FROM {CATALOG_TABLE}", conn))
+        fetch = lambda query: optimize_dtypes(pd.read_sql_query(query, conn)) # Same frames the pages get from fetch_data
+        rows = warm_up(fetch, resources, catalog, data_version, sections, full)
+    except mysql.connector.Error as err:
+        print(f"Error warming figure cache: {err}")
+        return
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+    raw, stored = payload_sizes(rows['Payload'])
+    print(f"Figure payloads: {raw / 1e6:.1f} MB as built, {stored / 1e6:.1f} MB after slimming.")
+    if full:
+        replace_table_data(rows, FIGURE_CACHE_TABLE, where=f"Data_version = '{data_version}'")
+    elif sections is None:
+        replace_table_data(rows, FIGURE_CACHE_TABLE)
+    else:
+        names = ', '.join(f"'{section}'" for section in sections)
+        replace_table_data(rows, FIGURE_CACHE_TABLE, where=f"Data_version = '{data_version}' AND Section IN ({names})")
+
+def start_full_warm_up():
+    """Runs --only warm-figures (every filter combination) in a background process; until it finishes, pages
+    build the combinations the default warm-up skipped on first view."""
+    with open(FULL_WARM_LOG, 'a') as log:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--only', 'warm-figures'],
+                                   stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    print(f"Warming every filter combination in the background (pid {process.pid}, log in {FULL_WARM_LOG}).")
+
+def republish_data_version(stage):
+    """Publishes a new data version after an --only stage rebuilt its tables, so every cache keyed by the version
+    (the figure cache, the pages' fetch_data and loaders) re-reads them. Cached figures of the other sections
+    carry over to it and the stage's own sections (STAGE_SECTIONS) are re-warmed."""
+    previous = read_published_data_version()
+    if previous is None:
+        print("No published data version found; the next full ETL run publishes one.")
+        return
+    data_version = hashlib.sha1(f"{previous}:{stage}:{time.time()}".encode()).hexdigest()[:16]
+    sections = STAGE_SECTIONS.get(stage, [])
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        cursor = conn.cursor()
+        # Pages still on the previous version (load_data_version re-reads it every 5 minutes) keep its figures
+        cursor.execute(f"DELETE FROM {FIGURE_CACHE_TABLE} WHERE Data_version <> %s", (previous,))
+        rebuilt = f" AND Section NOT IN ({', '.join(['%s'] * len(sections))})" if sections else ""
+        cursor.execute(f"INSERT INTO {FIGURE_CACHE_TABLE} (Cache_key, Section, Data_version, Payload) "
+                       f"SELECT Cache_key, Section, %s, Payload FROM {FIGURE_CACHE_TABLE} WHERE Data_version = %s{rebuilt}",
+                       (data_version, previous, *sections))
+        conn.commit()
+    except mysql.connector.Error as err:
+        print(f"Error carrying cached figures over to a new data version: {err}")
+        return
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+    if sections:
+        warm_figure_cache(data_version, sections)
+    replace_table_data(build_metadata(data_version), METADATA_TABLE)
+    print(f"Published data version {data_version}.")
+
+def build_profiles(mode='full', sample_rows=None):
+    """Stores a ydata-profiling HTML report per raw table, regenerating only tables whose content (or the
+    requested mode/sample) changed since their stored report."""
+    conn = None
+    cursor = None
+    try:
+        conn = mysql.connector.connect(host=DB_HOST, user=DB_USER, password=DB_PASSWORD, database=DB_NAME)
+        cursor = conn.cursor()
+        stored = pd.read_sql_query(f"SELECT Table_name, Table_version, Mode, Sample_rows FROM {PROFILE_TABLE}", conn)
+        stored = {row['Table_name']: row for row in stored.to_dict('records')}
+        for table in PROFILED_TABLES:
+            df = optimize_dtypes(pd.read_sql_query(f"SELECT * FROM {table}", conn)) # Same dtypes the pages work with
+            if df.empty:
+                print(f"No data in {table}, not profiled.")
+                continue
+            if profile_is_current(stored.get(table), df, mode, sample_rows):
+                print(f"Profile for {table} is up to date.")
+                continue
+            print(f"Profiling {table} ({len(df)} rows, {mode})...")
+            row = build_profile(table, df, f"Profiling Report - {table}", mode, sample_rows)
+            store_profile(cursor, row)
+            conn.commit()
+    except mysql.connector.Error as err:
+        print(f"Error building profiles: {err}")
+    finally:
+        if cursor:
+            cursor.close()
+        if conn and conn.is_connected():
+            conn.close()
+
 # --- Data Processing Functions ---
 
 def process_aggregated_transaction():
@@ -423,35 +778,110 @@ def process_top_insurance():
 
 
 if __name__ == "__main__":
-    clone_data_repo()
-    create_database_and_tables()
-
-    # --- Define all processing functions and target tables ---
-    processing_map = {
-        process_aggregated_transaction: "aggregated_transaction",
-        process_aggregated_user: "aggregated_user",
-        process_aggregated_insurance: "aggregated_insurance",
-        process_map_transaction: "map_transaction",
-        process_map_user: "map_user",
-        process_map_insurance: "map_insurance",
-        process_top_transaction: "top_transaction",
-        process_top_user: "top_user",
-        process_top_insurance: "top_insurance"
-    }
-
-    # Process and insert data if repo exists
-    if os.path.exists(REPO_DIR):
-        for process_func, table_name in processing_map.items():
-            print(f"Processing data for {table_name}...")
-            try:
-                df = process_func()
-                if not df.empty:
-                    insert_data_into_db(df, table_name)
-                else:
-                    print(f"No data generated for {table_name}.")
-            except Exception as e:
-                print(f"Error during processing/insertion for {table_name}: {e}")
+    parser = argparse.ArgumentParser(description="Load the PhonePe Pulse data into MySQL and build the derived tables.")
+    parser.add_argument('--only', choices=['warm-figures', 'geojson', 'profiles', 'forecasts', 'anomalies', 'topk', 'derived', 'samples'],
+                        help="warm-figures: only re-render every filter combination into the figure cache for the published data version; "
+                             "geojson: only rebuild the simplified state boundary files; "
+                             "profiles: only re-profile the tables that changed (and publish a new data version); "
+                             "forecasts: only refit the next-quarter forecasts (and publish a new data version); "
+                             "anomalies: only rescore the district quarters (and publish a new data version); "
+                             "topk: only rebuild the leaderboards (and publish a new data version); "
+                             "derived: only rebuild the derived ratios and metric correlations (and publish a new data version); "
+                             "samples: only redraw the stratified samples behind the approximate previews (and publish a new data version)")
+    parser.add_argument('--profile-minimal', action='store_true',
+                        help="Build minimal profiles (per-column statistics, no correlations or interactions)")
+    parser.add_argument('--profile-sample', type=int, metavar='ROWS',
+                        help="Profile a random sample of at most ROWS rows per table")
+    args = parser.parse_args()
+    profile_mode = 'minimal' if args.profile_minimal else 'full'
+    if args.only == 'geojson':
+        build_geojson_assets()
+    elif args.only == 'profiles':
+        build_profiles(profile_mode, args.profile_sample)
+        republish_data_version('profiles')
+    elif args.only == 'forecasts':
+        build_forecasts()
+        republish_data_version('forecasts')
+    elif args.only == 'anomalies':
+        build_anomalies()
+        republish_data_version('anomalies')
+    elif args.only == 'topk':
+        build_topk_index()
+        republish_data_version('topk')
+    elif args.only == 'derived':
+        build_derived_metrics()
+        republish_data_version('derived')
+    elif args.only == 'samples':
+        build_samples()
+        republish_data_version('samples')
+    elif args.only == 'warm-figures':
+        data_version = read_published_data_version()
+        if data_version is None:
+            print("No published data version found. Run the full ETL first.")
+        else:
+            print(f"Warming every filter combination for data version {data_version}...")
+            warm_figure_cache(data_version, full=True)
     else:
-        print(f"Error: Data repository '{REPO_DIR}' not found. Cannot process data.")
+        clone_data_repo()
+        create_database_and_tables()
+
+        # --- Define all processing functions and target tables ---
+        processing_map = {
+            process_aggregated_transaction: "aggregated_transaction",
+            process_aggregated_user: "aggregated_user",
+            process_aggregated_insurance: "aggregated_insurance",
+            process_map_transaction: "map_transaction",
+            process_map_user: "map_user",
+            process_map_insurance: "map_insurance",
+            process_top_transaction: "top_transaction",
+            process_top_user: "top_user",
+            process_top_insurance: "top_insurance"
+        }
+
+        # Process and insert data if repo exists
+        frames = {} # Processed DataFrames, reused by the derived-table stages below
+        if os.path.exists(REPO_DIR):
+            for process_func, table_name in processing_map.items():
+                print(f"Processing data for {table_name}...")
+                try:
+                    df = process_func()
+                    if not df.empty:
+                        insert_data_into_db(df, table_name)
+                        frames[table_name] = df
+                    else:
+                        print(f"No data generated for {table_name}.")
+                except Exception as e:
+                    print(f"Error during processing/insertion for {table_name}: {e}")
+
+            # --- Derived Tables ---
+            print("Building filter catalog...")
+            replace_table_data(build_catalog(frames), CATALOG_TABLE)
+            replace_table_data(build_state_dimension(frames), STATE_TABLE)
+            build_region_rollups()
+            print("Building leaderboards...")
+            build_topk_index() # Before the warm-up: the top-10 figures read it
+            print("Forecasting next quarter...")
+            build_forecasts()
+            print("Resolving map districts to coordinates...")
+            resolution = resolve_map_districts()
+            if resolution is not None:
+                frames['district_resolution'] = resolution # Alias edits change the data version too
+                replace_table_data(build_district_bins(resolution), BINS_TABLE) # Hexagons for the binned map details
+            print("Scoring district quarters for anomalies...")
+            build_anomalies() # After resolution, so flagged districts carry coordinates
+            print("Relating metrics across districts...")
+            build_derived_metrics() # Before the warm-up: the correlation heatmaps read it
+            print("Sampling tables for approximate previews...")
+            build_samples() # After resolution, so sampled map rows carry coordinates
+            data_version = compute_data_version(frames)
+            replace_table_data(build_metadata(data_version), METADATA_TABLE)
+            build_geojson_assets() # Before the warm-up, so cached maps embed the simplified boundaries
+            print(f"Published data version {data_version}. Warming figure cache...")
+            warm_figure_cache(data_version) # Page defaults first, so the pages are warm as soon as the run ends
+            print("Profiling changed tables...")
+            build_profiles(profile_mode, args.profile_sample)
+            start_full_warm_up()
+        else:
+            print(f"Error: Data repository '{REPO_DIR}' not found. Cannot process data.")
 
-    print("\nETL process finished.")
\ No newline at end of file
+        print("\nETL process finished.")
@@ -2,45 +2,37 @@
 import pandas as pd
 import streamlit as st
 import mysql.connector
-import plotly.express as px
 import json
 import os
 from streamlit_extras.add_vertical_space import add_vertical_space
-from ydata_profiling import ProfileReport # Import for profiling
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.lazy import lazy_tabs
+from utils.figure_cache import show_cached_figure
+from utils.figures import GEOJSON_RESOLUTION
+from utils.geo import state_boundaries_file
+from utils.data_version import load_data_version
+from utils.profiles import ON_DEMAND_SAMPLE_ROWS, load_profile, profile_job
+from utils.jobs import JobRejected, show_job_progress, submit_job
+from utils.sampling import estimated_summary, load_sample, summary_job
+from utils.search import entity_search
 
 # --- Page Config ---
 st.set_page_config(page_title='PhonePe Pulse | Overview', layout='wide', page_icon='Logo.png')
 
-# --- NEW DB Credentials (using Streamlit Secrets) ---
-DB_HOST = st.secrets["database"]["host"]
-DB_PORT = st.secrets["database"]["port"]
-DB_USER = st.secrets["database"]["user"]
-DB_PASSWORD = st.secrets["database"]["password"]
-DB_NAME = st.secrets["database"]["db_name"]
-DB_SSL_CA = st.secrets["database"]["ssl_ca"]
-GEOJSON_FILE = "india_states.geojson" # State-level map needed
-
 # --- DB Fetch Function ---
 @st.cache_data(ttl=3600)
-def fetch_data(query):
-    # The spinner should be outside this function where it's called
+def _fetch_data(query, data_version):
     try:
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            ssl_ca=DB_SSL_CA,
-            ssl_verify_cert=True
-        )
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
-    except mysql.connector.Error as err:
+        return optimize_dtypes(run_query(query)) # Compact dtypes for every cached copy
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
         st.error(f"Database Error: {err}")
         return pd.DataFrame()
 
+def fetch_data(query):
+    # Cached per data version, so tables an ETL stage rebuilds and republishes are re-read
+    return _fetch_data(query, load_data_version())
+
 # --- Load GeoJSON ---
 @st.cache_data # Cache GeoJSON loading
 def load_geojson(file_path):
@@ -53,113 +45,113 @@ def load_geojson(file_path):
     except Exception as e:
         st.error(f"Error loading GeoJSON file '{file_path}': {e}")
         return None
-geojson_data = load_geojson(GEOJSON_FILE)
+# Simplified boundaries at the resolution the 400px choropleth needs (full resolution if not built)
+map_resolution = GEOJSON_RESOLUTION['overview_user_map']
+geojson_data = load_geojson(state_boundaries_file(map_resolution))
+resources = {'geojson': {map_resolution: geojson_data}} # Shared assets passed to the figure builders
 
 
-# --- State Name Correction ---
-state_name_mapping = {
-    'Andaman & Nicobar Islands': 'Andaman & Nicobar',
-    'Dadra & Nagar Haveli & Daman & Diu': 'Dadra and Nagar Haveli and Daman and Diu',
-    'Delhi': 'National Capital Territory of Delhi',
-    'Jammu & Kashmir': 'Jammu & Kashmir',
-    'Ladakh': 'Ladakh',
-    'Telengana': 'Telangana'
-}
-
 # --- Hide elements ---
 st.markdown("""<style> footer {visibility: hidden;} </style>""", unsafe_allow_html=True)
 st.markdown("""<style>.css-1jc7ptx, .e1ewe7hr3, .viewerBadge_container__1QSob, .styles_viewerBadge__1yB5_, .viewerBadge_link__1S137, .viewerBadge_text__1JaDK {display: none;}</style>""", unsafe_allow_html=True)
 
 st.title(':violet[Overview & Data Profiling]')
+entity_search()
 add_vertical_space(1)
 
 # --- Tab Structure ---
-tab_charts, tab_profile = st.tabs(["Quick Visuals", "Detailed Profiling Report"])
-
-with tab_charts:
-    st.header("Quick Visual Summaries")
-    add_vertical_space(1)
-
-    # --- Fetch Data Needed ---
-    # Fetch only necessary columns for performance
-    df_agg_trans = fetch_data("SELECT State, Transaction_type, Transaction_count FROM aggregated_transaction")
-    df_map_trans = fetch_data("SELECT State, District, Transaction_count FROM map_transaction")
-    df_map_user = fetch_data("SELECT State, SUM(RegisteredUsers) as TotalRegisteredUsers FROM map_user GROUP BY State")
-
-    # --- Charts (similar to before) ---
-    col1, col2 = st.columns(2)
-    with col1:
-        st.subheader("Transaction Breakdown by Type")
-        if not df_agg_trans.empty:
-            trans_type_count = df_agg_trans.groupby('Transaction_type')['Transaction_count'].sum().reset_index()
-            fig_type = px.pie(trans_type_count, names='Transaction_type', values='Transaction_count', hole=.4, title="Overall Share (Count)")
-            fig_type.update_layout(height=400, title_x=0.5, legend_title_text='Type')
-            st.plotly_chart(fig_type, use_container_width=True)
-        else: 
-            st.warning("Aggregated transaction data unavailable.")
-
-        st.subheader("Top 10 Districts (Count)")
-        if not df_map_trans.empty:
-            trans_district = df_map_trans.groupby(['State', 'District'])['Transaction_count'].sum().reset_index()
-            trans_district_sorted = trans_district.sort_values(by='Transaction_count', ascending=False).head(10)
-            fig_district = px.bar(trans_district_sorted, x='Transaction_count', y='District', orientation='h', text_auto='.2s',
-                                labels={'Transaction_count': "Total Count"}, title="Top 10 Districts", hover_name='State')
-            fig_district.update_layout(yaxis=dict(autorange="reversed"), height=400, title_x=0.5)
-            st.plotly_chart(fig_district, use_container_width=True)
-        else: 
-            st.warning("Map transaction data unavailable.")
-
-    with col2:
-        st.subheader("Top 10 States (Count)")
-        if not df_agg_trans.empty:
-            trans_state = df_agg_trans.groupby('State')['Transaction_count'].sum().reset_index()
-            trans_state_sorted = trans_state.sort_values(by='Transaction_count', ascending=False).head(10)
-            fig_state = px.bar(trans_state_sorted, x='Transaction_count', y='State', orientation='h', text_auto='.2s',
-                            labels={'Transaction_count': "Total Count"}, title="Top 10 States")
-            fig_state.update_layout(yaxis=dict(autorange="reversed"), height=400, title_x=0.5)
-            st.plotly_chart(fig_state, use_container_width=True)
-        else: 
-            st.warning("Aggregated transaction data unavailable.")
-
-        st.subheader('Registered Users by State')
-        if not df_map_user.empty and geojson_data is not None:
-            df_map_user['State_Mapped'] = df_map_user['State'].replace(state_name_mapping)
-            fig_user_map = px.choropleth(df_map_user, geojson=geojson_data, locations='State_Mapped', featureidkey='properties.st_nm',
-                                        color='TotalRegisteredUsers', projection='mercator', labels={'TotalRegisteredUsers': "Registered Users"},
-                                        color_continuous_scale='Reds', title="Registered Users Distribution")
-            fig_user_map.update_geos(fitbounds='locations', visible=False)
-            fig_user_map.update_layout(height=400, title_x=0.5, margin=dict(l=0, r=0, t=40, b=0))
-            st.plotly_chart(fig_user_map, use_container_width=True)
-        elif geojson_data is None: 
-            st.warning("GeoJSON missing.")
-        else: 
-            st.warning("Map user data unavailable.")
-
-
-with tab_profile:
-    st.header("Detailed Dataset Profiling")
-    add_vertical_space(1)
-    dataset_options_profile = {
-        "Aggregated Transactions": "aggregated_transaction", "Aggregated Users": "aggregated_user",
-        "Map Transactions": "map_transaction", "Map Users": "map_user",
-        "Top Transactions": "top_transaction", "Top Users": "top_user",
-        "Aggregated Insurance": "aggregated_insurance", "Map Insurance": "map_insurance",
-        "Top Insurance": "top_insurance"
-    }
-    selected_profile_name = st.selectbox("Select Dataset to Profile:", dataset_options_profile.keys(), key='profile_select')
-    profile_table_name = dataset_options_profile[selected_profile_name]
-
-    if st.button("Generate Profile Report", key=f"gen_{profile_table_name}"):
-        df_profile = fetch_data(f"SELECT * FROM {profile_table_name}")
-        if not df_profile.empty:
-            with st.spinner(f"Generating profile for '{selected_profile_name}'..."):
-                profile = ProfileReport(
-                    df_profile,
-                    title=f"Profiling Report - {selected_profile_name}",
-                    explorative=True,
-                    minimal=False # Generate full report here
-                )
-                # Use components.html to display
-                st.components.v1.html(profile.to_html(), height=800, scrolling=True)
+# Only the open tab runs: opening the profiling tab no longer builds the Quick Visuals charts.
+# The charts come from utils.figure_cache, pre-rendered by the ETL for the current data version.
+tab_charts, tab_profile = lazy_tabs(["Quick Visuals", "Detailed Profiling Report"], key='overview_tabs')
+
+if tab_charts.open:
+    with tab_charts:
+        st.header("Quick Visual Summaries")
+        add_vertical_space(1)
+
+        col1, col2 = st.columns(2)
+        with col1:
+            st.subheader("Transaction Breakdown by Type")
+            show_cached_figure('overview_type', fetch_data, resources)
+            st.subheader("Top 10 Districts (Count)")
+            show_cached_figure('overview_district', fetch_data, resources)
+
+        with col2:
+            st.subheader("Top 10 States (Count)")
+            show_cached_figure('overview_state', fetch_data, resources)
+            st.subheader('Registered Users by State')
+            show_cached_figure('overview_user_map', fetch_data, resources)
+
+
+if tab_profile.open:
+    with tab_profile:
+        st.header("Detailed Dataset Profiling")
+        add_vertical_space(1)
+        dataset_options_profile = {
+            "Aggregated Transactions": "aggregated_transaction", "Aggregated Users": "aggregated_user",
+            "Map Transactions": "map_transaction", "Map Users": "map_user",
+            "Top Transactions": "top_transaction", "Top Users": "top_user",
+            "Aggregated Insurance": "aggregated_insurance", "Map Insurance": "map_insurance",
+            "Top Insurance": "top_insurance"
+        }
+        selected_profile_name = st.selectbox("Select Dataset to Profile:", dataset_options_profile.keys(), key='profile_select')
+        profile_table_name = dataset_options_profile[selected_profile_name]
+
+        # Reports are built offline by the ETL (per table, only when its data changed); the page only serves them.
+        profile = load_profile(profile_table_name, load_data_version())
+        job_key = f'profile_job_{profile_table_name}'
+        job = st.session_state.get(job_key)
+        if profile is None and job is not None and job.status == 'done':
+            load_profile.clear() # The job stored its report: later loads (any session) read it from the table
+            profile = job.result
+        if profile is not None:
+            mode = 'Minimal' if profile['Mode'] == 'minimal' else 'Full'
+            sample = f", sample of {int(profile['Sample_rows']):,} rows" if pd.notna(profile['Sample_rows']) else ""
+            st.caption(f"{mode} report on {int(profile['Total_rows']):,} rows{sample}, generated {profile['Generated_at']} UTC.")
+            st.components.v1.html(profile['Html'], height=800, scrolling=True)
         else:
-            st.error(f"Could not fetch data for {selected_profile_name} to generate report.")
+            st.info(f"No profile report has been generated for '{selected_profile_name}' yet. "
+                    "Run `python etl_script.py --only profiles` to build it, or generate a quick one here.")
+            # A background job shared by every session asking for this table; one profile runs at a time
+            if st.button(f"Generate minimal report (sample of {ON_DEMAND_SAMPLE_ROWS:,} rows)", key=f'gen_{profile_table_name}'):
+                try:
+                    st.session_state[job_key] = submit_job('profile', (profile_table_name, load_data_version()), profile_job,
+                                                           profile_table_name, f"Profiling Report - {selected_profile_name}")
+                except JobRejected as err:
+                    st.warning(str(err))
+            job = st.session_state.get(job_key)
+            if job is not None:
+                if not job.finished:
+                    show_job_progress(job, f"Profiling {selected_profile_name}...")
+                elif job.status == 'failed':
+                    st.error(f"Could not generate the report: {job.error}")
+
+            # Column summary meanwhile, estimated from the ETL's stratified sample; the exact one (a full-table
+            # read, shared by every session asking for it) only on request
+            st.subheader("Column Summary")
+            data_version = load_data_version()
+            summary_key = f'summary_job_{profile_table_name}'
+            sample = load_sample(profile_table_name, data_version)
+            if st.button("Compute exact summary (reads the full table)", key=f'exact_{profile_table_name}'):
+                try:
+                    st.session_state[summary_key] = submit_job('load', ('summary', profile_table_name, data_version), summary_job,
+                                                               profile_table_name)
+                except JobRejected as err:
+                    st.warning(str(err))
+            summary = st.session_state.get(summary_key)
+            if summary is not None and summary.status == 'done':
+                exact, total_rows = summary.result
+                st.caption(f"Exact, over all {total_rows:,} rows.")
+                st.dataframe(exact.drop(columns=['Mean_margin', 'Total_margin']), hide_index=True, use_container_width=True)
+            else:
+                if sample is not None:
+                    rows, strata = sample
+                    st.caption(f"Approximate, from a stratified sample of {len(rows):,} of {int(strata['Stratum_rows'].sum()):,} rows "
+                               "(every state and year): ± columns are 95% margins, Distinct counts the values seen in the sample.")
+                    st.dataframe(estimated_summary(rows, strata), hide_index=True, use_container_width=True)
+                elif summary is None:
+                    st.caption("No sample of this table yet (`python etl_script.py --only samples`).")
+                if summary is not None and not summary.finished:
+                    show_job_progress(summary, "Reading the full table...")
+                elif summary is not None:
+                    st.error(f"Could not summarize the table: {summary.error}")
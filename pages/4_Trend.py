@@ -2,111 +2,135 @@
 import streamlit as st
 import pandas as pd
 import mysql.connector
-import plotly.express as px
-import altair as alt # Use Altair for bar charts like reference
 from streamlit_extras.add_vertical_space import add_vertical_space
+from utils.catalog import load_catalog
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.lazy import lazy_expander
+from utils.data_version import load_data_version
+from utils.figures import (TREND_OVERLAYS, build_growth_ranking, build_nearby_figure, build_pincode_trend, build_trend_figure,
+                           pincode_trend_query, top_categories_query)
+from utils.figure_cache import show_cached_figure
+from utils.payload import slim_figure
+from utils.timeseries import GROWTH_MEASURES, LEVELS, TREND_DATASETS, load_trend_matrices
+from utils.forecast import FORECAST_METRICS, forecast_query
+from utils.nearby import MAX_NEIGHBOURS, NEIGHBOURS, load_district_index, nearby_series
+from utils.search import entity_search, search_params
 
 # --- Page Config ---
 st.set_page_config(page_title='PhonePe Pulse | Trends', layout='wide', page_icon='Logo.png')
 
-# --- NEW DB Credentials (using Streamlit Secrets) ---
-DB_HOST = st.secrets["database"]["host"]
-DB_PORT = st.secrets["database"]["port"]
-DB_USER = st.secrets["database"]["user"]
-DB_PASSWORD = st.secrets["database"]["password"]
-DB_NAME = st.secrets["database"]["db_name"]
-DB_SSL_CA = st.secrets["database"]["ssl_ca"]
-
 # --- DB Fetch Function ---
 @st.cache_data(ttl=3600)
-def fetch_data(query):
-    # Spinner is outside this function
+def _fetch_data(query, data_version):
     try:
-        # This is the updated connection call for Aiven
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            ssl_ca=DB_SSL_CA,
-            ssl_verify_cert=True
-        )
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        return df
-    except mysql.connector.Error as err:
+        return optimize_dtypes(run_query(query)) # Compact dtypes for every cached copy
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
         st.error(f"Database Error: {err}")
         return pd.DataFrame()
 
+def fetch_data(query):
+    # Cached per data version, so tables an ETL stage rebuilds and republishes are re-read
+    return _fetch_data(query, load_data_version())
+
 # --- Hide elements ---
 st.markdown("""<style> footer {visibility: hidden;} </style>""", unsafe_allow_html=True)
 st.markdown("""<style>.css-1jc7ptx, .e1ewe7hr3, .viewerBadge_container__1QSob, .styles_viewerBadge__1yB5_, .viewerBadge_link__1S137, .viewerBadge_text__1JaDK {display: none;}</style>""", unsafe_allow_html=True)
 
 st.title(':violet[Trend Analysis]')
+entity_search()
 add_vertical_space(2)
 
-# --- Fetch Initial Data for Filters ---
-with st.spinner("Loading filter options..."):
-    # Using map_transaction as it has State, District, Year, Quarter
-    states_df = fetch_data("SELECT DISTINCT State FROM map_transaction ORDER BY State")
-    years_df = fetch_data("SELECT DISTINCT Year FROM map_transaction ORDER BY Year DESC")
-    quarters_df = fetch_data("SELECT DISTINCT Quarter FROM map_transaction ORDER BY Quarter")
-
-states = states_df['State'].tolist() if not states_df.empty else []
-years = years_df['Year'].tolist() if not years_df.empty else []
+# --- Filter Options (from the ETL catalog, loaded once per process) ---
+# Using map_transaction as it has State, District, Year, Quarter
+catalog = load_catalog()
+states = catalog.options('map_transaction', 'State')
+years = catalog.options('map_transaction', 'Year', descending=True)
 year_options_all = ['All'] + years
-quarters = quarters_df['Quarter'].tolist() if not quarters_df.empty else []
+quarters = catalog.options('map_transaction', 'Quarter')
 quarter_options_all = ["All"] + quarters
+resources = {} # No shared assets needed by this page's figure builders
+ALL_DISTRICTS = 'All Districts' # The state's own series
+PINCODE_TABLES = ('top_transaction', 'top_user', 'top_insurance')
+
+# --- Search jump: a state, district or pincode picked in the sidebar search preselects the sections below ---
+jump = search_params()
+if 'state' in jump:
+    st.session_state['state1_trend_pg4'] = jump['state']
+    st.session_state['district1_trend_pg4'] = jump.get('district', ALL_DISTRICTS)
+    if 'district' in jump:
+        st.session_state.update({'dataset4_nearby_pg4': 'Transactions', 'state4_nearby_pg4': jump['state'], 'district4_nearby_pg4': jump['district']})
+    if 'pincode' in jump:
+        st.session_state.update({'state5_pincode_pg4': jump['state'], 'pincode5_pincode_pg4': jump['pincode']})
+        st.toast(f"Pincode {jump['pincode']}: see Pincode Trend at the bottom of the page.")
 
 # --- 1. Transaction Trend Over Time (Line Charts) ---
+# Series come from utils.timeseries: one district x quarter matrix per metric, built once per data version
+# with QoQ/YoY growth, rolling averages and CAGR for every district and state, so switching location or
+# overlay needs no query. Next-quarter projections come precomputed from the ETL forecasts table.
+data_version = load_data_version()
 st.subheader(':blue[Transaction Trend - Count & Amount]')
 add_vertical_space(1)
-col1a, col1b, col1c = st.columns(3)
+col1a, col1b, col1c, col1d = st.columns([1, 1, 1, 2])
 state1 = col1a.selectbox('State', states, key='state1_trend_pg4')
-# Fetch districts dynamically
-with st.spinner(f"Loading districts for {state1}..."):
-    districts_in_state_df = fetch_data(f"SELECT DISTINCT District FROM map_transaction WHERE State = '{state1}' ORDER BY District")
-districts1_options = districts_in_state_df['District'].tolist() if not districts_in_state_df.empty else []
+# Districts for the chosen state come from the catalog (no query per state change)
+districts1_options = [ALL_DISTRICTS] + catalog.scoped('map_transaction', 'District', state1)
 district1 = col1b.selectbox('District', districts1_options, key='district1_trend_pg4')
 year1 = col1c.selectbox('Year', year_options_all, key='year1_trend_pg4')
+overlays1 = col1d.multiselect('Overlays', list(TREND_OVERLAYS), key='overlay1_trend_pg4')
+forecasts1 = fetch_data(forecast_query(state1, None if district1 == ALL_DISTRICTS else district1)) if state1 and district1 else pd.DataFrame()
+forecasts1 = forecasts1.set_index('Metric') if not forecasts1.empty else forecasts1
+
+
+def show_trend(metric_label, amount):
+    table, metrics = TREND_DATASETS['Transactions']
+    matrices = load_trend_matrices(table, metrics[metric_label], data_version)
+    place = state1 if district1 == ALL_DISTRICTS else f"{district1}, {state1}"
+    matrix, key = (matrices['State'], (state1,)) if district1 == ALL_DISTRICTS else (matrices['District'], (state1, district1))
+    series = matrix.series(*key)
+    if series is None or series.empty:
+        st.warning("No data found for the selected location and year.")
+        return
+    latest = series.iloc[-1]
+    cagr = matrix.cagr_of(*key)
+    col_m1, col_m2, col_m3 = st.columns(3)
+    col_m1.metric("CAGR", f"{cagr:+.1%}" if pd.notna(cagr) else "n/a", help=GROWTH_MEASURES['CAGR'])
+    col_m2.metric(f"YoY ({latest['Period']})", f"{latest['YoY']:+.1%}" if pd.notna(latest['YoY']) else "n/a", help=GROWTH_MEASURES['YoY'])
+    col_m3.metric(f"QoQ ({latest['Period']})", f"{latest['QoQ']:+.1%}" if pd.notna(latest['QoQ']) else "n/a", help=GROWTH_MEASURES['QoQ'])
+    forecast = forecasts1.loc[metrics[metric_label]] if metrics[metric_label] in forecasts1.index else None
+    if year1 != 'All':
+        series = series[series['Year'] == year1] # Growth still compares against the previous year's quarters
+        forecast = forecast if forecast is not None and forecast['Year'] == year1 else None
+    if series.empty:
+        st.warning("No data found for the selected location and year.")
+        return
+    fig = build_trend_figure(series, metric_label, f"{metric_label} Trend in {place}", overlays1, amount, forecast)
+    st.plotly_chart(slim_figure(fig), use_container_width=True)
+    lazy_expander(f"View {metric_label.split()[-1]} Data", f"data1_{'amount' if amount else 'count'}_trend_pg4", lambda: st.dataframe(
+        series[['Year', 'Quarter', 'Value', 'Rolling', 'QoQ', 'YoY']].rename(columns={'Value': metric_label}).reset_index(drop=True)))
+
 
 if state1 and district1: # Ensure selections are made
-    with st.spinner(f"Loading trend data for {district1}, {state1}..."):
-        query1 = f"SELECT Year, Quarter, SUM(Transaction_count) as TotalCount, SUM(Transaction_amount) as TotalAmount FROM map_transaction WHERE State = '{state1}' AND District = '{district1}'"
-        if year1 != 'All':
-            query1 += f" AND Year = {year1}"
-        query1 += " GROUP BY Year, Quarter ORDER BY Year, Quarter"
-        df1 = fetch_data(query1)
-
-    if not df1.empty:
-        df1['Period'] = df1['Year'].astype(str) + '-Q' + df1['Quarter'].astype(str)
-        # Sort by Period to ensure lines connect correctly if multiple years shown
-        df1 = df1.sort_values(by=['Year', 'Quarter'])
-
-        fig1_count = px.line(df1, x='Period', y='TotalCount', markers=True,
-                            title=f'Transaction Count Trend in {district1}, {state1}')
-        # Improved hover template
-        fig1_count.update_traces(hovertemplate="<b>Period:</b> %{x}<br><b>Count:</b> %{y:,}<extra></extra>")
-        fig1_count.update_layout(yaxis_title='Transaction Count', xaxis_title='Period (Year-Quarter)', width=900, height=450, title_x=0.5)
-
-        fig1_amount = px.line(df1, x='Period', y='TotalAmount', markers=True,
-                            title=f'Transaction Amount Trend in {district1}, {state1}')
-        # Improved hover template
-        fig1_amount.update_traces(hovertemplate="<b>Period:</b> %{x}<br><b>Amount:</b> ₹%{y:,.0f}<extra></extra>")
-        fig1_amount.update_layout(yaxis_title='Transaction Amount (₹)', xaxis_title='Period (Year-Quarter)', width=900, height=450, title_x=0.5)
-
-        tab1_count, tab1_amount = st.tabs(['🫰 Transaction Count Trend', '💰 Transaction Amount Trend'])
-        with tab1_count:
-            st.plotly_chart(fig1_count, use_container_width=True) # Use container width
-            with st.expander("View Count Data"):
-                st.dataframe(df1[['Year', 'Quarter', 'TotalCount']].reset_index(drop=True))
-        with tab1_amount:
-            st.plotly_chart(fig1_amount, use_container_width=True) # Use container width
-            with st.expander("View Amount Data"):
-                st.dataframe(df1[['Year', 'Quarter', 'TotalAmount']].reset_index(drop=True))
+    tab1_count, tab1_amount = st.tabs(['🫰 Transaction Count Trend', '💰 Transaction Amount Trend'])
+    with tab1_count:
+        show_trend('Transaction Count', amount=False)
+    with tab1_amount:
+        show_trend('Transaction Amount', amount=True)
+
+    # Next-quarter projections of every forecast metric for the same location
+    if not forecasts1.empty:
+        year_f, quarter_f = int(forecasts1['Year'].iloc[0]), int(forecasts1['Quarter'].iloc[0])
+        st.markdown(f"**Next-quarter projections ({year_f}-Q{quarter_f}, 80% interval)**")
+        for col, (metric, (table, label)) in zip(st.columns(len(FORECAST_METRICS)), FORECAST_METRICS.items()):
+            if metric not in forecasts1.index:
+                col.metric(label, "n/a", help="Fewer than two years of history, or no data for the latest quarter.")
+                continue
+            row = forecasts1.loc[metric]
+            prefix = "₹" if metric == 'Transaction_amount' else ""
+            col.metric(label, f"{prefix}{row['Forecast']:,.0f}",
+                       help=f"Between {prefix}{row['Lower']:,.0f} and {prefix}{row['Upper']:,.0f} (80%). Model: {row['Model']}")
     else:
-        st.warning("No data found for the selected location and year.")
+        st.caption("No next-quarter projections for this location (fewer than two years of history).")
 else:
     st.info("Please select a State and District.")
 add_vertical_space(2)
@@ -120,61 +144,83 @@ year2 = col2b.selectbox('Year', years, key='year2_trend_pg4') # Year specific re
 quarter2 = col2c.selectbox('Quarter', quarter_options_all, key='quarter2_trend_pg4')
 
 if year2: # Ensure year is selected
-    entity = 'State' if category2 == 'States' else ('District' if category2 == 'Districts' else 'Pincode')
-    # Determine the correct table and grouping
-    if category2 == 'Pincodes':
-        table_prefix = 'top'
-        group_by_cols = [entity, 'State'] # Include State for Pincode grouping and tooltip
-        select_cols = [entity, 'State', 'SUM(Transaction_amount) as TotalAmount']
-    elif category2 == 'Districts':
-        table_prefix = 'map'
-        group_by_cols = [entity, 'State']
-        select_cols = [entity, 'State', 'SUM(Transaction_amount) as TotalAmount']
-    else: # States
-        table_prefix = 'map'
-        group_by_cols = [entity]
-        select_cols = [entity, 'SUM(Transaction_amount) as TotalAmount']
-
     with st.spinner(f"Loading top {category2} data..."):
-        query2 = f"SELECT {', '.join(select_cols)} FROM {table_prefix}_transaction WHERE Year = {year2}"
-        if quarter2 != 'All':
-            query2 += f" AND Quarter = {int(quarter2)}"
-        query2 += f" GROUP BY {', '.join(group_by_cols)} ORDER BY TotalAmount DESC LIMIT 10"
-        df2 = fetch_data(query2)
-
-    if not df2.empty:
-        if entity == 'Pincode':
-            df2['Pincode'] = df2['Pincode'].astype(str)
-
-        # Base chart definition
-        base = alt.Chart(df2, height=500).encode(
-            x=alt.X('TotalAmount', title='Total Transaction Amount', axis=alt.Axis(format='~s')),
-            y=alt.Y(entity, sort='-x', title=category2[:-1]),
-            # Define tooltip fields
-            tooltip = [
-                alt.Tooltip(entity, title=category2[:-1]), # Title matches axis
-                alt.Tooltip('State', title='State') if 'State' in df2.columns else alt.value(None), # Show State if available
-                alt.Tooltip('TotalAmount', title='Total Amount', format='~s') # Format amount
-            ]
-        )
-
-        # Apply coloring
-        if 'State' in df2.columns and entity != 'State':
-            chart2 = base.mark_bar().encode(color=alt.Color('State', title='State')) # Color by State
-        else:
-            chart2 = base.mark_bar(color='steelblue') # Single color
-
-        # Add title and make interactive
-        chart2 = chart2.properties(
-            title=f"Top 10 {category2} by Transaction Amount ({year2}{f', Q{quarter2}' if quarter2 != 'All' else ''})"
-        ).configure_title(
-            align='center', anchor='middle'
-        ).interactive()
-
-        st.altair_chart(chart2, use_container_width=True)
-        with st.expander("View Top 10 Data"):
-            st.dataframe(df2.reset_index(drop=True))
-    else:
-        st.warning("No data found for the selected filters.")
+        shown = show_cached_figure('top_categories', fetch_data, resources, category=category2, year=year2, quarter=quarter2)
+    if shown:
+        lazy_expander("View Top 10 Data", 'data2_trend_pg4', lambda: st.dataframe(
+            fetch_data(top_categories_query(category2, year2, quarter2)).reset_index(drop=True)))
 else:
     st.info("Please select a Year for Top Categories analysis.")
+add_vertical_space(2)
+
+
+# --- 3. Fastest-Growing Districts and States ---
+# Ranked over every entity at once from the same cached matrices (no query per district).
+st.subheader(':blue[Fastest-Growing Districts & States]')
+col3a, col3b, col3c, col3d, col3e = st.columns(5)
+dataset3 = col3a.selectbox('Dataset', list(TREND_DATASETS), key='dataset3_growth_pg4')
+table3, metrics3 = TREND_DATASETS[dataset3]
+metric3 = col3b.selectbox('Metric', list(metrics3), key=f'metric3_growth_pg4_{dataset3}')
+level3 = col3c.selectbox('Level', LEVELS, key='level3_growth_pg4')
+measure3 = col3d.selectbox('Growth', list(GROWTH_MEASURES), key='measure3_growth_pg4', help="\n\n".join(f"**{k}**: {v}" for k, v in GROWTH_MEASURES.items()))
+floor3 = col3e.slider('Skip smallest (%)', 0, 90, 25, step=5, key='floor3_growth_pg4',
+                      help="Leave out the entities whose latest quarter is in this bottom percentage, where tiny bases inflate growth.")
+
+ranking3 = load_trend_matrices(table3, metrics3[metric3], data_version)[level3].ranking(measure3, n=10, min_percentile=floor3)
+if not ranking3.empty:
+    st.plotly_chart(slim_figure(build_growth_ranking(ranking3, level3, metric3, measure3)), use_container_width=True)
+    st.caption(GROWTH_MEASURES[measure3])
+    lazy_expander("View Ranking Data", 'data3_growth_pg4', lambda: st.dataframe(ranking3))
+else:
+    st.warning(f"Not enough history to rank {level3.lower()}s by {measure3}.")
+add_vertical_space(2)
+
+
+# --- 4. Compare with Nearby Districts ---
+# Neighbours come from a KD-tree over the district coordinates (utils.nearby, built once per data version)
+# and their series from the same cached matrices as above, so a new district or k needs no query.
+st.subheader(':blue[Compare with Nearby Districts]')
+col4a, col4b, col4c, col4d, col4e = st.columns(5)
+dataset4 = col4a.selectbox('Dataset', list(TREND_DATASETS), key='dataset4_nearby_pg4')
+table4, metrics4 = TREND_DATASETS[dataset4]
+metric4 = col4b.selectbox('Metric', list(metrics4), key=f'metric4_nearby_pg4_{dataset4}')
+state4 = col4c.selectbox('State', catalog.options(table4, 'State'), key='state4_nearby_pg4')
+district4 = col4d.selectbox('District', catalog.scoped(table4, 'District', state4), key='district4_nearby_pg4')
+k4 = col4e.slider('Nearby districts', 1, MAX_NEIGHBOURS, NEIGHBOURS, key='k4_nearby_pg4',
+                  help="Closest districts by straight-line distance, across state borders too.")
+
+if state4 and district4:
+    neighbours4 = load_district_index(data_version).nearest(state4, district4, k4)
+    if neighbours4.empty:
+        st.warning(f"No coordinates for {district4}; add an alias to district_aliases.csv if district_coords.csv lists it under another name.")
+    else:
+        lines4 = nearby_series(load_trend_matrices(table4, metrics4[metric4], data_version)['District'], state4, district4, neighbours4)
+        fig4 = build_nearby_figure(lines4, district4, metric4, f"{metric4} in {district4} and Nearby Districts",
+                                   amount=metrics4[metric4] in ('Transaction_amount', 'Amount'))
+        st.plotly_chart(slim_figure(fig4), use_container_width=True)
+        lazy_expander("View Nearby Districts", 'data4_nearby_pg4', lambda: st.dataframe(neighbours4))
+else:
+    st.info("Please select a State and District.")
+add_vertical_space(2)
+
+
+# --- 5. Pincode Trend ---
+# Pincodes only appear in the top_* tables, i.e. in the quarters they were among their state's top pincodes.
+st.subheader(':blue[Pincode Trend]')
+col5a, col5b, buff5 = st.columns([1, 1, 3])
+state5 = col5a.selectbox('State', catalog.options('top_transaction', 'State'), key='state5_pincode_pg4')
+pincodes5 = sorted({pincode for table in PINCODE_TABLES for pincode in catalog.scoped(table, 'Pincode', state5)})
+pincode5 = col5b.selectbox('Pincode', pincodes5, key='pincode5_pincode_pg4')
+
+if state5 and pincode5:
+    with st.spinner(f"Loading pincode {pincode5}..."):
+        df5 = fetch_data(pincode_trend_query(state5, pincode5))
+    if not df5.empty:
+        st.plotly_chart(slim_figure(build_pincode_trend(df5, f"Pincode {pincode5}, {state5}")), use_container_width=True)
+        st.caption("Quarters without a point are those in which the pincode was not among the state's top pincodes.")
+        lazy_expander("View Pincode Data", 'data5_pincode_pg4', lambda: st.dataframe(
+            df5.pivot_table(index=['Year', 'Quarter'], columns='Metric', values='Value', observed=True).reset_index()))
+    else:
+        st.warning("No data found for the selected pincode.")
+else:
+    st.info("Please select a State and Pincode.")
@@ -2,116 +2,67 @@
 import streamlit as st
 import pandas as pd
 import mysql.connector
-import plotly.express as px
-import seaborn as sns # Use Seaborn for catplot
-import matplotlib.pyplot as plt # Needed for Seaborn plots in Streamlit
 from streamlit_extras.add_vertical_space import add_vertical_space
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+from utils.catalog import load_catalog
+from utils.lazy import lazy_expander, lazy_module
+from utils.payload import slim_figure
+from utils.figure_cache import show_cached_figure
+from utils.comparison import REGIONS_QUERY, region_quarter_query, state_type_query
+from utils.data_version import load_data_version
+from utils.concentration import ALL_QUARTERS, CONCENTRATION_DATASETS, CONCENTRATION_MEASURES, load_concentration
+from utils.search import entity_search
+
+# Imported on first use, when a comparison is drawn
+px = lazy_module('plotly.express')
 
 # --- Page Config ---
 st.set_page_config(page_title='PhonePe Pulse | Comparison', layout='wide', page_icon='Logo.png')
 
-# --- NEW DB Credentials (using Streamlit Secrets) ---
-DB_HOST = st.secrets["database"]["host"]
-DB_PORT = st.secrets["database"]["port"]
-DB_USER = st.secrets["database"]["user"]
-DB_PASSWORD = st.secrets["database"]["password"]
-DB_NAME = st.secrets["database"]["db_name"]
-DB_SSL_CA = st.secrets["database"]["ssl_ca"]
-
 # --- DB Fetch Function ---
 @st.cache_data(ttl=3600)
-def fetch_data(query):
-    # Spinner is outside this function
+def _fetch_data(query, data_version):
     try:
-        # This is the updated connection call for Aiven
-        conn = mysql.connector.connect(
-            host=DB_HOST,
-            port=DB_PORT,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            database=DB_NAME,
-            ssl_ca=DB_SSL_CA,
-            ssl_verify_cert=True
-        )
-        df = pd.read_sql_query(query, conn)
-        
-        # Convert Amount/Count to numeric, coercing errors (specific to this file)
-        if 'Transaction_amount' in df.columns:
-            df['Transaction_amount'] = pd.to_numeric(df['Transaction_amount'], errors='coerce').fillna(0)
-        if 'Transaction_count' in df.columns:
-            df['Transaction_count'] = pd.to_numeric(df['Transaction_count'], errors='coerce').fillna(0)
-        
-        conn.close()
-        return df
-    except mysql.connector.Error as err:
+        df = run_query(query)
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
         st.error(f"Database Error: {err}")
         return pd.DataFrame()
+    # Missing amounts and counts are zero on this page
+    if 'Transaction_amount' in df.columns:
+        df['Transaction_amount'] = pd.to_numeric(df['Transaction_amount'], errors='coerce').fillna(0)
+    if 'Transaction_count' in df.columns:
+        df['Transaction_count'] = pd.to_numeric(df['Transaction_count'], errors='coerce').fillna(0)
+    return optimize_dtypes(df) # Compact dtypes for every cached copy
+
+def fetch_data(query):
+    # Cached per data version, so tables an ETL stage rebuilds and republishes are re-read
+    return _fetch_data(query, load_data_version())
 
 # --- Hide elements ---
 st.markdown("""<style> footer {visibility: hidden;} </style>""", unsafe_allow_html=True)
 st.markdown("""<style>.css-1jc7ptx, .e1ewe7hr3, .viewerBadge_container__1QSob, .styles_viewerBadge__1yB5_, .viewerBadge_link__1S137, .viewerBadge_text__1JaDK {display: none;}</style>""", unsafe_allow_html=True)
 
 st.title(':violet[Comparative Analysis]')
+entity_search()
 add_vertical_space(2)
 
-# --- Fetch Initial Data for Filters & Add Region ---
-@st.cache_data(ttl=3600)
-def get_all_agg_trans_with_region():
-    with st.spinner("Loading base comparison data..."): # Spinner for initial load
-        df = fetch_data("SELECT State, Year, Quarter, Transaction_type, Transaction_count, Transaction_amount FROM aggregated_transaction")
-    if not df.empty:
-        south = ['Andhra Pradesh', 'Karnataka', 'Kerala', 'Tamil Nadu', 'Telangana', 'Puducherry', 'Lakshadweep', 'Andaman & Nicobar Islands']
-        central = ['Chhattisgarh', 'Madhya Pradesh', 'Uttar Pradesh', 'Uttarakhand']
-        west = ['Goa', 'Gujarat', 'Maharashtra', 'Dadra & Nagar Haveli & Daman & Diu']
-        north = ['Chandigarh', 'Delhi', 'Haryana', 'Himachal Pradesh', 'Jammu & Kashmir', 'Ladakh', 'Punjab', 'Rajasthan']
-        east = ['Bihar', 'Jharkhand', 'Odisha', 'West Bengal', 'Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Sikkim', 'Tripura']
-        conditions = [df['State'].isin(south), df['State'].isin(central), df['State'].isin(west), df['State'].isin(north), df['State'].isin(east)]
-        choices = ['South', 'Central', 'West', 'North', 'East']
-        df['Region'] = pd.Series(pd.NA).astype("string")
-        for i, choice in enumerate(choices):
-            df['Region'] = df['Region'].fillna(pd.NA).mask(conditions[i], choice)
-        df['Region'] = df['Region'].fillna('Unknown')
-        df["Transaction_amount(B)"] = df["Transaction_amount"] / 1e9
-        df["Year"] = pd.Categorical(df["Year"], categories=sorted(df["Year"].unique()), ordered=True)
-    return df
-
-trans_df_all = get_all_agg_trans_with_region()
-
-# Get filter options safely
-states = sorted(trans_df_all['State'].unique()) if not trans_df_all.empty else []
-years = sorted(trans_df_all['Year'].unique()) if not trans_df_all.empty else []
-quarters = sorted(trans_df_all['Quarter'].unique()) if not trans_df_all.empty else []
-quarter_options = ["All"] + quarters
-regions = sorted(trans_df_all['Region'].dropna().unique()) if not trans_df_all.empty else []
-
-
-# --- 1. Region-wise Transaction Volume Comparison (Seaborn Catplot) ---
+# --- Filter Options (from the ETL catalog and state dimension table) ---
+# Each section below asks MySQL for its grouped rows only (utils.comparison), so the page never loads
+# the aggregated_transaction fact table.
+catalog = load_catalog()
+states = catalog.options('aggregated_transaction', 'State')
+years = catalog.options('aggregated_transaction', 'Year')
+quarter_options = ["All"] + catalog.options('aggregated_transaction', 'Quarter')
+regions_df = fetch_data(REGIONS_QUERY)
+regions = regions_df['Region'].astype(str).tolist() if not regions_df.empty else []
+
+
+# --- 1. Region-wise Transaction Volume Comparison ---
+# Drawn in the browser from the Region x Year rollup the ETL builds (a few dozen rows), and cached per
+# data version by utils.figure_cache like the other pages' charts.
 st.subheader(':blue[Region-wise Transaction Amount Comparison (Billions ₹)]')
-if not trans_df_all.empty:
-    with st.spinner("Generating region comparison chart..."):
-        df_region_year = trans_df_all.groupby(['Region', 'Year'], observed=False)['Transaction_amount(B)'].sum().reset_index()
-
-        # Check if data exists after aggregation
-        if not df_region_year.empty:
-            sns.set_style("whitegrid")
-            try:
-                fig1 = sns.catplot(
-                    x="Year", y="Transaction_amount(B)",
-                    col="Region", data=df_region_year,
-                    kind="bar", errorbar=None,
-                    height=4, aspect=1.2, col_wrap=3,
-                    sharex=True, sharey=False
-                )
-                fig1.set_axis_labels("Year", "Total Transaction Amount (Billions ₹)")
-                fig1.set_titles("Region: {col_name}")
-                fig1.fig.suptitle('Total Transaction Amount per Year by Region', y=1.03)
-                st.pyplot(fig1)
-            except Exception as e:
-                st.error(f"Error generating Seaborn plot: {e}")
-        else:
-            st.warning("No data found after grouping by Region and Year.")
-else:
-    st.warning("No base data available for region comparison.")
+show_cached_figure('region_year', fetch_data, {})
 add_vertical_space(2)
 
 # --- 2. State Comparison by Transaction Type (Plotly Grouped Bar) ---
@@ -123,16 +74,9 @@ quarter2 = col2c.selectbox("Quarter", quarter_options, key='quarter2_compare_pg5
 
 if selected_states and year2: # Ensure state(s) and year selected
     with st.spinner("Loading state comparison data..."):
-        df2_filtered = trans_df_all[
-            (trans_df_all["State"].isin(selected_states)) &
-            (trans_df_all["Year"] == year2)
-        ]
-        if quarter2 != "All":
-            df2_filtered = df2_filtered[df2_filtered["Quarter"] == int(quarter2)]
-
-    if not df2_filtered.empty:
-        df2_grouped = df2_filtered.groupby(['State', 'Transaction_type'])['Transaction_count'].sum().reset_index()
+        df2_grouped = fetch_data(state_type_query(selected_states, year2, quarter2)) # One row per state and type
 
+    if not df2_grouped.empty:
         fig2 = px.bar(
             df2_grouped, x="Transaction_type", y="Transaction_count",
             color="State", barmode='group',
@@ -143,9 +87,8 @@ if selected_states and year2: # Ensure state(s) and year selected
         fig2.update_traces(hovertemplate="<b>State:</b> %{fullData.name}<br><b>Type:</b> %{x}<br><b>Count:</b> %{y:,}<extra></extra>")
         fig2.update_layout(width=900, height=500, title_x=0.5)
         fig2.update_traces(marker_line=dict(width=1, color='DarkSlateGrey'))
-        st.plotly_chart(fig2, use_container_width=True) # Use container width
-        with st.expander("View Comparison Data"):
-            st.dataframe(df2_grouped)
+        st.plotly_chart(slim_figure(fig2), use_container_width=True) # Rounded, compact spec
+        lazy_expander("View Comparison Data", 'data2_compare_pg5', lambda: st.dataframe(df2_grouped))
     else:
         st.warning("No data found for the selected states and period.")
 elif not selected_states:
@@ -162,10 +105,10 @@ year3 = col3b.selectbox('Year', years, key='year3_pie_pg5')
 
 if region3 and year3: # Ensure selections
     with st.spinner(f"Loading quarterly data for {region3} ({year3})..."):
-        df3_filtered = trans_df_all[(trans_df_all['Region'] == region3) & (trans_df_all['Year'] == year3)]
+        df3_grouped = fetch_data(region_quarter_query(region3, year3)) # One row per quarter
 
-    if not df3_filtered.empty:
-        df3_grouped = df3_filtered.groupby('Quarter')['Transaction_amount(B)'].sum().reset_index()
+    if not df3_grouped.empty:
+        df3_grouped['Transaction_amount(B)'] = df3_grouped['Transaction_amount'] / 1e9
         # Add check if sum is zero before plotting pie
         if df3_grouped['Transaction_amount(B)'].sum() > 0:
             df3_grouped['Quarter_Label'] = 'Q' + df3_grouped['Quarter'].astype(str)
@@ -178,12 +121,63 @@ if region3 and year3: # Ensure selections
             fig3.update_traces(hovertemplate="<b>Quarter:</b> %{label}<br><b>Amount (B):</b> %{value:.2f}<br><b>Share:</b> %{percent}<extra></extra>",
                             textposition='inside', textinfo='percent+label')
             fig3.update_layout(width=800, height=500, title_x=0.5)
-            st.plotly_chart(fig3, use_container_width=True) # Use container width
-            with st.expander("View Quarterly Data"):
-                st.dataframe(df3_grouped[['Quarter_Label', 'Transaction_amount(B)']].reset_index(drop=True))
+            st.plotly_chart(slim_figure(fig3), use_container_width=True) # Rounded, compact spec
+            lazy_expander("View Quarterly Data", 'data3_pie_pg5', lambda: st.dataframe(df3_grouped[['Quarter_Label', 'Transaction_amount(B)']].reset_index(drop=True)))
         else:
             st.warning(f"Total transaction amount is zero for {region3} in {year3}. Cannot display pie chart.")
     else:
         st.warning("No data found for the selected region and year.")
 else:
     st.info("Please select a Region and Year.")
+add_vertical_space(2)
+
+# --- 4. How Concentrated Each State Is (Gini / Top 10% share / Lorenz curves) ---
+# utils.concentration scores every state and period in one pass, cached per data version; the
+# selections below only pick rows of that result.
+st.subheader(':blue[Concentration Within States]')
+col4a, col4b, col4c, col4d = st.columns(4)
+dataset4 = col4a.selectbox('Dataset', list(CONCENTRATION_DATASETS), key='dataset4_conc_pg5')
+table4, unit4, metrics4 = CONCENTRATION_DATASETS[dataset4]
+metric4 = col4b.selectbox('Metric', list(metrics4), key='metric4_conc_pg5')
+year4 = col4c.selectbox('Year', years, key='year4_conc_pg5')
+quarter4 = col4d.selectbox('Quarter', quarter_options, key='quarter4_conc_pg5')
+measure4 = st.radio('Measure', list(CONCENTRATION_MEASURES), horizontal=True, key='measure4_conc_pg5')
+measure_col4, measure_help4 = CONCENTRATION_MEASURES[measure4]
+
+if year4:
+    summary4, lorenz4 = load_concentration(table4, unit4, metrics4[metric4], load_data_version())
+    period4 = (int(year4), ALL_QUARTERS if quarter4 == 'All' else int(quarter4))
+    df4 = summary4[(summary4['Year'] == period4[0]) & (summary4['Quarter'] == period4[1])].dropna(subset=[measure_col4])
+
+    if not df4.empty:
+        df4 = df4.sort_values(measure_col4).reset_index(drop=True)
+        fig4 = px.bar(
+            df4, x=measure_col4, y='State', orientation='h', color=measure_col4, color_continuous_scale='Purples',
+            hover_data={'Units': True, 'Top_units': True},
+            title=f"{measure4} of {metric4} across {unit4}s ({year4}{f', Q{quarter4}' if quarter4 != 'All' else ''})",
+            labels={measure_col4: measure4, 'Units': f'{unit4}s', 'Top_units': f'{unit4}s in top 10%'}
+        )
+        fig4.update_layout(height=max(400, 22 * len(df4)), title_x=0.5, coloraxis_showscale=False)
+        st.plotly_chart(slim_figure(fig4), use_container_width=True) # Rounded, compact spec
+        st.caption(measure_help4 + ('. Top pincodes lists only each state\'s leading pincodes, so this measures '
+                                    'concentration among those.' if unit4 == 'Pincode' else '.'))
+
+        lorenz_states4 = st.multiselect("Lorenz curves of", df4['State'].tolist(),
+                                        default=df4['State'].tolist()[-1:], key='lorenz4_conc_pg5')
+        if lorenz_states4:
+            curves4 = lorenz4[(lorenz4['Year'] == period4[0]) & (lorenz4['Quarter'] == period4[1])
+                              & lorenz4['State'].isin(lorenz_states4)]
+            origin4 = pd.DataFrame({'State': lorenz_states4, 'Unit_share': 0.0, 'Value_share': 0.0})
+            curves4 = pd.concat([origin4, curves4[['State', 'Unit_share', 'Value_share']]], ignore_index=True)
+            fig4b = px.line(curves4, x='Unit_share', y='Value_share', color='State',
+                            labels={'Unit_share': f'Share of {unit4}s (smallest first)', 'Value_share': f'Share of {metric4}'})
+            fig4b.add_shape(type='line', x0=0, y0=0, x1=1, y1=1, line=dict(dash='dash', color='grey')) # Perfect equality
+            fig4b.update_layout(height=450, title_x=0.5, title='Lorenz Curves')
+            fig4b.update_xaxes(tickformat='.0%')
+            fig4b.update_yaxes(tickformat='.0%')
+            st.plotly_chart(slim_figure(fig4b), use_container_width=True)
+        lazy_expander("View Concentration Data", 'data4_conc_pg5', lambda: st.dataframe(df4))
+    else:
+        st.warning("No data found for the selected dataset and period.")
+else:
+    st.info("Please select a Year.")
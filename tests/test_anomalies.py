@@ -0,0 +1,37 @@
+import numpy as np
+
+from utils.anomalies import MIN_CHANGES, SEASON, Z_THRESHOLD, robust_scores
+
+QUARTERS = 16
+
+
+def _history(rows=5):
+    """Log values growing steadily, each row at its own rate."""
+    t = np.arange(QUARTERS)
+    return np.array([np.log(100) + (0.02 + 0.01 * row) * t for row in range(rows)])
+
+
+def test_flags_a_local_spike():
+    y = _history()
+    y[0, 10] += 1.0
+    scores, changes = robust_scores(y)
+    assert scores[0, 10] >= Z_THRESHOLD
+    assert scores[0, 10 + SEASON] <= -Z_THRESHOLD # The spike drops out a year later
+    assert np.isclose(changes[0, 10], y[0, 10] - y[0, 10 - SEASON])
+    assert (np.abs(np.delete(scores[0], [10, 10 + SEASON])[SEASON:]) < Z_THRESHOLD).all()
+
+
+def test_ignores_national_shocks():
+    y = _history()
+    y[:, 12:] += 0.5 # Every district jumps in the same quarter
+    scores, _ = robust_scores(y)
+    assert (np.abs(scores[:, SEASON:]) < Z_THRESHOLD).all()
+
+
+def test_needs_enough_history():
+    y = _history()
+    y[1, :QUARTERS - SEASON - MIN_CHANGES + 1] = np.nan # One change short
+    scores, _ = robust_scores(y)
+    assert np.isnan(scores[1]).all()
+    assert np.isfinite(scores[0, SEASON:]).all()
+    assert np.isnan(scores[:, :SEASON]).all()
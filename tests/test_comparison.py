@@ -0,0 +1,28 @@
+import sqlite3
+
+from utils.comparison import region_quarter_query, state_type_query
+from utils.regions import STATE_TABLE
+
+
+def _database():
+    db = sqlite3.connect(':memory:')
+    db.execute("CREATE TABLE aggregated_transaction (State TEXT, Year INT, Quarter INT, Transaction_type TEXT, "
+               "Transaction_count INT, Transaction_amount REAL)")
+    db.execute(f"CREATE TABLE {STATE_TABLE} (State TEXT, Region TEXT)")
+    db.executemany("INSERT INTO aggregated_transaction VALUES (?, ?, ?, ?, ?, ?)", [
+        ("Jammu & Kashmir", 2022, 1, 'Recharge', 5, 50.0),
+        ("Dadra & Nagar Haveli's", 2022, 1, 'Recharge', 7, 70.0),
+        ("Dadra & Nagar Haveli's", 2022, 2, 'Recharge', 1, 10.0),
+    ])
+    db.execute(f"INSERT INTO {STATE_TABLE} VALUES (?, ?)", ("Dadra & Nagar Haveli's", "West's"))
+    return db
+
+
+def test_state_names_with_apostrophes():
+    rows = _database().execute(state_type_query(["Dadra & Nagar Haveli's", "Jammu & Kashmir"], 2022, '1')).fetchall()
+    assert rows == [("Dadra & Nagar Haveli's", 'Recharge', 7), ("Jammu & Kashmir", 'Recharge', 5)]
+
+
+def test_region_names_with_apostrophes():
+    rows = _database().execute(region_quarter_query("West's", 2022)).fetchall()
+    assert rows == [(1, 70.0), (2, 10.0)]
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+
+from utils.concentration import ALL_QUARTERS, concentration
+
+
+def _rows(state, values, year=2021, quarter=1):
+    return [(state, f'u{i}', year, quarter, value) for i, value in enumerate(values)]
+
+
+def _concentration(rows):
+    return concentration(pd.DataFrame(rows, columns=['State', 'Unit', 'Year', 'Quarter', 'Value']))
+
+
+def _group(frame, state, quarter=1):
+    return frame[(frame['State'] == state) & (frame['Quarter'] == quarter)]
+
+
+def test_gini_and_top_share():
+    summary, _ = _concentration(_rows('Equal', [5, 5, 5, 5]) + _rows('Single', [0, 0, 0, 10]) + _rows('Empty', [0, 0]))
+    equal, single, empty = (_group(summary, state).iloc[0] for state in ['Equal', 'Single', 'Empty'])
+    assert equal['Gini'] == 0 and equal['Top_share'] == 0.25 and equal['Top_units'] == 1
+    assert np.isclose(single['Gini'], 0.75) and single['Top_share'] == 1 # (n - 1) / n for n = 4
+    assert np.isnan(empty['Gini']) and np.isnan(empty['Top_share'])
+
+
+def test_gini_matches_mean_absolute_difference():
+    values = np.random.default_rng(1).lognormal(size=50)
+    summary, _ = _concentration(_rows('S', values))
+    expected = np.abs(values[:, None] - values[None, :]).sum() / (2 * len(values) ** 2 * values.mean())
+    assert np.isclose(summary['Gini'].iloc[0], expected)
+
+
+def test_whole_year_groups_sum_quarters():
+    summary, _ = _concentration(_rows('S', [1, 3], quarter=1) + _rows('S', [3, 1], quarter=2))
+    year = _group(summary, 'S', ALL_QUARTERS).iloc[0]
+    assert year['Total'] == 8 and year['Units'] == 2 and year['Gini'] == 0
+
+
+def test_negative_values_count_as_zero():
+    summary, _ = _concentration(_rows('S', [-4, 0, 0, 10]))
+    assert summary['Total'].iloc[0] == 10 and np.isclose(summary['Gini'].iloc[0], 0.75)
+
+
+def test_lorenz_curve():
+    _, lorenz = _concentration(_rows('S', [4, 1, 3, 2]))
+    curve = _group(lorenz, 'S')
+    assert curve['Unit'].tolist() == ['u1', 'u3', 'u2', 'u0'] # Smallest unit first
+    assert np.allclose(curve['Unit_share'], [0.25, 0.5, 0.75, 1])
+    assert np.allclose(curve['Value_share'], [0.1, 0.3, 0.6, 1])
@@ -0,0 +1,49 @@
+import pandas as pd
+
+from utils.districts import resolve_districts
+
+REFERENCE = pd.DataFrame([
+    ('maharashtra', 'pune', 27025, 18.52, 73.86),
+    ('maharashtra', 'ahmadnagar', 27026, 19.09, 74.74),
+    ('uttarpradesh', 'balrampur', 9060, 27.43, 82.18),
+    ('uttarpradesh', 'rampur', 9051, 28.80, 79.03),
+    ('odisha', 'mayurbhanj', 21011, 21.93, 86.73),
+    ('karnataka', 'vijayapura', 29003, 16.83, 75.71),
+], columns=['State_key', 'District_key', 'District_id', 'lat', 'lon'])
+ALIASES = {('karnataka', 'bijapur'): 'vijayapura'}
+
+
+def _resolve(*pairs):
+    resolved = resolve_districts(pd.DataFrame(pairs, columns=['State', 'District']), REFERENCE, ALIASES)
+    return {(row.State, row.District): (row.District_id, row.Match) for row in resolved.itertuples(index=False)}
+
+
+def test_match_kinds():
+    assert _resolve(
+        ('Maharashtra', 'PUNE'),
+        ('Maharashtra', 'Ahmednagar'),
+        ('Odisha', 'Mayurbhanja'),
+        ('Karnataka', 'Bijapur'),
+    ) == {
+        ('Maharashtra', 'PUNE'): (27025, 'exact'),
+        ('Maharashtra', 'Ahmednagar'): (27026, 'fuzzy'),
+        ('Odisha', 'Mayurbhanja'): (21011, 'contains'),
+        ('Karnataka', 'Bijapur'): (29003, 'alias'),
+    }
+
+
+def test_containment_skips_claimed_districts():
+    # 'balrampurtown' contains both names; Rampur is already matched exactly, so only Balrampur is left
+    resolved = _resolve(('Uttar Pradesh', 'Rampur'), ('Uttar Pradesh', 'Balrampur Town'))
+    assert resolved[('Uttar Pradesh', 'Balrampur Town')] == (9060, 'contains')
+
+
+def test_matches_only_within_state():
+    resolved = resolve_districts(pd.DataFrame([('Odisha', 'Pune'), ('Atlantis', 'Pune')], columns=['State', 'District']),
+                                 REFERENCE, ALIASES)
+    assert resolved['Match'].isna().all() and resolved['lat'].isna().all()
+
+
+def test_one_row_per_pair():
+    resolved = resolve_districts(pd.DataFrame([('Maharashtra', 'Pune')] * 3, columns=['State', 'District']), REFERENCE, {})
+    assert len(resolved) == 1
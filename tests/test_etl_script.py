@@ -0,0 +1,95 @@
+import re
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+import etl_script
+from utils.sampling import STRATA_COLUMNS, STRATA_TABLE, sample_table
+
+LEGACY_MAP_COLUMNS = ['State', 'Year', 'Quarter', 'District', 'RegisteredUsers', 'AppOpens'] # Before District_id/lat/lon
+
+
+class FakeDatabase:
+    """Just enough of MySQL for build_samples: table schemas, rows, and unknown-column errors on insert."""
+
+    def __init__(self, tables):
+        self.tables = {name: frame.copy() for name, frame in tables.items()}
+
+    def connect(self, **kwargs):
+        return FakeConnection(self)
+
+    def read(self, query, conn):
+        return self.tables[re.fullmatch(r"SELECT \* FROM (\w+)", query).group(1)].copy()
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+
+    def cursor(self):
+        return FakeCursor(self.db)
+
+    def is_connected(self):
+        return True
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, statement, params=None):
+        tables = self.db.tables
+        if match := re.fullmatch(r"DROP TABLE IF EXISTS (\w+)", statement):
+            tables.pop(match.group(1), None)
+        elif match := re.fullmatch(r"CREATE TABLE (\w+) LIKE (\w+)", statement):
+            tables[match.group(1)] = tables[match.group(2)].iloc[:0].copy()
+        elif match := re.fullmatch(r"DELETE FROM `(\w+)`", statement):
+            tables[match.group(1)] = tables[match.group(1)].iloc[:0]
+        else:
+            raise AssertionError(f"Unexpected statement: {statement}")
+
+    def executemany(self, statement, rows):
+        table, columns = re.match(r"INSERT INTO `(\w+)` \(`(.*)`\)", statement).groups()
+        columns = columns.split('`, `')
+        unknown = [column for column in columns if column not in self.db.tables[table].columns]
+        if unknown:
+            raise mysql.connector.ProgrammingError(f"1054 (42S22): Unknown column '{unknown[0]}' in 'field list'")
+        self.db.tables[table] = pd.concat([self.db.tables[table], pd.DataFrame(rows, columns=columns)], ignore_index=True)
+
+    def close(self):
+        pass
+
+
+def test_build_samples_upgrades_sample_tables_created_before_district_columns(monkeypatch):
+    # A database created before district resolution: map_user has since gained District_id/lat/lon,
+    # but its sample table was created LIKE the old schema
+    rng = np.random.default_rng(0)
+    map_user = pd.DataFrame({
+        'State': np.repeat(['A', 'B'], 20), 'Year': 2022, 'Quarter': np.tile([1, 2, 3, 4], 10),
+        'District': [f'd{i}' for i in range(40)], 'RegisteredUsers': rng.integers(1, 1000, 40),
+        'AppOpens': rng.integers(1, 1000, 40), 'District_id': np.arange(40), 'lat': 20.0, 'lon': 78.0,
+    })
+    db = FakeDatabase({
+        'map_user': map_user,
+        sample_table('map_user'): map_user[LEGACY_MAP_COLUMNS].iloc[:0],
+        STRATA_TABLE: pd.DataFrame(columns=STRATA_COLUMNS),
+    })
+    monkeypatch.setattr(etl_script, 'SAMPLED_TABLES', ('map_user',))
+    monkeypatch.setattr(mysql.connector, 'connect', db.connect)
+    monkeypatch.setattr(etl_script.pd, 'read_sql_query', db.read)
+
+    etl_script.build_samples()
+
+    sample = db.tables[sample_table('map_user')]
+    assert list(sample.columns) == list(map_user.columns)
+    assert len(sample) == db.tables[STRATA_TABLE]['Sample_rows'].sum() > 0
+    assert sample['lat'].notna().all()
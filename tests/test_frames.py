@@ -0,0 +1,19 @@
+import decimal
+import pandas as pd
+
+from utils.frames import PINCODE_DTYPE, optimize_dtypes
+
+
+def test_missing_pincodes_stay_missing():
+    df = optimize_dtypes(pd.DataFrame({'Pincode': ['560001', None, float('nan')], 'Count': [1, 2, 3]}))
+    assert df['Pincode'].dtype == PINCODE_DTYPE
+    assert df['Pincode'].iloc[0] == '560001'
+    assert df['Pincode'].isna().tolist() == [False, True, True]
+
+
+def test_compact_dtypes():
+    df = optimize_dtypes(pd.DataFrame({'State': ['A', 'B'], 'Year': [2021, 2022], 'Quarter': [1, 4],
+                                       'Amount': [decimal.Decimal('1.50'), None], 'Count': [3, 4]}))
+    assert isinstance(df['State'].dtype, pd.CategoricalDtype)
+    assert (df['Year'].dtype, df['Quarter'].dtype, df['Count'].dtype) == ('int16', 'int8', 'int8')
+    assert df['Amount'].dtype == 'float64' and df['Amount'].isna().tolist() == [False, True]
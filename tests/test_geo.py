@@ -0,0 +1,40 @@
+from utils.geo import simplify_geojson
+
+
+def _square(name, ring, **properties):
+    return {'type': 'Feature', 'properties': {'st_nm': name, **properties},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]}}
+
+
+# Two states sharing the border x = 1, which wiggles by less than the tolerance
+BORDER = [[1, 0], [1.0004, 0.3], [0.9996, 0.6], [1, 1]]
+WEST = _square('West', [[0, 0]] + BORDER + [[0, 1], [0, 0]], code=1)
+EAST = _square('East', BORDER[::-1] + [[2, 1], [2, 0], [1, 0]])
+
+
+def _points(feature):
+    return {tuple(point) for point in feature['geometry']['coordinates'][0]}
+
+
+def test_shared_border_stays_identical():
+    west, east = simplify_geojson({'features': [WEST, EAST]}, tolerance=0.01, decimals=4)['features']
+    west_border = {p for p in _points(west) if p[0] > 0.5}
+    east_border = {p for p in _points(east) if p[0] < 1.5}
+    assert west_border == east_border == {(1, 0), (1, 1)}
+
+
+def test_keeps_only_requested_properties():
+    simplified = simplify_geojson({'features': [WEST]}, tolerance=0.01, decimals=4)
+    assert simplified['features'][0]['properties'] == {'st_nm': 'West'}
+
+
+def test_rings_stay_closed():
+    for feature in simplify_geojson({'features': [WEST, EAST]}, tolerance=0.01, decimals=4)['features']:
+        ring = feature['geometry']['coordinates'][0]
+        assert ring[0] == ring[-1] and len(ring) >= 4
+
+
+def test_feature_smaller_than_tolerance_is_kept():
+    tiny = _square('Tiny', [[0, 0], [0.001, 0], [0.001, 0.001], [0, 0.001], [0, 0]])
+    features = simplify_geojson({'features': [tiny]}, tolerance=0.1, decimals=4)['features']
+    assert len(features) == 1 and len(features[0]['geometry']['coordinates'][0]) >= 4
@@ -0,0 +1,51 @@
+import base64
+import numpy as np
+
+from utils.payload import slim_figure
+
+
+def _figure(**trace):
+    return {'data': [{'type': 'scatter', **trace}], 'layout': {}}
+
+
+def test_rounds_floats_to_display_precision():
+    spec = slim_figure(_figure(x=[0.123456789, 0.987654321], y=[1234.5678, 98765.4321]))
+    assert spec['data'][0]['x'] == [0.1235, 0.9877]
+    assert spec['data'][0]['y'] == [1234.57, 98765.43]
+
+
+def test_rounds_coordinates():
+    spec = slim_figure({'data': [{'type': 'scattermapbox', 'lat': [12.3456789, 23.4567891], 'lon': [77.1234567, 88.7654321]}],
+                        'layout': {}})
+    assert spec['data'][0]['lat'] == [12.3457, 23.4568]
+
+
+def _typed(values):
+    # plotly >= 6 serialises numeric arrays as base64 {'dtype', 'bdata'}
+    return {'dtype': 'f8', 'bdata': base64.b64encode(np.array(values, dtype=float).tobytes()).decode('ascii')}
+
+
+def test_decodes_typed_arrays_to_rounded_lists():
+    spec = slim_figure(_figure(x=_typed([1.23456, 2.0]), y=_typed([3.0, 4.0])))
+    assert spec['data'][0]['x'] == [1.235, 2.0]
+    assert spec['data'][0]['y'] == [3, 4]
+
+
+def test_drops_unused_customdata_and_inlines_constants():
+    spec = slim_figure(_figure(x=[1, 2], customdata=[[10, 'All', 'a'], [20, 'All', 'b']],
+                               hovertemplate='%{customdata[1]}: %{customdata[2]}'))
+    trace = spec['data'][0]
+    assert trace['hovertemplate'] == 'All: %{customdata[0]}'
+    assert trace['customdata'] == [['a'], ['b']]
+
+
+def test_keeps_formatted_customdata():
+    spec = slim_figure(_figure(x=[1, 2], customdata=[[5, 'a'], [5, 'b']], hovertemplate='%{customdata[0]:,}'))
+    assert spec['data'][0]['hovertemplate'] == '%{customdata[0]:,}'
+
+
+def test_links_shared_geojson():
+    geojson = {'type': 'FeatureCollection', 'features': []}
+    spec = slim_figure({'data': [{'type': 'choroplethmapbox', 'geojson': geojson, 'z': [1, 2]}], 'layout': {}},
+                       {'app/static/states.geojson': geojson})
+    assert spec['data'][0]['geojson'] == 'app/static/states.geojson'
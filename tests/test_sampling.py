@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from utils.sampling import Z_95, estimate_totals, sample_sizes, stratified_sample
+
+
+def _strata(*rows):
+    return pd.DataFrame(rows, columns=['State', 'Year', 'Stratum_rows', 'Sample_rows'])
+
+
+def test_whole_strata_are_exact():
+    rows = pd.DataFrame({'State': ['A', 'A', 'B'], 'Year': 2020, 'Value': [1.0, 2.0, 4.0]})
+    estimates = estimate_totals(rows, _strata(('A', 2020, 2, 2), ('B', 2020, 1, 1)), ['State'], ['Value'])
+    assert estimates['Value'].tolist() == [3, 4]
+    assert estimates['Value_margin'].tolist() == [0, 0]
+
+
+def test_expansion_with_finite_population_correction():
+    rows = pd.DataFrame({'State': 'A', 'Year': 2020, 'Value': [1.0, 2.0, 3.0, 4.0]})
+    estimate = estimate_totals(rows, _strata(('A', 2020, 100, 4)), [], ['Value']).iloc[0]
+    big_n, n, variance = 100, 4, np.var([1, 2, 3, 4], ddof=1)
+    assert estimate['Value'] == 250
+    assert np.isclose(estimate['Value_margin'], Z_95 * np.sqrt(big_n ** 2 * (1 - n / big_n) / n * variance))
+    assert estimate['Sampled_rows'] == 4
+
+
+def test_domain_estimates_count_other_rows_as_zero():
+    rows = pd.DataFrame({'State': 'A', 'Year': 2020, 'District': ['x', 'x', 'y', 'y'], 'Value': [1.0, 2.0, 3.0, 4.0]})
+    estimates = estimate_totals(rows, _strata(('A', 2020, 100, 4)), ['District'], ['Value']).set_index('District')
+    variance = np.var([1, 2, 0, 0], ddof=1)
+    assert estimates.loc['x', 'Value'] == 75 and estimates.loc['y', 'Value'] == 175
+    assert np.isclose(estimates.loc['x', 'Value_margin'], Z_95 * np.sqrt(100 ** 2 * (1 - 4 / 100) / 4 * variance))
+
+
+def test_estimates_sum_over_strata():
+    rows = pd.DataFrame({'State': ['A', 'A', 'B'], 'Year': 2020, 'Value': [1.0, 3.0, 5.0]})
+    estimate = estimate_totals(rows, _strata(('A', 2020, 10, 2), ('B', 2020, 1, 1)), [], ['Value']).iloc[0]
+    assert estimate['Value'] == 25
+    assert np.isclose(estimate['Value_margin'], Z_95 * np.sqrt(10 ** 2 * (1 - 2 / 10) / 2 * 2.0))
+
+
+def test_stratified_sample_sizes():
+    df = pd.DataFrame({'State': ['A'] * 200 + ['B'] * 5, 'Year': 2020, 'Value': np.arange(205)})
+    sample, strata = stratified_sample(df)
+    counts = sample.groupby('State').size()
+    assert counts['A'] == sample_sizes([200])[0] == 50 and counts['B'] == 5 # B is no bigger than MIN_STRATUM_ROWS: kept whole
+    assert strata.set_index('State')['Sample_rows'].to_dict() == {'A': 50, 'B': 5}
+    assert sample.index.is_monotonic_increasing
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from utils.topk import ALL, COUNTRY, build_topk_rows, top_k
+
+
+def test_top_k_matches_full_sort():
+    rng = np.random.default_rng(0)
+    matrix = rng.random((30, 4))
+    matrix[rng.random(matrix.shape) < 0.2] = np.nan
+    matrix[:, 3] = np.nan
+    matrix[:2, 3] = [5.0, 7.0] # Fewer than k entities with data
+    previous = np.array([-1, 0, 1, 2])
+    rows, values, previous_rank = top_k(matrix, previous, k=5)
+    filled = np.where(np.isfinite(matrix), matrix, -np.inf)
+    for column in range(matrix.shape[1]):
+        assert np.array_equal(values[:, column], np.sort(filled[:, column])[::-1][:5])
+        assert np.array_equal(filled[rows[:, column], column], values[:, column])
+        for i, row in enumerate(rows[:, column]):
+            before = filled[:, previous[column]] if previous[column] >= 0 else None
+            if before is None or not np.isfinite(before[row]):
+                assert np.isnan(previous_rank[i, column])
+            else:
+                assert previous_rank[i, column] == 1 + (before > before[row]).sum()
+    assert np.isinf(values[2:, 3]).all()
+
+
+def _map_user():
+    rows = [
+        ('A', 'd1', 2020, 1, 10), ('A', 'd2', 2020, 1, 30), ('B', 'd3', 2020, 1, 20),
+        ('A', 'd1', 2020, 2, 50), ('A', 'd2', 2020, 2, 35), ('B', 'd3', 2020, 2, 20),
+    ]
+    frame = pd.DataFrame(rows, columns=['State', 'District', 'Year', 'Quarter', 'RegisteredUsers'])
+    return frame.assign(AppOpens=frame['RegisteredUsers'] * 2)
+
+
+def _board(rows, level, scope, year, quarter):
+    board = rows[(rows['Dataset'] == 'map_user') & (rows['Level'] == level) & (rows['Metric'] == 'RegisteredUsers')
+                 & (rows['Scope'] == scope) & (rows['Year'] == year) & (rows['Quarter'] == quarter)]
+    return board.sort_values('Position')[['Position', 'Previous_position', 'Entity', 'Value']].values.tolist()
+
+
+def test_build_topk_rows():
+    rows = build_topk_rows({'map_user': _map_user()})
+    assert _board(rows, 'District', COUNTRY, 2020, 2) == [[1, 3, 'd1', 50], [2, 1, 'd2', 35], [3, 2, 'd3', 20]]
+    year = _board(rows, 'District', COUNTRY, 2020, ALL)
+    assert [row[2:] for row in year] == [['d2', 65], ['d1', 60], ['d3', 40]]
+    assert all(np.isnan(row[1]) for row in year) # No previous year
+    assert _board(rows, 'State', COUNTRY, 2020, 2) == [[1, 1, 'A', 85], [2, 2, 'B', 20]]
+    assert [row[2:] for row in _board(rows, 'District', 'A', ALL, ALL)] == [['d2', 65], ['d1', 60]]
+
+
+def test_build_topk_rows_empty():
+    assert build_topk_rows({'map_user': _map_user().iloc[:0]}).empty
@@ -0,0 +1,2 @@
+# utils/__init__.py
+"""Shared helpers used by the ETL script and the Streamlit pages."""
@@ -0,0 +1,98 @@
+# utils/anomalies.py
+"""Unusual district quarters: robust z-scores of each cell's seasonal log change against the district's own history."""
+import warnings
+import numpy as np
+import pandas as pd
+
+from utils.timeseries import log_values
+
+ANOMALY_TABLE = "anomalies"
+# Metric: (table, label, columns). Single columns are scored as they are; the App opens per user ratio
+# flags app opens diverging from registered users.
+ANOMALY_METRICS = {
+    'Transaction_count': ('map_transaction', 'Transaction Count', ['Transaction_count']),
+    'Transaction_amount': ('map_transaction', 'Transaction Amount', ['Transaction_amount']),
+    'RegisteredUsers': ('map_user', 'Registered Users', ['RegisteredUsers']),
+    'AppOpens': ('map_user', 'App Opens', ['AppOpens']),
+    'AppOpens_per_user': ('map_user', 'App Opens per User', ['AppOpens', 'RegisteredUsers']),
+}
+ANOMALY_COLUMNS = ['Metric', 'State', 'District', 'Year', 'Quarter', 'Value', 'YoY_change', 'Score', 'Direction', 'lat', 'lon']
+SEASON = 4
+Z_THRESHOLD = 3.5 # Robust z-score beyond which a cell is an anomaly (Iglewicz and Hoaglin)
+MIN_CHANGES = 6 # Year-on-year changes a district needs before it is scored
+MIN_MAD = 0.02 # Floor on the MAD of log changes (~2%), so very steady districts do not flag noise
+
+
+def metrics_of(table):
+    """{metric: label} of the metrics scored from one map_* table."""
+    return {metric: label for metric, (t, label, _) in ANOMALY_METRICS.items() if t == table}
+
+
+def anomaly_query(table):
+    """Per district and quarter sums of every column the table's metrics use, with the district's coordinates."""
+    columns = sorted({column for t, _, cols in ANOMALY_METRICS.values() if t == table for column in cols})
+    sums = ', '.join(f"SUM({column}) as {column}" for column in columns)
+    return (f"SELECT State, District, Year, Quarter, {sums}, MAX(lat) as lat, MAX(lon) as lon FROM {table} "
+            f"GROUP BY State, District, Year, Quarter")
+
+
+def robust_scores(y):
+    """(scores, changes): robust z-scores of each cell's seasonal difference, net of the quarter's median change."""
+    changes = np.full(y.shape, np.nan)
+    if y.shape[1] > SEASON:
+        changes[:, SEASON:] = y[:, SEASON:] - y[:, :-SEASON]
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # All-NaN quarters and rows
+        local = changes - np.nanmedian(changes, axis=0)
+        center = np.nanmedian(local, axis=1, keepdims=True)
+        mad = np.nanmedian(np.abs(local - center), axis=1, keepdims=True)
+    scores = 0.6745 * (local - center) / np.maximum(mad, MIN_MAD)
+    enough = np.isfinite(changes).sum(axis=1, keepdims=True) >= MIN_CHANGES
+    return np.where(enough, scores, np.nan), changes
+
+
+def _pivot(frame, columns):
+    """(entities, periods, {column: entity x quarter matrix}) of an anomaly_query frame, on one shared factorization."""
+    groups = frame.groupby(['State', 'District'], observed=True, sort=True)
+    codes = groups.ngroup().to_numpy()
+    period_index = frame['Year'].to_numpy(dtype=int) * SEASON + frame['Quarter'].to_numpy(dtype=int) - 1
+    first = period_index.min()
+    periods = [(p // SEASON, p % SEASON + 1) for p in range(first, period_index.max() + 1)]
+    matrices = {}
+    for column in columns:
+        matrix = np.full((groups.ngroups, len(periods)), np.nan)
+        matrix[codes, period_index - first] = frame[column].to_numpy(dtype=float)
+        matrices[column] = matrix
+    return groups.size().index.to_frame(index=False).astype(str), periods, matrices
+
+
+def build_anomaly_rows(frames):
+    """ANOMALY_COLUMNS rows of the flagged cells, from {table: anomaly_query frame}."""
+    parts = []
+    for table, frame in frames.items():
+        metrics = {metric: columns for metric, (t, _, columns) in ANOMALY_METRICS.items() if t == table}
+        if frame.empty or not metrics:
+            continue
+        used = sorted({column for columns in metrics.values() for column in columns})
+        entities, periods, matrices = _pivot(frame, used + ['lat', 'lon'])
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning) # Districts without coordinates
+            coords = {axis: np.nanmax(matrices[axis], axis=1) for axis in ('lat', 'lon')}
+        logs = {column: log_values(matrices[column]) for column in used}
+        for metric, columns in metrics.items():
+            metric_logs = logs[columns[0]] - sum(logs[column] for column in columns[1:]) # Ratios: differences of logs
+            scores, changes = robust_scores(metric_logs)
+            rows, cols = np.nonzero(np.abs(np.nan_to_num(scores)) >= Z_THRESHOLD)
+            part = entities.iloc[rows].reset_index(drop=True)
+            part['Metric'] = metric
+            part['Year'] = [periods[c][0] for c in cols]
+            part['Quarter'] = [periods[c][1] for c in cols]
+            part['Value'] = np.exp(metric_logs[rows, cols]) if len(columns) > 1 else matrices[columns[0]][rows, cols]
+            part['YoY_change'] = np.expm1(changes[rows, cols])
+            part['Score'] = scores[rows, cols]
+            part['Direction'] = np.where(part['Score'] > 0, 'Spike', 'Drop')
+            part['lat'], part['lon'] = coords['lat'][rows], coords['lon'][rows]
+            parts.append(part)
+    if not parts:
+        return pd.DataFrame(columns=ANOMALY_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[ANOMALY_COLUMNS]
@@ -0,0 +1,116 @@
+# utils/catalog.py
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.db import run_query
+
+CATALOG_TABLE = "filter_catalog"
+
+# --- Filterable columns per dataset ---
+# District/Pincode values are stored per State so pages can list them for one state.
+DATASET_FIELDS = {
+    'aggregated_transaction': ['State', 'Year', 'Quarter', 'Transaction_type'],
+    'aggregated_user': ['State', 'Year', 'Quarter', 'Brand'],
+    'aggregated_insurance': ['State', 'Year', 'Quarter', 'Name'],
+    'map_transaction': ['State', 'District', 'Year', 'Quarter'],
+    'map_user': ['State', 'District', 'Year', 'Quarter'],
+    'map_insurance': ['State', 'District', 'Year', 'Quarter'],
+    'top_transaction': ['State', 'Pincode', 'Year', 'Quarter'],
+    'top_user': ['State', 'Pincode', 'Year', 'Quarter'],
+    'top_insurance': ['State', 'Pincode', 'Year', 'Quarter'],
+}
+STATE_SCOPED_FIELDS = ('District', 'Pincode')
+NUMERIC_FIELDS = ('Year', 'Quarter')
+CATALOG_COLUMNS = ['Dataset', 'Field', 'State', 'Value']
+
+
+def _catalog_rows(dataset, field, df):
+    """Returns catalog rows for the distinct values of one field of one dataset."""
+    if field in STATE_SCOPED_FIELDS:
+        pairs = df[['State', field]].dropna().drop_duplicates()
+        return pd.DataFrame({'Dataset': dataset, 'Field': field,
+                             'State': pairs['State'].astype(str), 'Value': pairs[field].astype(str)})
+    values = pd.Series(df[field].dropna().unique())
+    return pd.DataFrame({'Dataset': dataset, 'Field': field, 'State': '', 'Value': values.astype(str)})
+
+
+def build_catalog(frames):
+    """Builds the long-format filter catalog (Dataset, Field, State, Value) from {table_name: DataFrame}."""
+    parts = []
+    for dataset, fields in DATASET_FIELDS.items():
+        df = frames.get(dataset)
+        if df is None or df.empty:
+            continue
+        for field in fields:
+            if field in df.columns:
+                parts.append(_catalog_rows(dataset, field, df))
+    if not parts:
+        return pd.DataFrame(columns=CATALOG_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+class FilterCatalog:
+    """In-memory lookup of filter options, built once from the catalog table."""
+
+    def __init__(self, catalog_df):
+        self._values = {}
+        if catalog_df.empty:
+            return
+        for (dataset, field, state), group in catalog_df.groupby(['Dataset', 'Field', 'State']):
+            values = group['Value'].tolist()
+            if field in NUMERIC_FIELDS:
+                values = [int(v) for v in values]
+            self._values[(dataset, field, state)] = sorted(values)
+
+    def options(self, dataset, field, descending=False):
+        """Sorted distinct values of a field, e.g. options('map_user', 'Year', descending=True)."""
+        values = self._values.get((dataset, field, ''), [])
+        return sorted(values, reverse=True) if descending else list(values)
+
+    def scoped(self, dataset, field, state):
+        """Sorted distinct District/Pincode values of a dataset within one state."""
+        return list(self._values.get((dataset, field, state), []))
+
+    def scoped_pairs(self, dataset, field):
+        """Every (State, value) pair of a District/Pincode field of a dataset, by state then value."""
+        return [(state, value) for (d, f, state), values in sorted(self._values.items()) if d == dataset and f == field
+                for value in values]
+
+    def is_empty(self):
+        return not self._values
+
+
+def _catalog_from_source_tables():
+    """Fallback when the ETL has not written the catalog yet: one DISTINCT scan per field, run once."""
+    parts = []
+    for dataset, fields in DATASET_FIELDS.items():
+        for field in fields:
+            cols = f"State, {field}" if field in STATE_SCOPED_FIELDS else field
+            df = run_query(f"SELECT DISTINCT {cols} FROM {dataset}")
+            if not df.empty:
+                parts.append(_catalog_rows(dataset, field, df))
+    if not parts:
+        return pd.DataFrame(columns=CATALOG_COLUMNS)
+    return pd.concat(parts, ignore_index=True)
+
+
+@st.cache_resource(ttl=3600, show_spinner="Loading filter options...")
+def _load_catalog():
+    # Raises on database errors, so a failed load is not cached
+    try:
+        catalog_df = run_query(f"SELECT Dataset, Field, State, Value FROM {CATALOG_TABLE}")
+    except (mysql.connector.Error, pd.errors.DatabaseError):
+        catalog_df = pd.DataFrame(columns=CATALOG_COLUMNS)
+    if catalog_df.empty:
+        catalog_df = _catalog_from_source_tables()
+    return FilterCatalog(catalog_df)
+
+
+def load_catalog():
+    """The filter catalog, loaded once per process; empty (and retried next run) after a database error."""
+    try:
+        return _load_catalog()
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
+        st.error(f"Database Error: {err}")
+        return FilterCatalog(pd.DataFrame(columns=CATALOG_COLUMNS))
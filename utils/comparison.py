@@ -0,0 +1,29 @@
+# utils/comparison.py
+"""Queries for the Comparison page, grouped in MySQL so the page only receives the rows it charts."""
+from utils.regions import STATE_TABLE, UNKNOWN_REGION
+
+REGIONS_QUERY = f"SELECT DISTINCT Region FROM {STATE_TABLE} ORDER BY Region"
+
+
+def _quote(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _quarter_filter(quarter, column='Quarter'):
+    return "" if quarter == 'All' else f" AND {column} = {int(quarter)}"
+
+
+def state_type_query(states, year, quarter):
+    """Transaction count per State x Transaction_type for the chosen states in a year (one quarter or 'All')."""
+    state_list = ', '.join(_quote(state) for state in states)
+    return (f"SELECT State, Transaction_type, SUM(Transaction_count) AS Transaction_count FROM aggregated_transaction "
+            f"WHERE State IN ({state_list}) AND Year = {int(year)}{_quarter_filter(quarter)} "
+            f"GROUP BY State, Transaction_type ORDER BY State, Transaction_type")
+
+
+def region_quarter_query(region, year):
+    """Transaction amount per quarter of one region and year (regions from the state dimension table)."""
+    return (f"SELECT t.Quarter, SUM(t.Transaction_amount) AS Transaction_amount "
+            f"FROM aggregated_transaction t LEFT JOIN {STATE_TABLE} s ON s.State = t.State "
+            f"WHERE COALESCE(s.Region, {_quote(UNKNOWN_REGION)}) = {_quote(region)} AND t.Year = {int(year)} "
+            f"GROUP BY t.Quarter ORDER BY t.Quarter")
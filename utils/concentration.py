@@ -0,0 +1,71 @@
+# utils/concentration.py
+"""How concentrated a metric is within each state: Gini, top-share and Lorenz curve per period."""
+import numpy as np
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+
+# Dataset label: (table, unit column, {metric label: column})
+CONCENTRATION_DATASETS = {
+    'Transactions by District': ('map_transaction', 'District', {'Transaction Amount': 'Transaction_amount', 'Transaction Count': 'Transaction_count'}),
+    'Insurance by District': ('map_insurance', 'District', {'Premium Amount': 'Amount', 'Policy Count': 'Count'}),
+    'Transactions by Top Pincode': ('top_transaction', 'Pincode', {'Transaction Amount': 'Transaction_amount', 'Transaction Count': 'Transaction_count'}),
+}
+ALL_QUARTERS = 0 # Quarter of the whole-year groups
+TOP_SHARE = 0.10 # Top-share: the part of the total held by the largest 10% of units (at least one)
+# Measure: (summary column, description)
+CONCENTRATION_MEASURES = {
+    'Gini': ('Gini', "0 = every unit has the same value, 1 = a single unit holds everything"),
+    'Top 10% share': ('Top_share', "Share of the state's total held by its largest 10% of units (at least one)"),
+}
+
+
+def concentration_query(table, unit, column):
+    return (f"SELECT State, {unit} as Unit, Year, Quarter, SUM({column}) as Value FROM {table} "
+            f"GROUP BY State, {unit}, Year, Quarter")
+
+
+def concentration(df):
+    """(summary, lorenz) per State x Year x Quarter from rows of (State, Unit, Year, Quarter, Value)."""
+    years = df.groupby(['State', 'Unit', 'Year'], observed=True)['Value'].sum().reset_index().assign(Quarter=ALL_QUARTERS)
+    rows = pd.concat([df[['State', 'Unit', 'Year', 'Quarter', 'Value']], years], ignore_index=True)
+    groups = rows.groupby(['State', 'Year', 'Quarter'], observed=True, sort=True)
+    group = groups.ngroup().to_numpy()
+    values = np.clip(rows['Value'].to_numpy(dtype=float), 0, None)
+    values = np.nan_to_num(values)
+    order = np.lexsort((values, group)) # By group, then ascending value
+    group, x = group[order], values[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(group) else np.array([], dtype=int)
+    counts = np.diff(np.r_[starts, len(group)])
+    n = np.repeat(counts, counts)
+    rank = np.arange(len(group)) - np.repeat(starts, counts) + 1 # 1 = smallest unit of the group
+    total = np.add.reduceat(x, starts) if len(starts) else np.array([])
+    cum = np.cumsum(x)
+    cum_within = cum - np.repeat(cum[starts] - x[starts], counts)
+    top_units = np.ceil(TOP_SHARE * counts).astype(int)
+    in_top = rank > n - np.repeat(top_units, counts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        gini = 2 * np.add.reduceat(rank * x, starts) / (counts * total) - (counts + 1) / counts if len(starts) else total
+        top_share = np.add.reduceat(x * in_top, starts) / total if len(starts) else total
+        value_share = cum_within / np.repeat(total, counts)
+    keys = groups.size().index.to_frame(index=False)
+    summary = keys.assign(Units=counts, Total=total, Gini=np.where(total > 0, gini, np.nan), Top_units=top_units,
+                          Top_share=np.where(total > 0, top_share, np.nan))
+    key_rows = np.repeat(np.arange(len(keys)), counts)
+    lorenz = keys.iloc[key_rows].reset_index(drop=True).assign(
+        Unit=rows['Unit'].to_numpy()[order], Value=x, Unit_share=rank / n, Value_share=value_share)
+    return summary, lorenz
+
+
+@st.cache_data(ttl=3600, show_spinner="Computing concentration...", max_entries=16)
+def load_concentration(table, unit, column, data_version):
+    """concentration() of one metric for every state and period, computed once per data version."""
+    try:
+        df = optimize_dtypes(run_query(concentration_query(table, unit, column)))
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
+        st.error(f"Database Error: {err}")
+        df = pd.DataFrame(columns=['State', 'Unit', 'Year', 'Quarter', 'Value'])
+    return concentration(df)
@@ -0,0 +1,37 @@
+# utils/data_version.py
+import hashlib
+from datetime import datetime, timezone
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.db import run_query
+
+METADATA_TABLE = "etl_metadata"
+UNVERSIONED = "unversioned" # Used until the ETL has published a version
+
+
+def compute_data_version(frames):
+    """Content hash of the processed tables ({table_name: DataFrame}); changes whenever any row changes."""
+    digest = hashlib.sha1()
+    for table_name in sorted(frames):
+        df = frames[table_name]
+        digest.update(table_name.encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return digest.hexdigest()[:16]
+
+
+def build_metadata(data_version):
+    """Rows for the etl_metadata table (Meta_key, Meta_value)."""
+    published_at = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    return pd.DataFrame({'Meta_key': ['data_version', 'published_at'], 'Meta_value': [data_version, published_at]})
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def load_data_version():
+    """The data version published by the last ETL run (re-read every 5 minutes)."""
+    try:
+        df = run_query(f"SELECT Meta_value FROM {METADATA_TABLE} WHERE Meta_key = 'data_version'")
+    except (mysql.connector.Error, pd.errors.DatabaseError):
+        return UNVERSIONED
+    return str(df['Meta_value'].iloc[0]) if not df.empty else UNVERSIONED
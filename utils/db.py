@@ -0,0 +1,27 @@
+# utils/db.py
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+
+def get_connection():
+    """Opens a MySQL connection using the credentials in Streamlit secrets."""
+    db = st.secrets["database"]
+    return mysql.connector.connect(
+        host=db["host"],
+        port=db["port"],
+        user=db["user"],
+        password=db["password"],
+        database=db["db_name"],
+        ssl_ca=db["ssl_ca"],
+        ssl_verify_cert=True
+    )
+
+
+def run_query(query):
+    """Runs a query on a fresh connection and returns the result as a DataFrame (no caching)."""
+    conn = get_connection()
+    try:
+        return pd.read_sql_query(query, conn)
+    finally:
+        conn.close()
@@ -0,0 +1,119 @@
+# utils/derived.py
+"""Derived metrics: the map_* tables joined per district quarter, per-user ratios and metric correlations."""
+import warnings
+import itertools
+import numpy as np
+import pandas as pd
+
+DERIVED_TABLE = "derived_metrics"
+CORRELATION_TABLE = "metric_correlations"
+ALL = 0 # Quarter of the whole-year rows
+COUNTRY = '' # Scope of the country-wide correlations (other rows are scoped to a state)
+# Column of the joined frame: label
+BASE_METRICS = {
+    'Transaction_count': 'Transaction Count',
+    'Transaction_amount': 'Transaction Amount',
+    'RegisteredUsers': 'Registered Users',
+    'AppOpens': 'App Opens',
+    'Insurance_count': 'Insurance Policies',
+    'Insurance_amount': 'Insurance Premium',
+}
+# Ratio: (numerator, denominator, multiplier, label)
+RATIOS = {
+    'Transactions_per_user': ('Transaction_count', 'RegisteredUsers', 1, 'Transactions per User'),
+    'Amount_per_transaction': ('Transaction_amount', 'Transaction_count', 1, 'Average Transaction'),
+    'AppOpens_per_user': ('AppOpens', 'RegisteredUsers', 1, 'App Opens per User'),
+    'Policies_per_1000_users': ('Insurance_count', 'RegisteredUsers', 1000, 'Policies per 1,000 Users'),
+    'Policies_per_1000_app_opens': ('Insurance_count', 'AppOpens', 1000, 'Policies per 1,000 App Opens'),
+    'Premium_per_policy': ('Insurance_amount', 'Insurance_count', 1, 'Average Premium'),
+}
+METRIC_LABELS = {**BASE_METRICS, **{ratio: label for ratio, (_, _, _, label) in RATIOS.items()}}
+KEYS = ['State', 'District', 'Year', 'Quarter']
+DERIVED_COLUMNS = KEYS + list(METRIC_LABELS)
+CORRELATION_COLUMNS = ['Scope', 'Year', 'Quarter', 'Metric_x', 'Metric_y', 'Correlation', 'Districts']
+MIN_DISTRICTS = 5 # Districts with both metrics a correlation needs
+
+# One join of the three district tables (their primary keys cover the join columns)
+JOINED_QUERY = (
+    "SELECT t.State, t.District, t.Year, t.Quarter, t.Transaction_count, t.Transaction_amount, "
+    "u.RegisteredUsers, u.AppOpens, i.Count as Insurance_count, i.Amount as Insurance_amount "
+    "FROM map_transaction t "
+    "LEFT JOIN map_user u ON u.State = t.State AND u.Year = t.Year AND u.Quarter = t.Quarter AND u.District = t.District "
+    "LEFT JOIN map_insurance i ON i.State = t.State AND i.Year = t.Year AND i.Quarter = t.Quarter AND i.District = t.District"
+)
+
+
+def add_ratios(frame):
+    """The frame with every RATIOS column; NaN where the denominator is missing or not positive."""
+    ratios = {}
+    for ratio, (numerator, denominator, multiplier, _) in RATIOS.items():
+        top, bottom = frame[numerator].to_numpy(dtype=float), frame[denominator].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios[ratio] = np.where(bottom > 0, multiplier * top / bottom, np.nan)
+    return frame.assign(**ratios)
+
+
+def build_derived_rows(joined):
+    """DERIVED_COLUMNS rows (one per district quarter) from the JOINED_QUERY frame."""
+    if joined.empty:
+        return pd.DataFrame(columns=DERIVED_COLUMNS)
+    base = joined[KEYS].assign(**{column: pd.to_numeric(joined[column], errors='coerce') for column in BASE_METRICS})
+    return add_ratios(base)[DERIVED_COLUMNS]
+
+
+def with_years(derived):
+    """Quarter rows plus one row per district and year (base metrics summed, ratios recomputed), Quarter=ALL."""
+    years = derived.groupby(['State', 'District', 'Year'], observed=True)[list(BASE_METRICS)].sum(min_count=1).reset_index()
+    years = add_ratios(years.assign(Quarter=ALL))[DERIVED_COLUMNS]
+    return pd.concat([derived[DERIVED_COLUMNS], years], ignore_index=True)
+
+
+def centred_logs(values):
+    """Log of positive values (NaN otherwise), centred per column so the sums below stay well conditioned."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        logs = np.where(values > 0, np.log(values), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # Metrics without any positive value
+        return logs - np.nan_to_num(np.nanmean(logs, axis=0))
+
+
+def grouped_correlations(values, group):
+    """(groups, correlations, counts) of every column pair of values within every group, over rows where both are known."""
+    order = np.argsort(group, kind='stable')
+    group, x = group[order], values[order]
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]]) if len(group) else np.array([], dtype=int)
+    first, second = np.array(list(itertools.combinations(range(values.shape[1]), 2))).reshape(-1, 2).T
+    if not len(starts):
+        return group[starts], np.empty((0, len(first))), np.empty((0, len(first)), dtype=int)
+    known = np.isfinite(x)
+    both = known[:, first] & known[:, second] # rows x pairs
+    filled = np.nan_to_num(x)
+    xi, xj = np.where(both, filled[:, first], 0), np.where(both, filled[:, second], 0)
+    n, sx, sy, sxx, syy, sxy = (np.add.reduceat(a, starts, axis=0) for a in (both.astype(float), xi, xj, xi * xi, xj * xj, xi * xj))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = (n * sxy - sx * sy) / np.sqrt((n * sxx - sx * sx) * (n * syy - sy * sy))
+    return group[starts], np.where(n >= MIN_DISTRICTS, np.clip(r, -1, 1), np.nan), n.astype(int)
+
+
+def build_correlation_rows(derived):
+    """CORRELATION_COLUMNS rows of every metric pair within each state and the country, for every quarter and year."""
+    if derived.empty:
+        return pd.DataFrame(columns=CORRELATION_COLUMNS)
+    rows = with_years(derived)
+    metrics = list(METRIC_LABELS)
+    pairs = np.array(list(itertools.combinations(metrics, 2)), dtype=object)
+    values = centred_logs(rows[metrics].to_numpy(dtype=float))
+    parts = []
+    for keys in (['State', 'Year', 'Quarter'], ['Year', 'Quarter']): # Each state, then the country
+        groups = rows.groupby(keys, observed=True, sort=True)
+        codes, correlations, counts = grouped_correlations(values, groups.ngroup().to_numpy())
+        index = groups.size().index.to_frame(index=False).iloc[codes]
+        scope = index['State'].astype(str).to_numpy() if 'State' in keys else np.full(len(index), COUNTRY, dtype=object)
+        valid = np.isfinite(correlations)
+        group_rows, pair_columns = np.nonzero(valid)
+        parts.append({
+            'Scope': scope[group_rows], 'Year': index['Year'].to_numpy(dtype=int)[group_rows],
+            'Quarter': index['Quarter'].to_numpy(dtype=int)[group_rows], 'Metric_x': pairs[pair_columns, 0],
+            'Metric_y': pairs[pair_columns, 1], 'Correlation': correlations[valid], 'Districts': counts[valid],
+        })
+    return pd.DataFrame({column: np.concatenate([part[column] for part in parts]) for column in CORRELATION_COLUMNS})
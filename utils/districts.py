@@ -0,0 +1,90 @@
+# utils/districts.py
+import re
+import difflib
+import pandas as pd
+
+from utils.geo import COORDS_FILE, DISTRICT_COLUMN
+
+ALIASES_FILE = "district_aliases.csv" # State, District (as in the Pulse data), Coords_district (as in district_coords.csv)
+MAP_TABLES = ('map_transaction', 'map_user', 'map_insurance')
+FUZZY_CUTOFF = 0.85 # difflib ratio; at 0.8 Bijapur would match Bilaspur
+MIN_CONTAINED_LENGTH = 5 # Shortest name accepted by the "one name contains the other" rule
+RESOLUTION_COLUMNS = ['State', 'District', 'District_id', 'lat', 'lon', 'Match']
+
+
+def normalize_name(name):
+    """Lowercase letters and digits only ('&' becomes 'and'), so spacing and punctuation variants compare equal."""
+    return re.sub(r'[^a-z0-9]', '', str(name).lower().replace('&', 'and'))
+
+
+def read_district_reference(file_path=COORDS_FILE):
+    """district_coords.csv as (State_key, District_key, District_id, lat, lon); District_id = state code * 1000 + district code."""
+    df = pd.read_csv(file_path)
+    df = df.rename(columns={'Latitude': 'lat', 'Longitude': 'lon'})
+    reference = pd.DataFrame({
+        'State_key': df['State Name'].map(normalize_name),
+        'District_key': df[DISTRICT_COLUMN].map(normalize_name),
+        'District_id': df['State Code'] * 1000 + df['District Code'],
+        'lat': pd.to_numeric(df['lat'], errors='coerce'),
+        'lon': pd.to_numeric(df['lon'], errors='coerce'),
+    })
+    return reference.dropna(subset=['lat', 'lon']).drop_duplicates(subset=['State_key', 'District_key'])
+
+
+def read_aliases(file_path=ALIASES_FILE):
+    """Alias table as {(State_key, District_key): coords District_key}; empty if the file is missing."""
+    try:
+        df = pd.read_csv(file_path)
+    except FileNotFoundError:
+        return {}
+    return {(normalize_name(row.State), normalize_name(row.District)): normalize_name(row.Coords_district)
+            for row in df.itertuples(index=False)}
+
+
+def _contained_match(key, candidates):
+    """The single candidate that contains key, or that key contains (e.g. 'Mayurbhanj' / 'Mayurbhanja')."""
+    if len(key) < MIN_CONTAINED_LENGTH:
+        return None
+    hits = [c for c in candidates if len(c) >= MIN_CONTAINED_LENGTH and (key in c or c in key)]
+    return hits[0] if len(hits) == 1 else None
+
+
+def resolve_districts(pairs, reference, aliases):
+    """RESOLUTION_COLUMNS of (State, District) pairs matched within their state (alias, exact, contains, fuzzy)."""
+    by_state = {state: group.set_index('District_key') for state, group in reference.groupby('State_key')}
+    pairs = pairs[['State', 'District']].drop_duplicates().reset_index(drop=True)
+    keys = [(normalize_name(state), normalize_name(district)) for state, district in pairs.itertuples(index=False)]
+
+    matches = [None] * len(keys)
+    for i, (state_key, district_key) in enumerate(keys):
+        districts = by_state.get(state_key)
+        if districts is None:
+            continue
+        alias = aliases.get((state_key, district_key))
+        if alias in districts.index:
+            matches[i] = (alias, 'alias')
+        elif district_key in districts.index:
+            matches[i] = (district_key, 'exact')
+
+    claimed = {(keys[i][0], match[0]) for i, match in enumerate(matches) if match}
+    for i, (state_key, district_key) in enumerate(keys):
+        districts = by_state.get(state_key)
+        if matches[i] or districts is None:
+            continue
+        unclaimed = [key for key in districts.index if (state_key, key) not in claimed]
+        contained = _contained_match(district_key, unclaimed)
+        if contained:
+            matches[i] = (contained, 'contains')
+            continue
+        close = difflib.get_close_matches(district_key, list(districts.index), n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            matches[i] = (close[0], 'fuzzy')
+
+    rows = []
+    for (state, district), (state_key, _), match in zip(pairs.itertuples(index=False), keys, matches):
+        if match:
+            ref = by_state[state_key].loc[match[0]]
+            rows.append((state, district, int(ref['District_id']), float(ref['lat']), float(ref['lon']), match[1]))
+        else:
+            rows.append((state, district, None, None, None, None))
+    return pd.DataFrame(rows, columns=RESOLUTION_COLUMNS)
@@ -0,0 +1,184 @@
+# utils/export.py
+import os
+import glob
+import threading
+import pandas as pd
+from mysql.connector import FieldType
+
+from utils.catalog import DATASET_FIELDS
+from utils.data_version import UNVERSIONED
+from utils.db import get_connection
+from utils.geo import STATIC_DIR, STATIC_URL
+from utils.lazy import lazy_module
+
+# Writers for one format each, imported when that format is first exported
+pa = lazy_module('pyarrow')
+pq = lazy_module('pyarrow.parquet')
+xlsxwriter = lazy_module('xlsxwriter')
+
+EXPORT_DIR = os.path.join(STATIC_DIR, "exports") # Served at STATIC_URL/exports, so downloads stream from disk
+EXPORT_TABLES = tuple(DATASET_FIELDS) # Only the raw Pulse tables can be exported
+CHUNK_ROWS = 50000 # Rows fetched from the server-side cursor per batch
+EXCEL_MAX_ROWS = 1048576 # Excel's sheet limit, header included
+# Display name: (file extension, mime type)
+EXPORT_FORMATS = {
+    'CSV': ('csv', 'text/csv'),
+    'JSON': ('json', 'application/json'),
+    'Excel': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'Parquet': ('parquet', 'application/vnd.apache.parquet'),
+}
+
+_FLOAT_TYPES = {FieldType.DECIMAL, FieldType.NEWDECIMAL, FieldType.FLOAT, FieldType.DOUBLE}
+_INT_TYPES = {FieldType.TINY, FieldType.SHORT, FieldType.LONG, FieldType.LONGLONG, FieldType.INT24, FieldType.YEAR}
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def export_path(table, fmt, data_version):
+    extension = EXPORT_FORMATS[fmt][0]
+    return os.path.join(EXPORT_DIR, f"{table}.{data_version}.{extension}")
+
+
+def export_url(path):
+    """URL the browser downloads an export file from (relative to the app)."""
+    return f"{STATIC_URL}/exports/{os.path.basename(path)}"
+
+
+def _lock_for(path):
+    with _locks_lock:
+        return _locks.setdefault(path, threading.Lock())
+
+
+def _column_dtypes(description):
+    """pandas dtype per column from the cursor description, so every chunk gets the same schema."""
+    dtypes = {}
+    for column in description:
+        name, type_code = column[0], column[1]
+        if type_code in _FLOAT_TYPES:
+            dtypes[name] = 'float64' # DECIMAL arrives as decimal.Decimal objects
+        elif type_code in _INT_TYPES:
+            dtypes[name] = 'Int64'
+        elif type_code is not None:
+            dtypes[name] = 'string'
+    return dtypes
+
+
+def _chunks(table, progress=None):
+    """Yields the table in CHUNK_ROWS DataFrames from a server-side cursor, reporting progress(fraction, message)."""
+    conn = get_connection()
+    try:
+        total_rows = None
+        if progress is not None:
+            count_cursor = conn.cursor()
+            count_cursor.execute(f"SELECT COUNT(*) FROM `{table}`")
+            total_rows = count_cursor.fetchone()[0]
+            count_cursor.close()
+        cursor = conn.cursor() # Unbuffered: rows stay on the server until fetched
+        cursor.execute(f"SELECT * FROM `{table}`")
+        columns = [column[0] for column in cursor.description]
+        dtypes = _column_dtypes(cursor.description)
+        done = 0
+        while True:
+            rows = cursor.fetchmany(CHUNK_ROWS)
+            if not rows:
+                break
+            chunk = pd.DataFrame.from_records(rows, columns=columns)
+            yield chunk.astype(dtypes) if dtypes else chunk.infer_objects()
+            done += len(rows)
+            if progress is not None:
+                progress(done / total_rows if total_rows else 1.0, f"{done:,} of {total_rows:,} rows written")
+        cursor.close()
+    finally:
+        conn.close()
+
+
+def _write_csv(chunks, path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(f, index=False, header=i == 0)
+
+
+def _write_json(chunks, path):
+    """A single JSON array of records, like DataFrame.to_json(orient='records'), written chunk by chunk."""
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('[')
+        first = True
+        for chunk in chunks:
+            records = chunk.to_json(orient='records')[1:-1]
+            if records:
+                f.write(records if first else ',' + records)
+                first = False
+        f.write(']')
+
+
+def _write_excel(chunks, path):
+    """constant_memory flushes each row to disk as it is written, so memory stays flat for any table size."""
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        worksheet = workbook.add_worksheet('Sheet1')
+        header = workbook.add_format({'bold': True})
+        row = 0
+        for chunk in chunks:
+            if row == 0:
+                worksheet.write_row(0, 0, list(chunk.columns), header)
+                row = 1
+            if row + len(chunk) > EXCEL_MAX_ROWS:
+                raise ValueError(f"Table has more rows than an Excel sheet holds ({EXCEL_MAX_ROWS - 1}).")
+            for values in chunk.astype(object).where(chunk.notna(), None).itertuples(index=False):
+                worksheet.write_row(row, 0, values)
+                row += 1
+    finally:
+        workbook.close()
+
+
+def _write_parquet(chunks, path):
+    """One row group per chunk; the schema comes from the first chunk."""
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False, schema=writer.schema if writer else None)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+_WRITERS = {'CSV': _write_csv, 'JSON': _write_json, 'Excel': _write_excel, 'Parquet': _write_parquet}
+
+
+def _remove_other_versions(table, fmt, keep):
+    extension = EXPORT_FORMATS[fmt][0]
+    for path in glob.glob(os.path.join(EXPORT_DIR, f"{table}.*.{extension}")):
+        if path != keep:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def export_table(table, fmt, data_version, progress=None):
+    """Path of the table exported in one format for a data version, written once and atomically if missing."""
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table '{table}'.")
+    path = export_path(table, fmt, data_version)
+    with _lock_for(path):
+        if data_version != UNVERSIONED and os.path.exists(path):
+            return path
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            _WRITERS[fmt](_chunks(table, progress), temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+    _remove_other_versions(table, fmt, path)
+    return path
+
+
+def export_job(job, table, fmt, data_version):
+    """export_table as a background job (utils.jobs), reporting its progress on the job."""
+    return export_table(table, fmt, data_version, progress=job.report)
@@ -0,0 +1,199 @@
+# utils/figure_cache.py
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import pandas as pd
+import plotly.io as pio
+import streamlit as st
+import mysql.connector
+
+from utils.db import get_connection, run_query
+from utils.data_version import load_data_version
+from utils.frames import optimize_dtypes
+from utils.figures import SECTIONS
+from utils.jobs import JobRejected, show_job_progress, submit_job
+from utils.payload import shared_assets, slim_figure_json
+from utils.sampling import load_sample
+
+FIGURE_CACHE_TABLE = "figure_cache"
+MEMORY_MAX_ENTRIES = 256 # Payloads kept in-process in front of the table
+FIGURE_CACHE_COLUMNS = ['Cache_key', 'Section', 'Data_version', 'Payload']
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def cache_key(section, filters):
+    """Stable key for one section + filter combination (the data version is stored alongside)."""
+    raw = section + json.dumps(filters, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def build_payload(section, fetch, resources, filters):
+    """Builds a section's figure and serializes it to the JSON payload stored in the cache."""
+    figure, message = SECTIONS[section]['build'](fetch, resources, **filters)
+    if figure is None:
+        return json.dumps({'kind': 'none', 'message': message})
+    if hasattr(figure, 'to_plotly_json'):
+        spec, raw_bytes = slim_figure_json(figure, shared_assets(resources))
+        return json.dumps({'kind': 'plotly', 'spec': spec, 'raw_bytes': raw_bytes})
+    spec = figure.to_json()
+    return json.dumps({'kind': 'altair', 'spec': spec, 'raw_bytes': len(spec)})
+
+
+def payload_sizes(payloads):
+    """(bytes before slimming, bytes stored) summed over serialized payloads."""
+    raw = stored = 0
+    for payload in map(json.loads, payloads):
+        raw += payload.get('raw_bytes', 0)
+        stored += len(payload['spec'])
+    return raw, stored
+
+
+def _is_warning(payload):
+    # Warnings (no data, missing coords/GeoJSON) are not stored, so they clear once the cause is fixed
+    return json.loads(payload)['kind'] == 'none'
+
+
+def warm_up(fetch, resources, catalog, data_version, sections=None, full=False):
+    """Pre-renders the SECTIONS warm-up combinations (every combination if full); returns the figure_cache rows."""
+    rows = []
+    for section in (sections or SECTIONS):
+        filter_space = SECTIONS[section]['filters']
+        if filter_space is None:
+            continue
+        for filters in filter_space(catalog, full):
+            payload = build_payload(section, fetch, resources, filters)
+            if _is_warning(payload):
+                continue
+            rows.append((cache_key(section, filters), section, data_version, payload))
+    return pd.DataFrame(rows, columns=FIGURE_CACHE_COLUMNS)
+
+
+# --- Streamlit side ---
+
+def _memory_get(key):
+    with _memory_lock:
+        if key in _memory:
+            _memory.move_to_end(key)
+            return _memory[key]
+    return None
+
+
+def _memory_put(key, payload):
+    with _memory_lock:
+        _memory[key] = payload
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def _read_payload(key, data_version):
+    try:
+        df = run_query(f"SELECT Payload FROM {FIGURE_CACHE_TABLE} WHERE Cache_key = '{key}' AND Data_version = '{data_version}'")
+    except (mysql.connector.Error, pd.errors.DatabaseError):
+        return None
+    return df['Payload'].iloc[0] if not df.empty else None
+
+
+def _write_payload(key, section, data_version, payload):
+    """Stores a payload built on demand; a failed write only means the next view rebuilds it."""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f"REPLACE INTO {FIGURE_CACHE_TABLE} (Cache_key, Section, Data_version, Payload) VALUES (%s, %s, %s, %s)",
+                       (key, section, data_version, payload))
+        conn.commit()
+        cursor.close()
+    except mysql.connector.Error:
+        pass
+    finally:
+        if conn and conn.is_connected():
+            conn.close()
+
+
+def _stored_payload(key, data_version):
+    """Payload from process memory or the figure_cache table; None if neither has it."""
+    memory_key = (key, data_version)
+    payload = _memory_get(memory_key)
+    if payload is None:
+        payload = _read_payload(key, data_version)
+        if payload is not None:
+            _memory_put(memory_key, payload)
+    return payload
+
+
+def _build_and_store(section, fetch, resources, filters, key, data_version):
+    payload = build_payload(section, fetch, resources, filters)
+    if not _is_warning(payload):
+        _write_payload(key, section, data_version, payload)
+        _memory_put((key, data_version), payload)
+    return payload
+
+
+def cached_payload(section, fetch, resources, **filters):
+    """Serialized figure for a section + filters: process memory, then the figure_cache table, then a fresh build."""
+    data_version = load_data_version()
+    key = cache_key(section, filters)
+    payload = _stored_payload(key, data_version)
+    if payload is None:
+        payload = _build_and_store(section, fetch, resources, filters, key, data_version)
+    return json.loads(payload)
+
+
+def plain_fetch(query):
+    """The frames the pages' fetch_data returns, without Streamlit's cache (for background jobs)."""
+    return optimize_dtypes(run_query(query))
+
+
+def payload_job(job, section, resources, filters, key, data_version):
+    """Background job (utils.jobs) that builds and stores the exact figure behind a preview."""
+    job.report(0.1, "Building the exact figure...")
+    return _build_and_store(section, plain_fetch, resources, filters, key, data_version)
+
+
+def _show_preview(section, resources, filters):
+    """Draws an uncached section's sample preview while the exact figure is built in the background; False if none."""
+    preview = SECTIONS[section].get('preview')
+    if preview is None:
+        return False
+    data_version = load_data_version()
+    key = cache_key(section, filters)
+    if _stored_payload(key, data_version) is not None:
+        return False
+    figure, _ = preview(lambda table: load_sample(table, data_version), resources, **filters)
+    if figure is None:
+        return False
+    job_key = f'figure_job_{key}_{data_version}'
+    previous = st.session_state.get(job_key)
+    if previous is not None and previous.status == 'failed':
+        return False # Built in line instead of retried in the background, so its error surfaces
+    try:
+        job = st.session_state[job_key] = submit_job('figure', (key, data_version), payload_job, section, resources, filters,
+                                                     key, data_version)
+    except JobRejected:
+        return False
+    if job.finished: # Built for another session meanwhile (or failed: the caller rebuilds it in line)
+        return False
+    st.plotly_chart(figure, use_container_width=True)
+    st.caption("Approximate figure, estimated from a stratified sample of every state and year (hover for 95% bounds). "
+               "The exact figure replaces it once built.")
+    show_job_progress(job, "Refining...")
+    return True
+
+
+def show_cached_figure(section, fetch, resources, **filters):
+    """Renders a section's cached figure (or its preview or warning); returns True if a chart was drawn."""
+    if _show_preview(section, resources, filters):
+        return True
+    payload = cached_payload(section, fetch, resources, **filters)
+    if payload['kind'] == 'plotly':
+        st.plotly_chart(pio.from_json(payload['spec']), use_container_width=True)
+    elif payload['kind'] == 'altair':
+        st.vega_lite_chart(json.loads(payload['spec']), use_container_width=True)
+    else:
+        st.warning(payload['message'])
+        return False
+    return True
@@ -0,0 +1,767 @@
+# utils/figures.py
+"""Query + figure builders for the dashboard sections: build(fetch, resources, **filters) -> (figure, warning)."""
+from itertools import product
+import pandas as pd
+
+from utils.geo import resolution_for
+from utils.lazy import lazy_module
+from utils.regions import REGION_YEAR_TABLE, STATE_TABLE
+from utils.anomalies import ANOMALY_METRICS, ANOMALY_TABLE
+from utils.derived import ALL as ALL_QUARTERS, COUNTRY, CORRELATION_TABLE, METRIC_LABELS
+from utils.topk import rank_movement, topk_query
+from utils.sampling import estimate_totals
+from utils.spatial import DISTRICT_DETAIL, HEX_SIZES, MAP_DETAILS, binned_query, hex_bins
+
+# Only needed when a figure is (re)built; pages showing cached figures never import them
+alt = lazy_module('altair')
+px = lazy_module('plotly.express')
+go = lazy_module('plotly.graph_objects')
+subplots = lazy_module('plotly.subplots')
+
+INDIA_CENTER = {"lat": 20.5937, "lon": 78.9629}
+
+
+# Chart heights of the sections that draw state boundaries, and the boundary resolution each one loads
+OVERVIEW_MAP_HEIGHT = 400
+DENSITY_MAP_HEIGHT = 500
+GEOJSON_RESOLUTION = {
+    'overview_user_map': resolution_for(OVERVIEW_MAP_HEIGHT),
+    'app_opens_density': resolution_for(DENSITY_MAP_HEIGHT),
+}
+
+
+def _boundaries(resources, section):
+    return (resources.get('geojson') or {}).get(GEOJSON_RESOLUTION[section])
+
+
+def period_label(year, quarter):
+    """'2023' or '2023, Q2' for chart titles."""
+    return f"{year}{f', Q{quarter}' if quarter != 'All' else ''}"
+
+
+def _quarter_filter(quarter):
+    return f" AND Quarter = {int(quarter)}" if quarter != 'All' else ""
+
+
+def _hover(df, fields):
+    """hover_data restricted to the columns df has (binned map frames have Districts instead of State/Quarter)."""
+    return {col: fmt for col, fmt in fields.items() if col in df.columns}
+
+
+def _sum_quarters(df, keys, sums):
+    """Collapses per-quarter rows when Quarter='All' was selected."""
+    agg = df.groupby(keys, observed=True).agg(**{col: (col, func) for col, func in sums.items()}).reset_index()
+    agg['Quarter'] = 'All'
+    return agg
+
+
+# --- 1_Overview ---
+
+def build_overview_type(fetch, resources):
+    df = fetch("SELECT State, Transaction_type, Transaction_count FROM aggregated_transaction")
+    if df.empty:
+        return None, "Aggregated transaction data unavailable."
+    trans_type_count = df.groupby('Transaction_type', observed=True)['Transaction_count'].sum().reset_index()
+    fig = px.pie(trans_type_count, names='Transaction_type', values='Transaction_count', hole=.4, title="Overall Share (Count)")
+    fig.update_layout(height=400, title_x=0.5, legend_title_text='Type')
+    return fig, None
+
+
+def build_overview_state(fetch, resources):
+    trans_state_sorted = fetch(topk_query('aggregated_transaction', 'State', 'Transaction_count', value_as='Transaction_count'))
+    if trans_state_sorted.empty:
+        return None, "Aggregated transaction data unavailable."
+    fig = px.bar(trans_state_sorted, x='Transaction_count', y='State', orientation='h', text_auto='.2s',
+                 labels={'Transaction_count': "Total Count"}, title="Top 10 States")
+    fig.update_layout(yaxis=dict(autorange="reversed"), height=400, title_x=0.5)
+    return fig, None
+
+
+def build_overview_district(fetch, resources):
+    trans_district_sorted = fetch(topk_query('map_transaction', 'District', 'Transaction_count', value_as='Transaction_count'))
+    if trans_district_sorted.empty:
+        return None, "Map transaction data unavailable."
+    fig = px.bar(trans_district_sorted, x='Transaction_count', y='District', orientation='h', text_auto='.2s',
+                 labels={'Transaction_count': "Total Count"}, title="Top 10 Districts", hover_name='State')
+    fig.update_layout(yaxis=dict(autorange="reversed"), height=400, title_x=0.5)
+    return fig, None
+
+
+def build_overview_user_map(fetch, resources):
+    geojson_data = _boundaries(resources, 'overview_user_map')
+    if geojson_data is None:
+        return None, "GeoJSON missing."
+    # Boundary names come from the state dimension table; states missing from it keep their own name
+    df = fetch(f"SELECT COALESCE(s.Boundary_name, m.State) as State_Mapped, SUM(m.RegisteredUsers) as TotalRegisteredUsers "
+               f"FROM map_user m LEFT JOIN {STATE_TABLE} s ON s.State = m.State GROUP BY COALESCE(s.Boundary_name, m.State)")
+    if df.empty:
+        return None, "Map user data unavailable."
+    fig = px.choropleth(df, geojson=geojson_data, locations='State_Mapped', featureidkey='properties.st_nm',
+                        color='TotalRegisteredUsers', projection='mercator', labels={'TotalRegisteredUsers': "Registered Users"},
+                        color_continuous_scale='Reds', title="Registered Users Distribution")
+    fig.update_geos(fitbounds='locations', visible=False)
+    fig.update_layout(height=OVERVIEW_MAP_HEIGHT, title_x=0.5, margin=dict(l=0, r=0, t=40, b=0))
+    return fig, None
+
+
+# --- 2_Transactions ---
+
+def transaction_type_query(state, year, quarter):
+    return (f"SELECT Transaction_type, SUM(Transaction_amount) as TotalAmount, SUM(Transaction_count) as TotalCount, Quarter "
+            f"FROM aggregated_transaction WHERE State = '{state}' AND Year = {year}{_quarter_filter(quarter)} "
+            f"GROUP BY Transaction_type, Quarter ORDER BY TotalAmount DESC")
+
+
+def build_transaction_type(fetch, resources, state, year, quarter):
+    df1 = fetch(transaction_type_query(state, year, quarter))
+    if df1.empty:
+        return None, "No data found for the selected filters."
+    df1_agg = _sum_quarters(df1, 'Transaction_type', {'TotalAmount': 'sum', 'TotalCount': 'sum'}) if quarter == 'All' else df1
+    fig1 = px.bar(
+        df1_agg, x="Transaction_type", y="TotalAmount",
+        color="Transaction_type",
+        title=f"Transaction Amounts in {state} ({period_label(year, quarter)})",
+        labels={'TotalAmount': 'Total Transaction Amount (₹)', 'Transaction_type': 'Transaction Type'},
+        hover_data={'TotalCount':':,', 'Quarter':True} # Format TotalCount in hover
+    )
+    fig1.update_traces(hovertemplate="<b>Type:</b> %{x}<br><b>Amount:</b> ₹%{y:,.0f}<br><b>Count:</b> %{customdata[0]:,}<br><b>Quarter:</b> %{customdata[1]}<extra></extra>")
+    fig1.update_layout(showlegend=False, title_x=0.5, width=900, height=500)
+    fig1.update_traces(marker_line=dict(width=1, color='DarkSlateGrey'))
+    return fig1, None
+
+
+def transaction_hotspots_query(year, quarter):
+    return (f"SELECT State, District, lat, lon, SUM(Transaction_amount) as TotalAmount, SUM(Transaction_count) as TotalCount, Quarter "
+            f"FROM map_transaction WHERE Year = {year}{_quarter_filter(quarter)} "
+            f"GROUP BY State, District, lat, lon, Quarter HAVING SUM(Transaction_amount) > 0")
+
+
+def build_transaction_hotspots(fetch, resources, year, quarter, detail=DISTRICT_DETAIL):
+    if detail in HEX_SIZES:
+        df2_plot = fetch(binned_query('map_transaction', "SUM(Transaction_amount) as TotalAmount, SUM(Transaction_count) as TotalCount",
+                                      detail, f"Year = {year}{_quarter_filter(quarter)}", having="SUM(Transaction_amount) > 0"))
+        if df2_plot.empty:
+            return None, "No mapped transaction data found for the selected filters."
+    else:
+        df2_trans = fetch(transaction_hotspots_query(year, quarter))
+        if df2_trans.empty:
+            return None, "No transaction data found for the selected filters."
+        df2_merged = df2_trans.dropna(subset=['lat', 'lon']) # Districts the ETL could not resolve have no coordinates
+        if df2_merged.empty:
+            return None, "No districts could be mapped. Check names in DB vs coordinate file."
+        if quarter == 'All':
+            df2_plot = _sum_quarters(df2_merged, ['State', 'District', 'lat', 'lon'], {'TotalAmount': 'sum', 'TotalCount': 'sum'})
+        else:
+            df2_plot = df2_merged
+    return _transaction_hotspots_map(df2_plot, f"Transaction Hotspots ({period_label(year, quarter)})", detail), None
+
+
+def _transaction_hotspots_map(df2_plot, title, detail):
+    fig2 = px.scatter_mapbox(df2_plot, lat="lat", lon="lon",
+                             size="TotalAmount", hover_name="District" if detail == DISTRICT_DETAIL else None,
+                             hover_data=_hover(df2_plot, {"State": True,
+                                                          "Districts": True,
+                                                          "TotalCount": ':,',
+                                                          "TotalCount_margin": ':,.0f',
+                                                          "TotalAmount": ':,.0f',
+                                                          "TotalAmount_margin": ':,.0f',
+                                                          'Quarter': True,
+                                                          'lat': False, # Hide lat/lon from hover
+                                                          'lon': False
+                                                          }),
+                             title=title,
+                             size_max=40, zoom=3.8, center=INDIA_CENTER,
+                             color="TotalAmount", # Color points by amount too
+                             color_continuous_scale=px.colors.sequential.Plasma_r,
+                             labels={'TotalAmount':'Total Amount (₹)', 'TotalCount':'Total Count',
+                                     'TotalAmount_margin': '± Amount (95%)', 'TotalCount_margin': '± Count (95%)'}
+                             )
+    fig2.update_layout(mapbox_style='carto-positron', margin={"r":0,"t":40,"l":0,"b":0}, width=900, height=500)
+    return fig2
+
+
+def _sample_filter(year, quarter, state='All'):
+    """DataFrame.query() expression selecting a period (and state) from sample rows."""
+    where = f"Year == {int(year)}"
+    if quarter != 'All':
+        where += f" and Quarter == {int(quarter)}"
+    if state != 'All':
+        where += f" and State == {state!r}"
+    return where
+
+
+def _estimated_map(sample, table, where, columns, quarter, detail):
+    """Estimated district (or hexagon) totals, with margins, of the sampled rows matching where, or None."""
+    drawn = sample(table)
+    if drawn is None:
+        return None
+    rows, strata = drawn
+    rows = rows.query(where).dropna(subset=['lat', 'lon'])
+    if rows.empty:
+        return None
+    if detail in HEX_SIZES:
+        q, r, lat, lon = hex_bins(rows['lat'], rows['lon'], HEX_SIZES[detail])
+        rows = rows.assign(Bin_q=q, Bin_r=r, lat=lat.round(6), lon=lon.round(6))
+        keys = ['Bin_q', 'Bin_r', 'lat', 'lon']
+    else:
+        keys = ['State', 'District', 'lat', 'lon']
+    estimates = estimate_totals(rows, strata, keys, list(columns))
+    estimates[list(columns)] = estimates[list(columns)].round() # Whole counts and rupees in the hover
+    if detail in HEX_SIZES: # Districts seen in the sample (a lower bound), like the exact map's Districts
+        districts = rows.groupby(['Bin_q', 'Bin_r'], observed=True)['District'].nunique().rename('Districts')
+        estimates = estimates.join(districts, on=['Bin_q', 'Bin_r']).drop(columns=['Bin_q', 'Bin_r'])
+    else:
+        estimates['Quarter'] = quarter
+    return estimates.rename(columns={**columns, **{f'{c}_margin': f'{name}_margin' for c, name in columns.items()}})
+
+
+def preview_transaction_hotspots(sample, resources, year, quarter, detail=DISTRICT_DETAIL):
+    """build_transaction_hotspots estimated from the map_transaction sample."""
+    df2_plot = _estimated_map(sample, 'map_transaction', _sample_filter(year, quarter),
+                              {'Transaction_amount': 'TotalAmount', 'Transaction_count': 'TotalCount'}, quarter, detail)
+    if df2_plot is None:
+        return None, "No sampled map_transaction rows with coordinates."
+    return _transaction_hotspots_map(df2_plot, f"Transaction Hotspots ({period_label(year, quarter)}, approximate)", detail), None
+
+
+def transaction_count_share_query(state, year, quarter):
+    return (f"SELECT Transaction_type, SUM(Transaction_count) as TotalCount, Quarter FROM aggregated_transaction "
+            f"WHERE State = '{state}' AND Year = {year}{_quarter_filter(quarter)} "
+            f"GROUP BY Transaction_type, Quarter HAVING SUM(Transaction_count) > 0 ORDER BY TotalCount DESC") # Filter zero counts
+
+
+def build_transaction_count_share(fetch, resources, state, year, quarter):
+    df3 = fetch(transaction_count_share_query(state, year, quarter))
+    if df3.empty:
+        return None, "No data found for the selected filters."
+    df3_agg = _sum_quarters(df3, 'Transaction_type', {'TotalCount': 'sum'}) if quarter == 'All' else df3
+    fig3 = px.pie(
+        df3_agg, names='Transaction_type', values='TotalCount', hole=.4,
+        title=f"Transaction Count Share in {state} ({period_label(year, quarter)})",
+        hover_data=['Quarter']
+    )
+    fig3.update_traces(hovertemplate="<b>Type:</b> %{label}<br><b>Count:</b> %{value:,}<br><b>Share:</b> %{percent}<extra></extra>")
+    fig3.update_layout(width=900, height=500, title_x=0.5)
+    return fig3, None
+
+
+# --- 3_Users ---
+
+def _state_filter(state):
+    return f" AND State = '{state}'" if state != 'All' else ""
+
+
+def brand_share_query(state, year, quarter):
+    return (f"SELECT Brand, SUM(Transaction_count) as TotalCount, AVG(Percentage) as AvgPercentage, Quarter FROM aggregated_user "
+            f"WHERE Year = {year}{_state_filter(state)}{_quarter_filter(quarter)} "
+            f"GROUP BY Brand, Quarter HAVING SUM(Transaction_count) > 0 ORDER BY TotalCount DESC")
+
+
+def build_brand_share(fetch, resources, state, year, quarter):
+    df1 = fetch(brand_share_query(state, year, quarter))
+    if df1.empty:
+        return None, "No data found for the selected filters (Brands)."
+    df1_agg = _sum_quarters(df1, 'Brand', {'TotalCount': 'sum', 'AvgPercentage': 'mean'}) if quarter == 'All' else df1
+    # Treemap paths group with observed=False internally; a categorical Brand would add empty, zero-weight groups
+    df1_agg = df1_agg.astype({'Brand': str})
+    fig1 = px.treemap(
+        df1_agg, path=['Brand'], values='TotalCount', color='AvgPercentage',
+        color_continuous_scale='YlOrBr',
+        hover_data={'AvgPercentage': ':.2%', 'Quarter': True},
+        hover_name='Brand',
+        title=f"Brand Share in {state} ({period_label(year, quarter)})"
+    )
+    fig1.update_traces(hovertemplate='<b>%{label}</b><br>Transaction Count: %{value:,}<br>Avg. Share: %{color:.2%}<extra></extra>')
+    fig1.update_layout(width=900, height=500, title_x=0.5, coloraxis_colorbar=dict(tickformat='.1%', title='Avg % Share'))
+    return fig1, None
+
+
+def user_hotspots_query(state, year, quarter):
+    return (f"SELECT State, District, lat, lon, SUM(RegisteredUsers) as TotalRegisteredUsers, Quarter FROM map_user "
+            f"WHERE Year = {year}{_state_filter(state)}{_quarter_filter(quarter)} "
+            f"GROUP BY State, District, lat, lon, Quarter HAVING SUM(RegisteredUsers) > 0")
+
+
+def build_user_hotspots(fetch, resources, state, year, quarter, detail=DISTRICT_DETAIL):
+    if detail in HEX_SIZES:
+        df2_plot = fetch(binned_query('map_user', "SUM(RegisteredUsers) as TotalRegisteredUsers", detail,
+                                      f"Year = {year}{_state_filter(state)}{_quarter_filter(quarter)}", having="SUM(RegisteredUsers) > 0"))
+        if df2_plot.empty:
+            return None, "No mapped user data found for selected filters."
+    else:
+        df2_user = fetch(user_hotspots_query(state, year, quarter))
+        if df2_user.empty:
+            return None, "No user data found for selected filters."
+        df2_merged = df2_user.dropna(subset=['lat', 'lon']) # Districts the ETL could not resolve have no coordinates
+        if df2_merged.empty:
+            return None, "No districts could be mapped. Check names in DB vs coordinate file."
+        if quarter == 'All':
+            df2_plot = _sum_quarters(df2_merged, ['State', 'District', 'lat', 'lon'], {'TotalRegisteredUsers': 'sum'})
+        else:
+            df2_plot = df2_merged
+    return _user_hotspots_map(df2_plot, f"Registered Users in {state} ({period_label(year, quarter)})", state, detail), None
+
+
+def _user_hotspots_map(df2_plot, title, state, detail):
+    fig2 = px.scatter_mapbox(
+        df2_plot, lat="lat", lon="lon", size="TotalRegisteredUsers",
+        hover_name="District" if detail == DISTRICT_DETAIL else None,
+        hover_data=_hover(df2_plot, {"State": True,
+                                     "Districts": True,
+                                     "Quarter": True,
+                                     "TotalRegisteredUsers": ':,',
+                                     "TotalRegisteredUsers_margin": ':,.0f',
+                                     'lat': False, 'lon': False}),
+        title=title,
+        size_max=40, zoom=3.8 if state == 'All' else 5, center=INDIA_CENTER,
+        color="TotalRegisteredUsers",
+        color_continuous_scale=px.colors.sequential.Agsunset_r,
+        labels={'TotalRegisteredUsers': 'Registered Users', 'TotalRegisteredUsers_margin': '± Users (95%)'}
+    )
+    fig2.update_layout(mapbox_style='carto-positron', margin={"r":0,"t":40,"l":0,"b":0}, width=900, height=500)
+    return fig2
+
+
+def preview_user_hotspots(sample, resources, state, year, quarter, detail=DISTRICT_DETAIL):
+    """build_user_hotspots estimated from the map_user sample."""
+    df2_plot = _estimated_map(sample, 'map_user', _sample_filter(year, quarter, state),
+                              {'RegisteredUsers': 'TotalRegisteredUsers'}, quarter, detail)
+    if df2_plot is None:
+        return None, "No sampled map_user rows with coordinates."
+    return _user_hotspots_map(df2_plot, f"Registered Users in {state} ({period_label(year, quarter)}, approximate)", state, detail), None
+
+
+def top_districts_query(state, year):
+    return topk_query('map_user', 'District', 'RegisteredUsers', year, 'All', state, value_as='TotalRegisteredUsers')
+
+
+def build_top_districts(fetch, resources, state, year):
+    df3 = fetch(top_districts_query(state, year))
+    if df3.empty:
+        return None, "No data found for Top Districts."
+    df3['Movement'] = rank_movement(df3) # Versus the previous year
+    fig3 = px.bar(
+        df3, x='TotalRegisteredUsers', y='District', orientation='h', text='Movement',
+        color='TotalRegisteredUsers', color_continuous_scale='Greens_r',
+        title=f"Top 10 Districts in {state} ({year}) by Registered Users",
+        labels={'TotalRegisteredUsers':'Total Registered Users'},
+        hover_data={'State': True, 'Previous_position': True}
+    )
+    fig3.update_traces(textposition='outside',
+                       hovertemplate="<b>District:</b> %{y}<br><b>State:</b> %{customdata[0]}<br><b>Registered Users:</b> %{x:,}"
+                                     "<br><b>Rank last year:</b> %{customdata[1]}<extra></extra>")
+    fig3.update_layout(yaxis={'categoryorder': 'total ascending'}, title_x=0.5, width=900, height=500)
+    return fig3, None
+
+
+def app_opens_query(year, quarter):
+    return (f"SELECT State, District, lat, lon, SUM(AppOpens) as TotalAppOpens, Quarter FROM map_user "
+            f"WHERE Year = {year}{_quarter_filter(quarter)} "
+            f"GROUP BY State, District, lat, lon, Quarter HAVING TotalAppOpens > 0")
+
+
+def build_app_opens_density(fetch, resources, year, quarter, detail=DISTRICT_DETAIL):
+    if detail in HEX_SIZES:
+        df4_plot = fetch(binned_query('map_user', "SUM(AppOpens) as TotalAppOpens", detail,
+                                      f"Year = {year}{_quarter_filter(quarter)}", having="SUM(AppOpens) > 0"))
+        if df4_plot.empty:
+            return None, "No mapped App Opens data found for selected filters."
+    else:
+        df4_user = fetch(app_opens_query(year, quarter))
+        if df4_user.empty:
+            return None, "No App Opens data found for selected filters."
+        df4_merged = df4_user.dropna(subset=['lat', 'lon']) # Districts the ETL could not resolve have no coordinates
+        if df4_merged.empty:
+            return None, "No districts with App Opens could be mapped."
+        if quarter == 'All':
+            df4_plot = _sum_quarters(df4_merged, ['State', 'District', 'lat', 'lon'], {'TotalAppOpens': 'sum'})
+        else:
+            df4_plot = df4_merged
+    fig4 = px.density_mapbox(
+        df4_plot, lat='lat', lon='lon', z='TotalAppOpens', radius=15,
+        center=INDIA_CENTER, zoom=3.8,
+        hover_name='District' if detail == DISTRICT_DETAIL else None,
+        hover_data=_hover(df4_plot, {"State": True,
+                                     "Districts": True,
+                                     "Quarter": True,
+                                     "TotalAppOpens": ':,',
+                                     'lat': False, 'lon': False
+                                     }),
+        mapbox_style="carto-darkmatter",
+        opacity=0.7, labels={'TotalAppOpens': 'Total App Opens', 'z': 'App Opens Density'},
+        title=f"App Opens Density ({period_label(year, quarter)})",
+        color_continuous_scale='Blues'
+    )
+    geojson_data = _boundaries(resources, 'app_opens_density')
+    if geojson_data:
+        fig4.update_layout(
+            mapbox_layers=[{
+                "sourcetype": "geojson", "source": geojson_data,
+                "type": "line", "color": "rgba(255,255,255,0.3)",
+                "line": {"width": 0.5}
+            }]
+        )
+    fig4.update_layout(margin=dict(l=0, r=0, t=40, b=0), width=900, height=DENSITY_MAP_HEIGHT, title_x=0.5)
+    return fig4, None
+
+
+# --- 2_Transactions / 3_Users: Anomalies ---
+def anomalies_query(metric, year, quarter):
+    return (f"SELECT State, District, Year, Quarter, Value, YoY_change, Score, Direction, lat, lon FROM {ANOMALY_TABLE} "
+            f"WHERE Metric = '{metric}' AND Year = {year}{_quarter_filter(quarter)} ORDER BY ABS(Score) DESC")
+
+
+def build_anomaly_map(fetch, resources, metric, year, quarter):
+    """District map of the quarters utils.anomalies flagged: red spikes, blue drops, sized by |score|."""
+    label = ANOMALY_METRICS[metric][1]
+    df = fetch(anomalies_query(metric, year, quarter))
+    if df.empty:
+        return None, f"No unusual {label.lower()} quarters flagged for {period_label(year, quarter)}."
+    df = df.dropna(subset=['lat', 'lon']) # Districts the ETL could not resolve have no coordinates
+    if df.empty:
+        return None, "No flagged districts could be mapped. Check names in DB vs coordinate file."
+    df = df.assign(Size=df['Score'].abs(), Period=df['Year'].astype(str) + '-Q' + df['Quarter'].astype(str))
+    bound = float(df['Size'].max())
+    fig = px.scatter_mapbox(df, lat='lat', lon='lon', size='Size', color='Score', hover_name='District',
+                            hover_data={'State': True, 'Period': True, 'Direction': True, 'Value': ':,.2f' if metric == 'AppOpens_per_user' else ':,.0f',
+                                        'YoY_change': ':+.1%', 'Score': ':.1f', 'Size': False, 'lat': False, 'lon': False},
+                            title=f"Unusual {label} Quarters ({period_label(year, quarter)})",
+                            size_max=25, zoom=3.8, center=INDIA_CENTER, color_continuous_scale='RdBu_r', range_color=[-bound, bound],
+                            labels={'Value': label, 'YoY_change': 'YoY change', 'Score': 'Robust z-score'})
+    fig.update_layout(mapbox_style='carto-positron', margin={"r":0,"t":40,"l":0,"b":0}, width=900, height=500)
+    return fig, None
+
+
+# --- 3_Users: Metric Relationships ---
+def correlations_query(state, year, quarter):
+    scope = COUNTRY if state == 'All' else str(state).replace("'", "''")
+    quarter = ALL_QUARTERS if quarter == 'All' else int(quarter)
+    return (f"SELECT Metric_x, Metric_y, Correlation, Districts FROM {CORRELATION_TABLE} "
+            f"WHERE Scope = '{scope}' AND Year = {int(year)} AND Quarter = {quarter}")
+
+
+def build_metric_correlations(fetch, resources, state, year, quarter):
+    """Heatmap of how every pair of metrics and ratios correlates across districts (utils.derived)."""
+    df = fetch(correlations_query(state, year, quarter))
+    if df.empty:
+        return None, "Not enough districts with data to relate metrics for the selected filters."
+    metrics = [metric for metric in METRIC_LABELS if metric in set(df['Metric_x'].astype(str)) | set(df['Metric_y'].astype(str))]
+    matrix = pd.DataFrame(float('nan'), index=metrics, columns=metrics)
+    for x, y, r in zip(df['Metric_x'].astype(str), df['Metric_y'].astype(str), df['Correlation']):
+        matrix.loc[x, y] = matrix.loc[y, x] = r
+    for metric in metrics:
+        matrix.loc[metric, metric] = 1.0
+    labels = [METRIC_LABELS[metric] for metric in metrics]
+    place = 'All India' if state == 'All' else state
+    fig = px.imshow(matrix.to_numpy(), x=labels, y=labels, zmin=-1, zmax=1, color_continuous_scale='RdBu_r', text_auto='.2f',
+                    aspect='auto', title=f"Metric Correlations across Districts - {place} ({period_label(year, quarter)})")
+    fig.update_traces(hovertemplate="<b>%{y}</b> vs <b>%{x}</b><br><b>Correlation:</b> %{z:.2f}<extra></extra>")
+    fig.update_layout(width=900, height=650, title_x=0.5, coloraxis_colorbar=dict(title='r'))
+    return fig, None
+
+
+# --- 4_Trend ---
+
+# Overlay label: utils.timeseries series column
+TREND_OVERLAYS = {'4-quarter rolling average': 'Rolling', 'QoQ growth': 'QoQ', 'YoY growth': 'YoY'}
+
+
+def build_trend_figure(series, value_label, title, overlays=(), amount=False, forecast=None):
+    """Line chart of one entity's series with rolling average, growth lines and an optional forecast interval."""
+    value_format = "₹%{y:,.0f}" if amount else "%{y:,.0f}"
+    fig = subplots.make_subplots(specs=[[{"secondary_y": True}]])
+    fig.add_trace(go.Scatter(x=series['Period'], y=series['Value'], mode='lines+markers', name=value_label,
+                             hovertemplate=f"<b>Period:</b> %{{x}}<br><b>{value_label}:</b> {value_format}<extra></extra>"))
+    for overlay in overlays:
+        column = TREND_OVERLAYS[overlay]
+        if column == 'Rolling':
+            fig.add_trace(go.Scatter(x=series['Period'], y=series[column], mode='lines', name=overlay, line=dict(dash='dash'),
+                                     hovertemplate=f"<b>Period:</b> %{{x}}<br><b>{overlay}:</b> {value_format}<extra></extra>"))
+        else:
+            fig.add_trace(go.Scatter(x=series['Period'], y=series[column], mode='lines+markers', name=overlay, line=dict(dash='dot'),
+                                     hovertemplate=f"<b>Period:</b> %{{x}}<br><b>{overlay}:</b> %{{y:+.1%}}<extra></extra>"),
+                          secondary_y=True)
+    if forecast is not None:
+        period = f"{int(forecast['Year'])}-Q{int(forecast['Quarter'])}"
+        fig.add_trace(go.Scatter(x=[period], y=[forecast['Forecast']], mode='markers', name='Next-quarter projection',
+                                 marker=dict(symbol='diamond', size=10),
+                                 error_y=dict(type='data', symmetric=False, array=[forecast['Upper'] - forecast['Forecast']],
+                                              arrayminus=[forecast['Forecast'] - forecast['Lower']]),
+                                 customdata=[[forecast['Lower'], forecast['Upper']]],
+                                 hovertemplate=f"<b>Projection {period}:</b> {value_format}<br>"
+                                               "<b>80% interval:</b> %{customdata[0]:,.0f} - %{customdata[1]:,.0f}<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title='Period (Year-Quarter)', yaxis_title=value_label, width=900, height=450, title_x=0.5,
+                      legend=dict(orientation='h', y=-0.25))
+    fig.update_yaxes(title_text='Growth', tickformat='.0%', showgrid=False, secondary_y=True,
+                     visible=any(TREND_OVERLAYS[o] != 'Rolling' for o in overlays))
+    return fig
+
+
+def build_nearby_figure(lines, district, value_label, title, amount=False):
+    """Line chart of a nearby_series frame: the district bold, its neighbours thin and the state average dashed."""
+    value_format = "₹%{y:,.0f}" if amount else "%{y:,.0f}"
+    fig = go.Figure()
+    for name, line in lines.groupby('Series', sort=False):
+        distance = line['Distance_km'].iloc[0]
+        if name == district:
+            style, label = dict(width=4), name
+        elif pd.isna(distance):
+            style, label = dict(dash='dash', color='grey'), name
+        else:
+            style, label = dict(width=1.5), f"{name} ({distance:,.0f} km)"
+        fig.add_trace(go.Scatter(x=line['Period'], y=line['Value'], mode='lines', name=label, line=style,
+                                 hovertemplate=f"<b>{label}</b><br><b>Period:</b> %{{x}}<br><b>{value_label}:</b> {value_format}<extra></extra>"))
+    fig.update_layout(title=title, xaxis_title='Period (Year-Quarter)', yaxis_title=value_label, width=900, height=450, title_x=0.5,
+                      legend=dict(orientation='h', y=-0.25))
+    return fig
+
+
+# Pincode metric label: (top_* table, column); pincodes are only listed in the quarters they made a state's top list
+PINCODE_METRICS = {
+    'Transaction Count': ('top_transaction', 'Transaction_count'),
+    'Transaction Amount': ('top_transaction', 'Transaction_amount'),
+    'Registered Users': ('top_user', 'RegisteredUsers'),
+    'Insurance Policies': ('top_insurance', 'Count'),
+    'Insurance Premium': ('top_insurance', 'Amount'),
+}
+
+
+def pincode_trend_query(state, pincode):
+    state, pincode = str(state).replace("'", "''"), str(pincode).replace("'", "''")
+    return " UNION ALL ".join(
+        f"SELECT '{label}' as Metric, Year, Quarter, SUM({column}) as Value FROM {table} "
+        f"WHERE State = '{state}' AND Pincode = '{pincode}' GROUP BY Year, Quarter"
+        for label, (table, column) in PINCODE_METRICS.items())
+
+
+def build_pincode_trend(df, title):
+    """One small line chart per PINCODE_METRICS metric (pincode_trend_query rows), each with its own y axis."""
+    df = df.assign(Period=df['Year'].astype(int).astype(str) + "-Q" + df['Quarter'].astype(int).astype(str))
+    df = df.sort_values(['Year', 'Quarter'])
+    metrics = [label for label in PINCODE_METRICS if label in set(df['Metric'].astype(str))]
+    periods = list(dict.fromkeys(df['Period'])) # Facets share one period axis, in time order
+    fig = px.line(df, x='Period', y='Value', facet_row='Metric', category_orders={'Metric': metrics, 'Period': periods}, markers=True,
+                  title=title, height=180 * len(metrics) + 120)
+    fig.update_yaxes(matches=None, title=None, tickformat='~s')
+    fig.for_each_annotation(lambda a: a.update(text=a.text.split('=')[-1]))
+    fig.update_layout(xaxis_title='Period (Year-Quarter)', title_x=0.5)
+    return fig
+
+
+def build_growth_ranking(ranking, entity, metric_label, measure):
+    """Horizontal bar chart of a TrendMatrix.ranking table (fastest first)."""
+    labels = ranking[entity] + (", " + ranking['State'] if entity != 'State' else "")
+    fig = px.bar(ranking.assign(Label=labels), x='Growth', y='Label', orientation='h', custom_data=['Latest'],
+                 title=f"Fastest-Growing {entity}s by {metric_label} ({measure})")
+    fig.update_traces(hovertemplate=f"<b>%{{y}}</b><br><b>{measure}:</b> %{{x:+.1%}}<br><b>Latest quarter:</b> %{{customdata[0]:,.0f}}<extra></extra>")
+    fig.update_layout(xaxis_tickformat='.0%', xaxis_title=measure, yaxis_title=None, yaxis=dict(autorange="reversed"),
+                      height=450, title_x=0.5)
+    return fig
+
+
+def top_categories_query(category, year, quarter):
+    if category == 'Pincodes':
+        return topk_query('top_transaction', 'Pincode', 'Transaction_amount', year, quarter, value_as='TotalAmount')
+    return topk_query('map_transaction', 'District' if category == 'Districts' else 'State', 'Transaction_amount', year, quarter, value_as='TotalAmount')
+
+
+def build_top_categories(fetch, resources, category, year, quarter):
+    df2 = fetch(top_categories_query(category, year, quarter))
+    if df2.empty:
+        return None, "No data found for the selected filters."
+    entity = 'State' if category == 'States' else ('District' if category == 'Districts' else 'Pincode')
+    if entity == 'Pincode':
+        df2['Pincode'] = df2['Pincode'].astype(str)
+    df2['Movement'] = rank_movement(df2) # Versus the previous quarter (or year, for 'All')
+
+    # Base chart definition
+    base = alt.Chart(df2, height=500).encode(
+        x=alt.X('TotalAmount', title='Total Transaction Amount', axis=alt.Axis(format='~s')),
+        y=alt.Y(entity, sort='-x', title=category[:-1]),
+        # Define tooltip fields
+        tooltip = [
+            alt.Tooltip(entity, title=category[:-1]), # Title matches axis
+            alt.Tooltip('State', title='State') if 'State' in df2.columns else alt.value(None), # Show State if available
+            alt.Tooltip('TotalAmount', title='Total Amount', format='~s'), # Format amount
+            alt.Tooltip('Previous_position', title='Previous rank')
+        ]
+    )
+
+    # Apply coloring
+    if 'State' in df2.columns and entity != 'State':
+        chart2 = base.mark_bar().encode(color=alt.Color('State', title='State')) # Color by State
+    else:
+        chart2 = base.mark_bar(color='steelblue') # Single color
+
+    # Rank movement next to each bar
+    chart2 = chart2 + base.mark_text(align='left', dx=3).encode(text='Movement')
+
+    # Add title and make interactive
+    chart2 = chart2.properties(
+        title=f"Top 10 {category} by Transaction Amount ({period_label(year, quarter)})"
+    ).configure_title(
+        align='center', anchor='middle'
+    ).interactive()
+    return chart2, None
+
+
+# --- 5_Comparision ---
+
+def build_region_year(fetch, resources):
+    df = fetch(f"SELECT Region, Year, Transaction_amount FROM {REGION_YEAR_TABLE}")
+    if df.empty:
+        return None, "Region rollup unavailable. Run the ETL to build it."
+    df['Transaction_amount(B)'] = pd.to_numeric(df['Transaction_amount'], errors='coerce').fillna(0) / 1e9
+    df['Year'] = df['Year'].astype(str) # One bar per year, not a numeric axis
+    df = df.sort_values(['Region', 'Year'])
+    fig = px.bar(df, x='Year', y='Transaction_amount(B)', facet_col='Region', facet_col_wrap=3, facet_row_spacing=0.12,
+                 labels={'Transaction_amount(B)': "Amount (Billions ₹)"}, title="Total Transaction Amount per Year by Region")
+    fig.for_each_annotation(lambda a: a.update(text=a.text.replace("Region=", "Region: ")))
+    fig.update_yaxes(matches=None, showticklabels=True) # Each region on its own scale
+    fig.update_layout(height=600, title_x=0.5)
+    return fig, None
+
+
+# --- 6_Insurance ---
+
+def insurance_state_query(year, quarter):
+    return (f"SELECT State, SUM(Count) as TotalCount, SUM(Amount) as TotalAmount FROM aggregated_insurance "
+            f"WHERE Year={year}{_quarter_filter(quarter)} GROUP BY State ORDER BY State")
+
+
+def build_insurance_state(fetch, resources, year, quarter, metric):
+    df1 = fetch(insurance_state_query(year, quarter))
+    if df1.empty:
+        return None, "No aggregated insurance data found."
+    col = "TotalCount" if metric == "Count" else "TotalAmount"
+    title = "Top 15 States by Insurance Count" if metric == "Count" else "Top 15 States by Insurance Amount (₹)"
+    fig = px.bar(df1.sort_values(col, ascending=False).head(15), x=col, y="State", orientation='h', title=title)
+    fig.update_layout(yaxis={'categoryorder':'total ascending'}, title_x=0.5)
+    return fig, None
+
+
+def insurance_map_query(year, quarter):
+    return (f"SELECT State, District, lat, lon, SUM(Count) as TotalCount, SUM(Amount) as TotalAmount, Quarter FROM map_insurance "
+            f"WHERE Year={year}{_quarter_filter(quarter)} GROUP BY State, District, lat, lon, Quarter")
+
+
+def build_insurance_map(fetch, resources, year, quarter, metric, detail=DISTRICT_DETAIL):
+    if detail in HEX_SIZES:
+        df2_plot = fetch(binned_query('map_insurance', "SUM(Count) as TotalCount, SUM(Amount) as TotalAmount",
+                                      detail, f"Year={year}{_quarter_filter(quarter)}"))
+        if df2_plot.empty:
+            return None, "No mapped insurance data found."
+        hover_data = ["Districts", "TotalCount", "TotalAmount"]
+    else:
+        df2_map = fetch(insurance_map_query(year, quarter))
+        if df2_map.empty:
+            return None, "No map insurance data found."
+        df2_merged = df2_map.dropna(subset=['lat', 'lon']) # Districts the ETL could not resolve have no coordinates
+        if df2_merged.empty:
+            return None, "No districts could be mapped."
+        if quarter == 'All':
+            df2_plot = _sum_quarters(df2_merged, ['State', 'District', 'lat', 'lon'], {'TotalCount': 'sum', 'TotalAmount': 'sum'})
+        else:
+            df2_plot = df2_merged
+        hover_data = ["State", "TotalCount", "TotalAmount", 'Quarter']
+    size_col = "TotalCount" if metric == "Count" else "TotalAmount"
+    fig2_map = px.scatter_mapbox(df2_plot, lat="lat", lon="lon", size=size_col,
+                                 hover_name="District" if detail == DISTRICT_DETAIL else None, hover_data=hover_data,
+                                 title=f"Insurance {metric} Hotspots ({period_label(year, quarter)})",
+                                 size_max=30, zoom=3.8, center=INDIA_CENTER,
+                                 color_continuous_scale=px.colors.sequential.Viridis) # Use size for primary metric
+    fig2_map.update_layout(mapbox_style='carto-positron', margin={"r":0,"t":40,"l":0,"b":0})
+    return fig2_map, None
+
+
+def insurance_pincodes_query(year, quarter, metric):
+    return topk_query('top_insurance', 'Pincode', metric, year, quarter, value_as="TotalCount" if metric == "Count" else "TotalAmount")
+
+
+def build_insurance_pincodes(fetch, resources, year, quarter, metric):
+    df3_pin = fetch(insurance_pincodes_query(year, quarter, metric))
+    if df3_pin.empty:
+        return None, "No top pincode insurance data found."
+    sort_col = "TotalCount" if metric == "Count" else "TotalAmount"
+    df3_pin['Pincode'] = df3_pin['Pincode'].astype(str) # Ensure pincode is string for axis
+    df3_pin['Movement'] = rank_movement(df3_pin) # Versus the previous quarter (or year, for 'All')
+    fig3_pin = px.bar(df3_pin, x=sort_col, y="Pincode", orientation='h', text='Movement',
+                      title=f"Top 10 Pincodes by Insurance {metric} ({period_label(year, quarter)})",
+                      hover_data=["State", "Previous_position"], labels={'Previous_position': 'Previous rank'})
+    fig3_pin.update_traces(textposition='outside')
+    fig3_pin.update_layout(yaxis={'categoryorder':'total ascending'}, title_x=0.5)
+    return fig3_pin, None
+
+
+# --- Section registry (used by utils.figure_cache) ---
+# 'filters'(catalog, full) lists the filter combinations the offline warm-up pre-renders: the page defaults ('All'
+# states and quarters) for the latest WARM_YEARS years, or with full=True every combination (the background pass,
+# etl_script.py --only warm-figures). Until then others are built and cached on first view; None means the section
+# is only cached on demand.
+# 'preview' (optional) is shown from the stratified sample while an uncached figure is built in the background.
+
+WARM_YEARS = 2 # Latest years the default warm-up pre-renders
+
+
+def _space(**options):
+    """All combinations of the given filter options as keyword dicts."""
+    names = list(options)
+    return [dict(zip(names, values)) for values in product(*options.values())]
+
+
+def _states(catalog, dataset, full, with_all=False):
+    """States to warm: 'All' (the page default) where the section offers it, else every state; full adds every state."""
+    states = catalog.options(dataset, 'State')
+    if not with_all:
+        return states
+    return ['All'] + states if full else ['All']
+
+
+def _years(catalog, dataset, full):
+    years = catalog.options(dataset, 'Year', descending=True)
+    return years if full else years[:WARM_YEARS]
+
+
+def _quarters(catalog, dataset, full):
+    return ['All'] + catalog.options(dataset, 'Quarter') if full else ['All'] # Single quarters only in the full pass
+
+
+SECTIONS = {
+    'overview_type': {'build': build_overview_type, 'filters': lambda c, full: [{}]},
+    'overview_state': {'build': build_overview_state, 'filters': lambda c, full: [{}]},
+    'overview_district': {'build': build_overview_district, 'filters': lambda c, full: [{}]},
+    'overview_user_map': {'build': build_overview_user_map, 'filters': lambda c, full: [{}]},
+    'transaction_type': {'build': build_transaction_type, 'filters': lambda c, full: _space(
+        state=_states(c, 'aggregated_transaction', full), year=_years(c, 'aggregated_transaction', full),
+        quarter=_quarters(c, 'aggregated_transaction', full))},
+    'transaction_hotspots': {'build': build_transaction_hotspots, 'preview': preview_transaction_hotspots, 'filters': lambda c, full: _space(
+        year=_years(c, 'aggregated_transaction', full), quarter=_quarters(c, 'aggregated_transaction', full), detail=MAP_DETAILS)},
+    'transaction_count_share': {'build': build_transaction_count_share, 'filters': lambda c, full: _space(
+        state=_states(c, 'aggregated_transaction', full), year=_years(c, 'aggregated_transaction', full),
+        quarter=_quarters(c, 'aggregated_transaction', full))},
+    'brand_share': {'build': build_brand_share, 'filters': lambda c, full: _space(
+        state=_states(c, 'aggregated_user', full, with_all=True), year=_years(c, 'aggregated_user', full),
+        quarter=_quarters(c, 'aggregated_user', full))},
+    'user_hotspots': {'build': build_user_hotspots, 'preview': preview_user_hotspots, 'filters': lambda c, full: _space(
+        state=_states(c, 'aggregated_user', full, with_all=True), year=_years(c, 'aggregated_user', full),
+        quarter=_quarters(c, 'aggregated_user', full), detail=MAP_DETAILS)},
+    'top_districts': {'build': build_top_districts, 'filters': lambda c, full: _space(
+        state=_states(c, 'aggregated_user', full, with_all=True), year=_years(c, 'aggregated_user', full))},
+    'app_opens_density': {'build': build_app_opens_density, 'filters': lambda c, full: _space(
+        year=_years(c, 'aggregated_user', full), quarter=_quarters(c, 'aggregated_user', full), detail=MAP_DETAILS)},
+    'anomaly_map': {'build': build_anomaly_map, 'filters': lambda c, full: _space(
+        metric=list(ANOMALY_METRICS), year=_years(c, 'map_transaction', full), quarter=_quarters(c, 'map_transaction', full))},
+    'metric_correlations': {'build': build_metric_correlations, 'filters': lambda c, full: _space(
+        state=_states(c, 'map_transaction', full, with_all=True), year=_years(c, 'map_transaction', full),
+        quarter=_quarters(c, 'map_transaction', full))},
+    'top_categories': {'build': build_top_categories, 'filters': lambda c, full: _space(
+        category=['States', 'Districts', 'Pincodes'], year=_years(c, 'map_transaction', full), quarter=_quarters(c, 'map_transaction', full))},
+    'region_year': {'build': build_region_year, 'filters': lambda c, full: [{}]},
+    'insurance_state': {'build': build_insurance_state, 'filters': lambda c, full: _space(
+        year=_years(c, 'aggregated_insurance', full), quarter=_quarters(c, 'aggregated_insurance', full), metric=['Count', 'Amount'])},
+    'insurance_map': {'build': build_insurance_map, 'filters': lambda c, full: _space(
+        year=_years(c, 'aggregated_insurance', full), quarter=_quarters(c, 'aggregated_insurance', full), metric=['Count', 'Amount'],
+        detail=MAP_DETAILS)},
+    'insurance_pincodes': {'build': build_insurance_pincodes, 'filters': lambda c, full: _space(
+        year=_years(c, 'aggregated_insurance', full), quarter=_quarters(c, 'aggregated_insurance', full), metric=['Count', 'Amount'])},
+}
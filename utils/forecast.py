@@ -0,0 +1,167 @@
+# utils/forecast.py
+"""Next-quarter forecasts for every district and state at once, fitted on log1p values of utils.timeseries matrices."""
+import warnings
+import itertools
+import numpy as np
+import pandas as pd
+
+from utils.timeseries import log_values
+
+FORECAST_TABLE = "forecasts"
+# Metric column: (table, label); the metrics 4_Trend projects
+FORECAST_METRICS = {
+    'Transaction_count': ('map_transaction', 'Transaction Count'),
+    'Transaction_amount': ('map_transaction', 'Transaction Amount'),
+    'RegisteredUsers': ('map_user', 'Registered Users'),
+    'AppOpens': ('map_user', 'App Opens'),
+}
+FORECAST_COLUMNS = ['Metric', 'Level', 'State', 'District', 'Year', 'Quarter', 'Forecast', 'Lower', 'Upper', 'Model']
+SEASON = 4 # Quarters per year
+MIN_QUARTERS = 8 # Two full seasons before an entity is forecast
+INTERVAL_Z = 1.2816 # 80% interval, from each entity's one-step log errors
+INTERVAL_QUARTERS = 2 * SEASON # Recent errors the interval is based on
+# Smoothing parameters searched per metric (level, trend, seasonal); the trend is damped by DAMPING
+PARAMETER_GRID = list(itertools.product((0.2, 0.4, 0.6, 0.8), (0.1, 0.3, 0.5), (0.1, 0.3, 0.5)))
+DAMPING = 0.95
+
+
+def _first_valid(values):
+    finite = np.isfinite(values)
+    return np.where(finite.any(axis=1), finite.argmax(axis=1), values.shape[1])
+
+
+def holt_winters(values, alpha, beta, gamma, phi=DAMPING):
+    """(log forecast, one-step log errors) of additive damped Holt-Winters, run for every row at once."""
+    y = log_values(values)
+    n, periods = y.shape
+    rows = np.arange(n)
+    start = _first_valid(y)
+    enough = np.isfinite(y).sum(axis=1) >= MIN_QUARTERS
+    init_cols = np.clip(start[:, None] + np.arange(2 * SEASON), 0, max(periods - 1, 0))
+    init = y[rows[:, None], init_cols] if periods else np.full((n, 2 * SEASON), np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # All-NaN rows (not enough quarters)
+        first, second = np.nanmean(init[:, :SEASON], axis=1), np.nanmean(init[:, SEASON:], axis=1)
+    level = first
+    trend = np.nan_to_num((second - first) / SEASON)
+    seasonal = np.zeros((n, SEASON))
+    seasonal[rows[:, None], init_cols[:, :SEASON] % SEASON] = np.nan_to_num(init[:, :SEASON] - first[:, None])
+    errors = np.full(y.shape, np.nan)
+    for t in range(periods):
+        active = enough & (t >= start + SEASON)
+        season = t % SEASON
+        predicted = level + phi * trend + seasonal[:, season]
+        observed = active & np.isfinite(y[:, t])
+        errors[observed, t] = y[observed, t] - predicted[observed]
+        target = np.where(observed, y[:, t], predicted) # Missing quarter: take the model's own value
+        new_level = alpha * (target - seasonal[:, season]) + (1 - alpha) * (level + phi * trend)
+        new_trend = beta * (new_level - level) + (1 - beta) * phi * trend
+        new_seasonal = gamma * (target - new_level) + (1 - gamma) * seasonal[:, season]
+        level = np.where(active, new_level, level)
+        trend = np.where(active, new_trend, trend)
+        seasonal[:, season] = np.where(active, new_seasonal, seasonal[:, season])
+    forecast = level + phi * trend + seasonal[:, periods % SEASON]
+    return np.where(enough, forecast, np.nan), errors
+
+
+def seasonal_naive_trend(values):
+    """(log forecast, one-step log errors) of y[t-4] + (y[t-1] - y[t-5]); NaN where a needed quarter is missing."""
+    y = log_values(values)
+    n, periods = y.shape
+    padded = np.hstack([np.full((n, SEASON + 1), np.nan), y])
+    # Column t of padded[:, SEASON + 1 + t] is y[t]; predictions for t = 0..periods (the last is the forecast)
+    predicted = padded[:, 1:periods + 2] + (padded[:, SEASON:] - padded[:, :periods + 1])
+    return predicted[:, -1], y - predicted[:, :-1]
+
+
+MODELS = {'holt_winters': holt_winters, 'seasonal_naive_trend': seasonal_naive_trend}
+
+
+def fit_parameters(values):
+    """(alpha, beta, gamma) from PARAMETER_GRID with the lowest mean absolute one-step log error over all rows."""
+    best, best_error = PARAMETER_GRID[0], np.inf
+    for params in PARAMETER_GRID:
+        _, errors = holt_winters(values, *params)
+        error = np.nanmean(np.abs(errors)) if np.isfinite(errors).any() else np.inf
+        if error < best_error:
+            best, best_error = params, error
+    return best
+
+
+def _run(values, model, params):
+    return holt_winters(values, *params) if model == 'holt_winters' else MODELS[model](values)
+
+
+def forecast_next(values, model='holt_winters', params=None):
+    """(forecast, lower, upper) for the quarter after the last column, with an 80% interval from recent errors."""
+    if model == 'holt_winters':
+        params = params or fit_parameters(values)
+    log_forecast, errors = _run(values, model, params)
+    recent = errors[:, -INTERVAL_QUARTERS:]
+    counts = np.isfinite(recent).sum(axis=1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning) # Rows without errors
+        spread = np.sqrt(np.nanmean(recent ** 2, axis=1)) if recent.size else np.full(len(values), np.nan)
+    fallback = np.nanmedian(spread[counts >= SEASON]) if (counts >= SEASON).any() else np.nan
+    spread = np.where(counts >= SEASON, spread, fallback)
+    to_units = lambda x: np.clip(np.expm1(x), 0, None)
+    return to_units(log_forecast), to_units(log_forecast - INTERVAL_Z * spread), to_units(log_forecast + INTERVAL_Z * spread)
+
+
+def absolute_errors(forecast, actual):
+    """Absolute percentage errors where both sides are known and the actual is positive."""
+    keep = np.isfinite(forecast) & np.isfinite(actual) & (actual > 0)
+    return np.abs(forecast[keep] - actual[keep]) / actual[keep]
+
+
+def select_model(values):
+    """(model, params): the model in MODELS with the lowest median error over the last SEASON held-out quarters."""
+    params = fit_parameters(values)
+    best, best_error = 'holt_winters', np.inf
+    for model in MODELS:
+        errors = [absolute_errors(forecast_next(values[:, :-k], model, params)[0], values[:, -k])
+                  for k in range(1, min(SEASON, values.shape[1] - MIN_QUARTERS) + 1)]
+        errors = np.concatenate(errors) if errors else np.array([])
+        error = np.median(errors) if errors.size else np.inf
+        if error < best_error:
+            best, best_error = model, error
+    return best, params
+
+
+def next_period(periods):
+    year, quarter = periods[-1]
+    return (year + 1, 1) if quarter == SEASON else (year, quarter + 1)
+
+
+def forecast_query(state, district=None):
+    """Stored forecasts of every metric for one state (district=None) or one district."""
+    level, district = ('State', '') if district is None else ('District', district)
+    quote = lambda value: str(value).replace("'", "''")
+    return (f"SELECT Metric, Year, Quarter, Forecast, Lower, Upper, Model FROM {FORECAST_TABLE} "
+            f"WHERE Level = '{level}' AND State = '{quote(state)}' AND District = '{quote(district)}'")
+
+
+def build_forecast_rows(metric, matrices):
+    """FORECAST_COLUMNS rows for one metric from {'District': TrendMatrix, 'State': TrendMatrix}."""
+    parts = []
+    for level, matrix in matrices.items():
+        if not matrix.periods:
+            continue
+        model, params = select_model(matrix.values)
+        hw_label = "holt_winters(a={}, b={}, g={}, phi={})".format(*params, DAMPING)
+        forecast, lower, upper = forecast_next(matrix.values, model, params)
+        labels = np.full(len(forecast), hw_label if model == 'holt_winters' else model, dtype=object)
+        if model != 'holt_winters':
+            fallback = forecast_next(matrix.values, 'holt_winters', params)
+            missing = ~np.isfinite(forecast)
+            forecast, lower, upper = (np.where(missing, hw, chosen) for hw, chosen in zip(fallback, (forecast, lower, upper)))
+            labels[missing] = hw_label
+        year, quarter = next_period(matrix.periods)
+        part = matrix.entities.copy()
+        if 'District' not in part.columns:
+            part['District'] = ''
+        part = part.assign(Metric=metric, Level=level, Year=year, Quarter=quarter, Forecast=forecast, Lower=lower, Upper=upper, Model=labels)
+        parts.append(part[np.isfinite(forecast) & np.isfinite(matrix.values[:, -1])])
+    if not parts:
+        return pd.DataFrame(columns=FORECAST_COLUMNS)
+    return pd.concat(parts, ignore_index=True)[FORECAST_COLUMNS]
@@ -0,0 +1,59 @@
+# utils/frames.py
+import decimal
+import threading
+import pandas as pd
+
+# --- Column groups ---
+# Low-cardinality text columns become categoricals that share one dtype (and one categories index) per column name.
+CATEGORY_COLUMNS = ('State', 'District', 'Transaction_type', 'Brand', 'Name', 'Region')
+SMALL_INT_COLUMNS = {'Year': 'int16', 'Quarter': 'int8'}
+STRING_COLUMNS = ('Pincode',)
+PINCODE_DTYPE = "string[pyarrow]"
+
+_shared_dtypes = {}
+_shared_dtypes_lock = threading.Lock()
+
+
+def shared_category_dtype(column, values):
+    """Returns the shared CategoricalDtype for a column, widening it if new values appear."""
+    with _shared_dtypes_lock:
+        dtype = _shared_dtypes.get(column)
+        new_values = pd.Index(values).dropna().unique()
+        if dtype is not None and new_values.isin(dtype.categories).all():
+            return dtype
+        known = dtype.categories if dtype is not None else pd.Index([])
+        dtype = pd.CategoricalDtype(known.union(new_values).sort_values())
+        _shared_dtypes[column] = dtype
+        return dtype
+
+
+def _holds_decimals(series):
+    """True if an object column holds decimal.Decimal values (MySQL DECIMAL and SUM() results)."""
+    first = series.dropna().head(1)
+    return not first.empty and isinstance(first.iloc[0], decimal.Decimal)
+
+
+def optimize_dtypes(df):
+    """Converts a query result to compact dtypes (categoricals, small ints, floats) in place and returns it."""
+    if df is None or df.empty:
+        return df
+    for col in df.columns:
+        series = df[col]
+        if col in CATEGORY_COLUMNS and not isinstance(series.dtype, pd.CategoricalDtype):
+            df[col] = series.astype(shared_category_dtype(col, series))
+        elif col in STRING_COLUMNS:
+            df[col] = series.astype(PINCODE_DTYPE) # Missing pincodes stay <NA>, not the text "None"
+        elif col in SMALL_INT_COLUMNS and pd.api.types.is_integer_dtype(series):
+            df[col] = series.astype(SMALL_INT_COLUMNS[col])
+        elif series.dtype == object and _holds_decimals(series):
+            df[col] = pd.to_numeric(series, errors='coerce')
+        elif pd.api.types.is_integer_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            df[col] = pd.to_numeric(series, downcast='integer')
+    return df
+
+
+def frame_memory(df):
+    """Deep memory footprint of a DataFrame in bytes (categories are counted once per frame)."""
+    if df is None:
+        return 0
+    return int(df.memory_usage(index=True, deep=True).sum())
@@ -0,0 +1,196 @@
+# utils/geo.py
+import os
+import json
+import numpy as np
+import pandas as pd
+
+COORDS_FILE = "district_coords.csv"
+GEOJSON_FILE = "india_states.geojson"
+STATIC_DIR = "static" # Served by Streamlit at STATIC_URL (server.enableStaticServing in .streamlit/config.toml)
+STATIC_URL = "app/static"
+DISTRICT_COLUMN = 'District Name' # Column name in district_coords.csv
+
+# --- Simplified state boundaries ---
+# resolution: (simplification tolerance in degrees, decimals kept per coordinate)
+GEOJSON_RESOLUTIONS = {
+    'high': (0.002, 4),
+    'medium': (0.01, 3),
+    'low': (0.03, 2),
+}
+GEOJSON_PROPERTIES = ('st_nm',) # The only property the charts use (featureidkey='properties.st_nm')
+
+
+def read_geojson(file_path=GEOJSON_FILE):
+    """Reads a GeoJSON file, or returns None if it does not exist."""
+    try:
+        with open(file_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def geojson_path(resolution):
+    """File written by write_simplified_geojson for a resolution, e.g. static/india_states.low.geojson."""
+    base, ext = os.path.splitext(os.path.basename(GEOJSON_FILE))
+    return os.path.join(STATIC_DIR, f"{base}.{resolution}{ext}")
+
+
+def geojson_url(resolution):
+    """URL the browser fetches a simplified boundary file from (relative to the app)."""
+    return f"{STATIC_URL}/{os.path.basename(geojson_path(resolution))}"
+
+
+def resolution_for(height):
+    """Coarsest boundary resolution that still looks right on a chart of this height (pixels)."""
+    if height <= 450:
+        return 'low'
+    if height <= 700:
+        return 'medium'
+    return 'high'
+
+
+def state_boundaries_file(resolution):
+    """The simplified file for a resolution, or the full-resolution source if it has not been built."""
+    path = geojson_path(resolution)
+    return path if os.path.exists(path) else GEOJSON_FILE
+
+
+def _polygons(geometry):
+    """Polygon and MultiPolygon coordinates as a list of polygons (each a list of rings)."""
+    if not geometry:
+        return []
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    return []
+
+
+def _quantize_ring(ring, decimals):
+    """Rounds a ring's coordinates and returns it open (no repeated closing point), without repeated points."""
+    points = []
+    for x, y in (coord[:2] for coord in ring):
+        point = (round(x, decimals), round(y, decimals))
+        if not points or points[-1] != point:
+            points.append(point)
+    if len(points) > 1 and points[0] == points[-1]:
+        points.pop()
+    return points
+
+
+def _douglas_peucker(points, tolerance):
+    """Douglas-Peucker on a list of (x, y); the endpoints are always kept."""
+    coords = np.asarray(points, dtype=float)
+    keep = np.zeros(len(coords), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(coords) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        a, b = coords[start], coords[end]
+        inner = coords[start + 1:end]
+        dx, dy = b - a
+        length = np.hypot(dx, dy)
+        if length == 0: # Closed chain: distance to the shared endpoint
+            dist = np.hypot(inner[:, 0] - a[0], inner[:, 1] - a[1])
+        else:
+            dist = np.abs(dx * (inner[:, 1] - a[1]) - dy * (inner[:, 0] - a[0])) / length
+        i = int(np.argmax(dist))
+        if dist[i] > tolerance:
+            split = start + 1 + i
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+    return [points[i] for i in np.flatnonzero(keep)]
+
+
+def _edge(p, q):
+    return (p, q) if p <= q else (q, p)
+
+
+def simplify_geojson(geojson, tolerance, decimals, properties=GEOJSON_PROPERTIES):
+    """Simplifies polygon boundaries arc by arc, so borders shared by neighbouring features stay identical."""
+    features = []
+    for feature in geojson.get('features', []):
+        rings = [[_quantize_ring(ring, decimals) for ring in polygon] for polygon in _polygons(feature.get('geometry'))]
+        features.append((feature, rings))
+
+    # Which rings use each edge
+    edge_owners = {}
+    ring_id = 0
+    for _, polygons in features:
+        for polygon in polygons:
+            for ring in polygon:
+                for i in range(len(ring)):
+                    edge_owners.setdefault(_edge(ring[i - 1], ring[i]), set()).add(ring_id)
+                ring_id += 1
+
+    simplified_arcs = {}
+
+    def simplify_arc(arc):
+        key = tuple(arc)
+        reverse = key[::-1]
+        canonical = min(key, reverse) # Both sides of a border simplify the same vertex sequence
+        if canonical not in simplified_arcs:
+            simplified_arcs[canonical] = _douglas_peucker(list(canonical), tolerance)
+        result = simplified_arcs[canonical]
+        return result if canonical == key else result[::-1]
+
+    def simplify_ring(ring):
+        n = len(ring)
+        if n < 3:
+            return None
+        owners = [edge_owners[_edge(ring[i - 1], ring[i])] for i in range(n)] # owners[i]: edge ending at point i
+        junctions = [i for i in range(n) if owners[i] != owners[(i + 1) % n]]
+        if not junctions:
+            # Whole ring shares one set of owners (an island or an enclave): start it at a canonical point
+            start = ring.index(min(ring))
+            points = simplify_arc(ring[start:] + ring[:start + 1])
+        else:
+            points = []
+            for k, start in enumerate(junctions):
+                end = junctions[(k + 1) % len(junctions)]
+                arc = ring[start:end + 1] if end > start else ring[start:] + ring[:end + 1]
+                for point in simplify_arc(arc)[:-1]:
+                    if not points or points[-1] != point: # An arc can collapse onto its junction
+                        points.append(point)
+            points.append(points[0])
+        if len(set(points)) < 3:
+            return None
+        if points[0] != points[-1]:
+            points.append(points[0])
+        return [list(point) for point in points]
+
+    output = []
+    for feature, polygons in features:
+        new_polygons = []
+        for polygon in polygons:
+            exterior = simplify_ring(polygon[0]) if polygon else None
+            if exterior is None:
+                continue # Slivers and islands smaller than the tolerance disappear
+            holes = [hole for hole in (simplify_ring(ring) for ring in polygon[1:]) if hole is not None]
+            new_polygons.append([exterior] + holes)
+        if not new_polygons and polygons:
+            # Never drop a whole feature: keep its largest exterior, quantized but not simplified
+            largest = max((polygon[0] for polygon in polygons if polygon), key=len)
+            new_polygons = [[[list(point) for point in largest + largest[:1]]]]
+        geometry = ({'type': 'Polygon', 'coordinates': new_polygons[0]} if len(new_polygons) == 1
+                    else {'type': 'MultiPolygon', 'coordinates': new_polygons})
+        kept = {key: value for key, value in (feature.get('properties') or {}).items() if key in properties}
+        output.append({'type': 'Feature', 'properties': kept, 'geometry': geometry})
+    return {'type': 'FeatureCollection', 'features': output}
+
+
+def write_simplified_geojson(source=GEOJSON_FILE):
+    """Writes one simplified copy of the state boundaries per resolution; returns {resolution: bytes written}."""
+    geojson = read_geojson(source)
+    if geojson is None:
+        raise FileNotFoundError(f"GeoJSON file '{source}' not found.")
+    os.makedirs(STATIC_DIR, exist_ok=True)
+    sizes = {}
+    for resolution, (tolerance, decimals) in GEOJSON_RESOLUTIONS.items():
+        text = json.dumps(simplify_geojson(geojson, tolerance, decimals), separators=(',', ':'))
+        with open(geojson_path(resolution), 'w') as f:
+            f.write(text)
+        sizes[resolution] = len(text)
+    return sizes
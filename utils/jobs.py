@@ -0,0 +1,134 @@
+# utils/jobs.py
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import streamlit as st
+
+# Job type: jobs of that type allowed to run at once; the rest wait in line
+JOB_LIMITS = {
+    'export': 2, # Full-table exports
+    'profile': 1, # On-demand profile reports (ydata-profiling is CPU and memory heavy)
+    'load': 2, # Cold full-table loads
+    'figure': 2, # Exact figures refined behind an approximate preview (utils.figure_cache)
+}
+MAX_WORKERS = sum(JOB_LIMITS.values()) # A thread for every job counted as running, so none waits in the pool queue
+MAX_WAITING = 8 # Jobs of one type allowed to wait; beyond that new jobs are turned away
+RESULT_TTL = 3600 # Seconds a finished job (and its result) is handed to later requests, like st.cache_data(ttl=3600)
+POLL_SECONDS = 1.0 # How often a page re-checks a running job
+
+
+class JobRejected(RuntimeError):
+    """Raised when a job type already has MAX_WAITING jobs waiting."""
+
+
+class Job:
+    """One background job; its state is read by every session that submitted the same key."""
+
+    def __init__(self, kind, key, func, args):
+        self.kind = kind
+        self.key = key
+        self.func = func
+        self.args = args
+        self.status = 'waiting' # waiting -> running -> done | failed
+        self.progress = 0.0
+        self.message = "Waiting for a free worker..."
+        self.result = None
+        self.error = None
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in ('done', 'failed')
+
+    def report(self, progress, message=None):
+        """Called by the job function: progress in [0, 1] and an optional status line."""
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        if message is not None:
+            self.message = message
+
+
+class JobRunner:
+    """Bounded thread pool with a concurrency limit per job type and de-duplication of identical jobs."""
+
+    def __init__(self, max_workers=MAX_WORKERS, limits=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._limits = dict(limits or JOB_LIMITS)
+        self._running = {kind: 0 for kind in self._limits}
+        self._waiting = {kind: deque() for kind in self._limits}
+        self._jobs = {} # (kind, key) -> Job, in flight or finished within RESULT_TTL
+        self._lock = threading.Lock()
+
+    def submit(self, kind, key, func, *args):
+        """The job for (kind, key): the one in flight or finished within RESULT_TTL, else a new func(job, *args)."""
+        if kind not in self._limits:
+            raise ValueError(f"Unknown job type '{kind}'.")
+        with self._lock:
+            self._expire()
+            job = self._jobs.get((kind, key))
+            if job is not None and job.status != 'failed':
+                return job
+            if self._running[kind] >= self._limits[kind] and len(self._waiting[kind]) >= MAX_WAITING:
+                raise JobRejected(f"Too many {kind} jobs are queued right now. Please try again shortly.")
+            job = Job(kind, key, func, args)
+            self._jobs[(kind, key)] = job
+            if self._running[kind] < self._limits[kind]:
+                self._start(job)
+            else:
+                self._waiting[kind].append(job)
+        return job
+
+    def _start(self, job):
+        # Called with self._lock held
+        self._running[job.kind] += 1
+        job.status = 'running'
+        job.message = "Starting..."
+        self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        try:
+            job.result = job.func(job, *job.args)
+            job.progress = 1.0
+            job.status = 'done'
+        except Exception as err:
+            job.error = err
+            job.status = 'failed'
+        finally:
+            job.finished_at = time.monotonic()
+            job.func = job.args = None # Release the inputs; only the result is handed on
+            with self._lock:
+                self._running[job.kind] -= 1
+                if self._waiting[job.kind]:
+                    self._start(self._waiting[job.kind].popleft())
+
+    def _expire(self):
+        # Called with self._lock held
+        now = time.monotonic()
+        for job_key in [k for k, job in self._jobs.items() if job.finished and now - job.finished_at > RESULT_TTL]:
+            del self._jobs[job_key]
+
+    def stats(self):
+        """{job type: (running, waiting)}"""
+        with self._lock:
+            return {kind: (self._running[kind], len(self._waiting[kind])) for kind in self._limits}
+
+
+@st.cache_resource
+def get_job_runner():
+    """The process-wide job runner, shared by all sessions (so identical jobs are de-duplicated)."""
+    return JobRunner()
+
+
+def submit_job(kind, key, func, *args):
+    """Submits func(job, *args) as a background job of the given type (see JobRunner.submit)."""
+    return get_job_runner().submit(kind, key, func, *args)
+
+
+def show_job_progress(job, label):
+    """Progress bar for an unfinished job, re-checked every POLL_SECONDS; reruns the page once it finishes."""
+    @st.fragment(run_every=POLL_SECONDS)
+    def _poll():
+        if job.finished:
+            st.rerun()
+        st.progress(job.progress, text=f"{label} {job.message}")
+    _poll()
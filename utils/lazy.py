@@ -0,0 +1,45 @@
+# utils/lazy.py
+import importlib
+import threading
+import streamlit as st
+
+
+def lazy_tabs(labels, key):
+    """Tabs that track which one is open, so callers can skip the work of closed tabs (check tab.open)."""
+    return st.tabs(labels, key=key, on_change="rerun")
+
+
+def lazy_expander(label, key, render, *args, **kwargs):
+    """Expander whose body (render(*args, **kwargs)) only runs while it is open."""
+    expander = st.expander(label, key=key, on_change="rerun")
+    if expander.open:
+        with expander:
+            render(*args, **kwargs)
+    return expander
+
+
+class LazyModule:
+    """Stands in for a module and imports it on first attribute access."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    """`alt = lazy_module('altair')` in place of `import altair as alt`."""
+    return LazyModule(name)
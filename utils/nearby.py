@@ -0,0 +1,81 @@
+# utils/nearby.py
+"""Nearest districts by great-circle distance, from a KD-tree of unit vectors built once per data version."""
+import numpy as np
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.db import run_query
+from utils.lazy import lazy_module
+
+# Imported when the index is first built (scipy.spatial takes ~0.3 s to import)
+spatial = lazy_module('scipy.spatial')
+
+EARTH_RADIUS_KM = 6371.0
+NEIGHBOURS = 5 # Default number of nearby districts compared
+MAX_NEIGHBOURS = 10
+DISTRICT_POINTS_QUERY = ("SELECT State, District, MAX(lat) as lat, MAX(lon) as lon FROM map_transaction "
+                         "WHERE lat IS NOT NULL AND lon IS NOT NULL GROUP BY State, District")
+
+
+def unit_vectors(lat, lon):
+    """(n, 3) points on the unit sphere for latitudes and longitudes in degrees."""
+    lat, lon = np.radians(np.asarray(lat, dtype=float)), np.radians(np.asarray(lon, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+
+def chord_to_km(chord):
+    """Great-circle (haversine) distance in km for a chord length on the unit sphere."""
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2, 0, 1))
+
+
+class DistrictIndex:
+    """KD-tree over the districts with coordinates; districts are keyed by (State, District) as in the Pulse data."""
+
+    def __init__(self, points):
+        self.points = points.dropna(subset=['lat', 'lon']).astype({'State': str, 'District': str}).reset_index(drop=True)
+        self.tree = spatial.cKDTree(unit_vectors(self.points['lat'], self.points['lon'])) if len(self.points) else None
+        self._rows = {key: i for i, key in enumerate(zip(self.points['State'], self.points['District']))}
+
+    def nearest(self, state, district, k=NEIGHBOURS):
+        """The k districts closest to one district, nearest first, with Distance_km (empty without coordinates)."""
+        row = self._rows.get((str(state), str(district)))
+        if row is None or self.tree is None:
+            return pd.DataFrame(columns=['State', 'District', 'Distance_km'])
+        chords, rows = self.tree.query(self.tree.data[row], k=min(2 * k + 1, len(self.points)))
+        chords, rows = np.atleast_1d(chords), np.atleast_1d(rows)
+        keep = (chords > 0) & np.isfinite(chords) # Drops the district and its other spellings (same coordinates)
+        chords, rows = chords[keep], rows[keep]
+        _, first = np.unique(self.tree.data[rows], axis=0, return_index=True) # One spelling per neighbour
+        first = np.sort(first)[:k]
+        nearest = self.points.iloc[rows[first]][['State', 'District']].reset_index(drop=True)
+        nearest['Distance_km'] = chord_to_km(chords[first])
+        return nearest
+
+
+def nearby_series(matrix, state, district, neighbours):
+    """Long frame (Period, Series, Value, Distance_km) of a district, its neighbours and its state's average district."""
+    keys = [(state, district, 0.0)] + list(neighbours[['State', 'District', 'Distance_km']].itertuples(index=False, name=None))
+    lines = [(d if s == state else f"{d}, {s}", km, matrix.values[matrix.row(s, d)]) for s, d, km in keys if matrix.row(s, d) is not None]
+    in_state = matrix.values[matrix.entities['State'].to_numpy() == str(state)]
+    if len(in_state):
+        counts = np.isfinite(in_state).sum(axis=0)
+        lines.append((f"{state} average", np.nan, np.where(counts > 0, np.nansum(in_state, axis=0) / np.maximum(counts, 1), np.nan)))
+    if not lines:
+        return pd.DataFrame(columns=['Period', 'Series', 'Value', 'Distance_km'])
+    names, distances, values = zip(*lines)
+    periods = len(matrix.labels)
+    frame = pd.DataFrame({'Period': np.tile(matrix.labels, len(lines)), 'Series': np.repeat(names, periods),
+                          'Value': np.concatenate(values), 'Distance_km': np.repeat(distances, periods)})
+    return frame.dropna(subset=['Value']).reset_index(drop=True)
+
+
+@st.cache_resource(ttl=3600, show_spinner="Indexing district locations...", max_entries=2)
+def load_district_index(data_version):
+    """DistrictIndex of every resolved district, built once per process and data version."""
+    try:
+        points = run_query(DISTRICT_POINTS_QUERY)
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
+        st.error(f"Database Error: {err}")
+        points = pd.DataFrame(columns=['State', 'District', 'lat', 'lon'])
+    return DistrictIndex(points)
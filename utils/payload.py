@@ -0,0 +1,160 @@
+# utils/payload.py
+import os
+import re
+import json
+import base64
+import numpy as np
+from plotly.utils import PlotlyJSONEncoder
+
+from utils.geo import geojson_path, geojson_url
+
+COORD_KEYS = ('lat', 'lon')
+COORD_DECIMALS = 4 # ~10 m, finer than any district marker
+MIN_DECIMALS = 2 # Amounts are shown with at most 2 decimals
+SIGNIFICANT_DIGITS = 4 # Kept for values below 1 (shares, percentages)
+_CUSTOMDATA_REF = re.compile(r'customdata\[(\d+)\]')
+_CUSTOMDATA_PLAIN_REF = re.compile(r'%\{customdata\[(\d+)\]\}')
+_UNROUNDED_KEYS = ('geojson',) # Inline boundaries were simplified by utils.geo already
+
+
+def shared_assets(resources):
+    """{static URL: data} for the boundary files in resources that the browser can fetch itself."""
+    return {geojson_url(resolution): data for resolution, data in (resources.get('geojson') or {}).items()
+            if data is not None and os.path.exists(geojson_path(resolution))}
+
+
+def _decimals(values):
+    largest = np.nanmax(np.abs(values)) if values.size else 0
+    if not np.isfinite(largest) or largest == 0:
+        return MIN_DECIMALS
+    return int(np.clip(SIGNIFICANT_DIGITS - 1 - np.floor(np.log10(largest)), MIN_DECIMALS, 6))
+
+
+def _numeric(value):
+    """A numeric array for a list of numbers or a typed array (plotly >= 6 to_json), else None."""
+    if isinstance(value, dict) and 'bdata' in value:
+        array = np.frombuffer(base64.b64decode(value['bdata']), dtype=value['dtype'])
+        return array.reshape([int(n) for n in value['shape'].split(',')]) if 'shape' in value else array
+    if isinstance(value, list) and value and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value):
+        return np.asarray(value, dtype=float)
+    return None
+
+
+def _encode(array):
+    """Rounded array as a plain list, whole numbers as ints (12 rather than 12.0)."""
+    if np.isfinite(array).all() and np.array_equal(array, np.round(array)):
+        return array.astype(np.int64).tolist()
+    return array.tolist()
+
+
+def _slim_array(array, key):
+    if array.dtype.kind not in 'fiu':
+        return array.tolist()
+    if array.dtype.kind == 'f':
+        array = np.round(array, COORD_DECIMALS if key in COORD_KEYS else _decimals(array))
+    return _encode(array)
+
+
+def _round_rows(rows):
+    """Rounds the numeric columns of row-major data mixing strings and numbers (px customdata)."""
+    columns = list(zip(*rows))
+    for j, column in enumerate(columns):
+        array = _numeric(list(column))
+        if array is not None:
+            array = np.round(array, _decimals(array))
+            if np.isfinite(array).all() and np.array_equal(array, np.round(array)):
+                array = array.astype(np.int64) # 12 rather than 12.0
+            columns[j] = array.tolist()
+    return [list(row) for row in zip(*columns)]
+
+
+def _round_arrays(node, key=None):
+    """Rounds every numeric array in a trace to display precision (coordinates to COORD_DECIMALS)."""
+    if isinstance(node, dict):
+        if 'bdata' in node:
+            return _slim_array(_numeric(node), key)
+        return {k: v if k in _UNROUNDED_KEYS else _round_arrays(v, k) for k, v in node.items()}
+    if not isinstance(node, list) or len(node) < 2:
+        return node
+    array = _numeric(node)
+    if array is not None:
+        return _slim_array(array, key)
+    if all(isinstance(row, list) for row in node) and len({len(row) for row in node}) == 1:
+        rows = [_numeric(row) for row in node]
+        if all(row is not None for row in rows):
+            return _slim_array(np.vstack(rows), key)
+        return _round_rows(node)
+    return node
+
+
+def _constant_columns(customdata, width):
+    """{column: value} for customdata columns holding one value on every row (e.g. Quarter='All')."""
+    if isinstance(customdata, dict) or not customdata or not isinstance(customdata[0], list):
+        return {}
+    first = customdata[0]
+    return {i: first[i] for i in range(width)
+            if isinstance(first[i], (str, int)) and all(row[i] == first[i] for row in customdata)}
+
+
+def _drop_unused_customdata(trace):
+    """Drops customdata columns the hovertemplate never shows and inlines the constant ones."""
+    template = trace.get('hovertemplate')
+    customdata = trace.get('customdata')
+    if not isinstance(template, str) or customdata is None:
+        return trace
+    if isinstance(customdata, dict): # Typed 2-D array from plotly >= 6
+        columns = _numeric(customdata)
+        width = columns.shape[1] if columns.ndim > 1 else 1
+    else:
+        width = len(customdata[0]) if customdata and isinstance(customdata[0], list) else 1
+    constants = _constant_columns(customdata, width)
+    # Only unformatted references are inlined; '%{customdata[1]:,}' keeps its column
+    template = _CUSTOMDATA_PLAIN_REF.sub(lambda m: str(constants[int(m.group(1))]) if int(m.group(1)) in constants else m.group(0), template)
+    used = sorted({int(i) for i in _CUSTOMDATA_REF.findall(template)})
+    trace['hovertemplate'] = template
+    if len(used) == width:
+        return trace
+    if not used:
+        trace.pop('customdata')
+        return trace
+    if isinstance(customdata, dict):
+        trace['customdata'] = _encode(columns[:, used])
+    else:
+        trace['customdata'] = [[row[i] for i in used] for row in customdata]
+    renumber = {old: new for new, old in enumerate(used)}
+    trace['hovertemplate'] = _CUSTOMDATA_REF.sub(lambda m: f"customdata[{renumber[int(m.group(1))]}]", template)
+    return trace
+
+
+def _link_assets(spec, assets):
+    """Replaces inline GeoJSON equal to a shared asset with its URL, so it is not sent with every figure."""
+    urls = {json.dumps(data, sort_keys=True): url for url, data in assets.items()}
+    def link(value):
+        return urls.get(json.dumps(value, sort_keys=True), value) if isinstance(value, dict) else value
+    for trace in spec.get('data', []):
+        if 'geojson' in trace:
+            trace['geojson'] = link(trace['geojson'])
+    for layer in spec.get('layout', {}).get('mapbox', {}).get('layers', []):
+        if 'source' in layer:
+            layer['source'] = link(layer['source'])
+    return spec
+
+
+def slim_figure(figure, assets=None):
+    """Plotly figure (object, dict or JSON) reduced for the browser; returns the figure dict."""
+    if isinstance(figure, str):
+        spec = json.loads(figure)
+    elif isinstance(figure, dict):
+        spec = json.loads(json.dumps(figure, cls=PlotlyJSONEncoder))
+    else:
+        spec = json.loads(figure.to_json())
+    if assets:
+        spec = _link_assets(spec, assets)
+    spec['data'] = [_round_arrays(_drop_unused_customdata(trace)) for trace in spec.get('data', [])]
+    return spec
+
+
+def slim_figure_json(figure, assets=None):
+    """(slimmed figure JSON, bytes of the figure's plain to_json) for storing and reporting."""
+    raw = figure if isinstance(figure, str) else figure.to_json()
+    return json.dumps(slim_figure(raw, assets), separators=(',', ':')), len(raw)
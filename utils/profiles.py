@@ -0,0 +1,91 @@
+# utils/profiles.py
+import hashlib
+from datetime import datetime, timezone
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.catalog import DATASET_FIELDS
+from utils.db import get_connection, run_query
+from utils.frames import optimize_dtypes
+
+PROFILE_TABLE = "dataset_profiles"
+PROFILED_TABLES = tuple(DATASET_FIELDS)
+PROFILE_COLUMNS = ['Table_name', 'Table_version', 'Mode', 'Sample_rows', 'Total_rows', 'Generated_at', 'Html']
+PROFILE_MODES = ('full', 'minimal') # full: explorative report (correlations, interactions); minimal: per-column stats only
+ON_DEMAND_SAMPLE_ROWS = 10000 # Reports generated from the page are minimal and sampled, to keep the job short
+
+
+def table_version(df):
+    """Content hash of one table, so the ETL only re-profiles the tables that changed."""
+    return hashlib.sha1(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()[:16]
+
+
+def build_profile(table, df, title, mode='full', sample_rows=None):
+    """Profiles a table (or a sample_rows sample of it) with ydata-profiling; returns one PROFILE_COLUMNS row."""
+    from ydata_profiling import ProfileReport # Heavy import, only the ETL needs it
+
+    total_rows = len(df)
+    data = df.sample(n=sample_rows, random_state=0) if sample_rows and total_rows > sample_rows else df
+    title = f"{title} (sample of {len(data):,} / {total_rows:,} rows)" if len(data) < total_rows else title
+    if mode == 'minimal':
+        report = ProfileReport(data, title=title, minimal=True, progress_bar=False)
+    else:
+        report = ProfileReport(data, title=title, explorative=True, minimal=False, progress_bar=False)
+    return {
+        'Table_name': table,
+        'Table_version': table_version(df),
+        'Mode': mode,
+        'Sample_rows': len(data) if len(data) < total_rows else None,
+        'Total_rows': total_rows,
+        'Generated_at': datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S"),
+        'Html': report.to_html(),
+    }
+
+
+def profile_is_current(stored, df, mode, sample_rows):
+    """True if a stored profile row (dict or None) was built from this table content with these settings."""
+    if stored is None:
+        return False
+    stored_sample = stored.get('Sample_rows')
+    wanted_sample = sample_rows if sample_rows and len(df) > sample_rows else None
+    return (stored['Table_version'] == table_version(df) and stored['Mode'] == mode
+            and (None if pd.isna(stored_sample) else int(stored_sample)) == wanted_sample)
+
+
+def store_profile(cursor, row):
+    """Writes a build_profile row, replacing the table's previous report (caller commits)."""
+    cols = '`, `'.join(row)
+    cursor.execute(f"REPLACE INTO {PROFILE_TABLE} (`{cols}`) VALUES ({','.join(['%s'] * len(row))})", tuple(row.values()))
+
+
+# --- Streamlit side ---
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=len(PROFILED_TABLES))
+def load_profile(table, data_version):
+    """The stored profile row for a table (dict), or None; data_version only keys the cache."""
+    try:
+        df = run_query(f"SELECT Mode, Sample_rows, Total_rows, Generated_at, Html FROM {PROFILE_TABLE} WHERE Table_name = '{table}'")
+    except (mysql.connector.Error, pd.errors.DatabaseError):
+        return None
+    return df.iloc[0].to_dict() if not df.empty else None
+
+
+def profile_job(job, table, title):
+    """Background job (utils.jobs) that builds, stores and returns a minimal sampled report for a table."""
+    job.report(0.05, "Reading table...")
+    df = optimize_dtypes(run_query(f"SELECT * FROM {table}"))
+    if df.empty:
+        raise ValueError(f"No data in {table}.")
+    job.report(0.2, f"Profiling {len(df):,} rows...")
+    row = build_profile(table, df, title, 'minimal', ON_DEMAND_SAMPLE_ROWS)
+    job.report(0.9, "Saving report...")
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        store_profile(cursor, row)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+    return row # The page clears load_profile (Streamlit caches are not touched from job threads)
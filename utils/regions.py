@@ -0,0 +1,44 @@
+# utils/regions.py
+import pandas as pd
+
+STATE_TABLE = "state_regions" # Dimension table: one row per state spelling found in the Pulse data
+REGION_YEAR_TABLE = "region_year_transactions"
+UNKNOWN_REGION = 'Unknown'
+# Region: states and union territories, as named in the Pulse data
+REGION_STATES = {
+    'South': ['Andhra Pradesh', 'Karnataka', 'Kerala', 'Tamil Nadu', 'Telangana', 'Puducherry', 'Lakshadweep', 'Andaman & Nicobar Islands'],
+    'Central': ['Chhattisgarh', 'Madhya Pradesh', 'Uttar Pradesh', 'Uttarakhand'],
+    'West': ['Goa', 'Gujarat', 'Maharashtra', 'Dadra & Nagar Haveli & Daman & Diu'],
+    'North': ['Chandigarh', 'Delhi', 'Haryana', 'Himachal Pradesh', 'Jammu & Kashmir', 'Ladakh', 'Punjab', 'Rajasthan'],
+    'East': ['Bihar', 'Jharkhand', 'Odisha', 'West Bengal', 'Arunachal Pradesh', 'Assam', 'Manipur', 'Meghalaya', 'Mizoram', 'Nagaland', 'Sikkim', 'Tripura'],
+}
+STATE_ALIASES = {'Telengana': 'Telangana'} # Other spellings in the data: canonical name
+# Canonical name: name in the state boundary GeoJSON (properties.st_nm), where they differ
+BOUNDARY_NAMES = {
+    'Andaman & Nicobar Islands': 'Andaman & Nicobar',
+    'Dadra & Nagar Haveli & Daman & Diu': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Delhi': 'National Capital Territory of Delhi',
+}
+STATE_COLUMNS = ['State', 'Canonical_state', 'Region', 'Boundary_name']
+
+# Region x Year totals, joined to the dimension table in SQL (states missing from it count as UNKNOWN_REGION)
+REGION_YEAR_QUERY = (
+    f"SELECT COALESCE(s.Region, '{UNKNOWN_REGION}') AS Region, t.Year, "
+    f"SUM(t.Transaction_count) AS Transaction_count, SUM(t.Transaction_amount) AS Transaction_amount "
+    f"FROM aggregated_transaction t LEFT JOIN {STATE_TABLE} s ON s.State = t.State "
+    f"GROUP BY COALESCE(s.Region, '{UNKNOWN_REGION}'), t.Year"
+)
+
+
+def build_state_dimension(frames):
+    """Rows for STATE_TABLE: REGION_STATES, their aliases and any other state in the tables, as UNKNOWN_REGION."""
+    region_of = {state: region for region, states in REGION_STATES.items() for state in states}
+    spellings = set(region_of) | set(STATE_ALIASES)
+    for df in frames.values():
+        if 'State' in df.columns:
+            spellings.update(df['State'].dropna().astype(str).unique())
+    rows = []
+    for state in sorted(spellings):
+        canonical = STATE_ALIASES.get(state, state)
+        rows.append((state, canonical, region_of.get(canonical, UNKNOWN_REGION), BOUNDARY_NAMES.get(canonical, canonical)))
+    return pd.DataFrame(rows, columns=STATE_COLUMNS)
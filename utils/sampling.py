@@ -0,0 +1,133 @@
+# utils/sampling.py
+"""Stratified samples of the Pulse tables, for approximate first answers while the exact one is computed."""
+import numpy as np
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.catalog import DATASET_FIELDS
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+
+SAMPLE_SUFFIX = "_sample"
+STRATA_TABLE = "sample_strata"
+SAMPLED_TABLES = tuple(DATASET_FIELDS)
+STRATA = ['State', 'Year']
+STRATA_COLUMNS = ['Table_name', 'State', 'Year', 'Stratum_rows', 'Sample_rows']
+SAMPLE_FRACTION = 0.25 # Share of each stratum kept in the sample
+MIN_STRATUM_ROWS = 10 # Strata this small (or smaller) are kept whole
+SAMPLE_SEED = 0
+Z_95 = 1.96 # Normal quantile of the 95% bounds
+DIMENSIONS = ('Year', 'Quarter', 'District_id', 'lat', 'lon') # Numeric columns summarized by distinct values, not totals
+SUMMARY_COLUMNS = ['Column', 'Distinct', 'Mean', 'Mean_margin', 'Total', 'Total_margin']
+
+
+def sample_table(table):
+    return f"{table}{SAMPLE_SUFFIX}"
+
+
+def sample_sizes(stratum_rows):
+    """Rows sampled from strata of the given sizes."""
+    stratum_rows = np.asarray(stratum_rows, dtype=int)
+    return np.minimum(stratum_rows, np.maximum(np.ceil(SAMPLE_FRACTION * stratum_rows).astype(int), MIN_STRATUM_ROWS))
+
+
+def stratified_sample(df, seed=SAMPLE_SEED):
+    """(sample, strata): a simple random sample of each State x Year stratum of df, and the stratum sizes."""
+    if df.empty:
+        return df.iloc[:0], pd.DataFrame(columns=STRATA + ['Stratum_rows', 'Sample_rows'])
+    strata = df.groupby(STRATA, observed=True).size().rename('Stratum_rows').reset_index()
+    strata['Sample_rows'] = sample_sizes(strata['Stratum_rows'])
+    shuffled = df.iloc[np.random.default_rng(seed).permutation(len(df))]
+    rank = shuffled.groupby(STRATA, observed=True).cumcount().to_numpy()
+    wanted = shuffled[STRATA].merge(strata, on=STRATA, how='left')['Sample_rows'].to_numpy()
+    return shuffled[rank < wanted].sort_index(), strata
+
+
+def estimate_totals(rows, strata, keys, columns):
+    """Expanded total of each column per keys group, with its 95% margin ({column}_margin) and Sampled_rows."""
+    merged = rows.merge(strata[STRATA + ['Stratum_rows', 'Sample_rows']], on=STRATA)
+    values = np.nan_to_num(merged[columns].to_numpy(dtype=float))
+    stratum_keys = list(dict.fromkeys(keys + STRATA))
+    frame = merged[stratum_keys + ['Stratum_rows', 'Sample_rows']].copy()
+    frame[columns] = values
+    frame[[f'{c}_sq' for c in columns]] = values * values
+    frame['Sampled_rows'] = 1
+    per_stratum = frame.groupby(stratum_keys, observed=True).agg(
+        Stratum_rows=('Stratum_rows', 'first'), Sample_rows=('Sample_rows', 'first'), Sampled_rows=('Sampled_rows', 'sum'),
+        **{c: (c, 'sum') for c in columns}, **{f'{c}_sq': (f'{c}_sq', 'sum') for c in columns}).reset_index()
+    big_n, n = per_stratum['Stratum_rows'].to_numpy(dtype=float), per_stratum['Sample_rows'].to_numpy(dtype=float)
+    weight = big_n / n
+    parts = {'Sampled_rows': per_stratum['Sampled_rows'].to_numpy()}
+    for c in columns:
+        # Variance over the stratum's whole sample, the group's rows counting y and the others zero
+        s, ss = per_stratum[c].to_numpy(dtype=float), per_stratum[f'{c}_sq'].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(n > 1, big_n * big_n * (1 - n / big_n) / n * (ss - s * s / n) / (n - 1), 0.0)
+        parts[c] = weight * s
+        parts[f'{c}_var'] = np.clip(variance, 0, None)
+    estimates = pd.DataFrame(parts)
+    if keys:
+        estimates = pd.concat([per_stratum[keys], estimates], axis=1).groupby(keys, observed=True).sum().reset_index()
+    else:
+        estimates = estimates.sum().to_frame().T
+    for c in columns:
+        estimates[f'{c}_margin'] = Z_95 * np.sqrt(estimates.pop(f'{c}_var'))
+    return estimates
+
+
+def _measures(df):
+    return [c for c in df.columns if c not in DIMENSIONS and pd.api.types.is_numeric_dtype(df[c])]
+
+
+def column_summary(df):
+    """SUMMARY_COLUMNS of a whole table (exact, so margins are zero)."""
+    measures = _measures(df)
+    rows = []
+    for column in df.columns:
+        if column in measures:
+            values = pd.to_numeric(df[column], errors='coerce')
+            rows.append((column, np.nan, values.mean(), 0.0, values.sum(), 0.0))
+        else:
+            rows.append((column, df[column].nunique(), np.nan, np.nan, np.nan, np.nan))
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def estimated_summary(rows, strata):
+    """column_summary() estimated from a table's sample, with 95% margins."""
+    measures = _measures(rows)
+    total_rows = strata['Stratum_rows'].sum()
+    estimates = estimate_totals(rows, strata, [], measures).iloc[0] if measures and not rows.empty else None
+    summary = []
+    for column in rows.columns:
+        if column in measures and estimates is not None:
+            total, margin = estimates[column], estimates[f'{column}_margin']
+            summary.append((column, np.nan, total / total_rows, margin / total_rows, total, margin))
+        else:
+            summary.append((column, rows[column].nunique(), np.nan, np.nan, np.nan, np.nan))
+    return pd.DataFrame(summary, columns=SUMMARY_COLUMNS)
+
+
+# --- Streamlit side ---
+
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=len(SAMPLED_TABLES))
+def load_sample(table, data_version):
+    """(rows, strata) of a table's sample, or None if the ETL has not built it; data_version only keys the cache."""
+    try:
+        rows = optimize_dtypes(run_query(f"SELECT * FROM {sample_table(table)}"))
+        strata = run_query(f"SELECT State, Year, Stratum_rows, Sample_rows FROM {STRATA_TABLE} WHERE Table_name = '{table}'")
+    except (mysql.connector.Error, pd.errors.DatabaseError):
+        return None
+    if rows.empty or strata.empty:
+        return None
+    return rows, optimize_dtypes(strata)
+
+
+def summary_job(job, table):
+    """Background job (utils.jobs): the exact column_summary() of a whole table."""
+    job.report(0.1, "Reading table...")
+    df = optimize_dtypes(run_query(f"SELECT * FROM {table}"))
+    if df.empty:
+        raise ValueError(f"No data in {table}.")
+    job.report(0.8, f"Summarizing {len(df):,} rows...")
+    return column_summary(df), len(df)
@@ -0,0 +1,107 @@
+# utils/search.py
+"""Prefix search over every state, district and pincode in the filter catalog, with links to their views."""
+import re
+from bisect import bisect_left
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.catalog import load_catalog
+from utils.districts import normalize_name
+
+RESULTS = 8 # Matches listed per search
+KIND_ORDER = ('State', 'District', 'Pincode') # Ranking of matches: states first, pincodes last
+# Kind: (catalog dataset(s) the entities come from, [(page, link label)])
+SEARCH_SOURCES = {
+    'State': (['aggregated_transaction'], [('pages/4_Trend.py', 'Trend and projections'),
+                                           ('pages/2_Transactions.py', 'Breakdown by transaction type')]),
+    'District': (['map_transaction'], [('pages/4_Trend.py', 'Trend, projections and nearby districts')]),
+    'Pincode': (['top_transaction', 'top_user', 'top_insurance'], [('pages/4_Trend.py', 'Pincode trend')]),
+}
+SEARCH_PARAMS = ('state', 'district', 'pincode')
+
+
+def _word_starts(name):
+    """Normalized keys of a name from each of its words ('East Godavari' -> eastgodavari, godavari)."""
+    words = re.split(r'[\s\-/()]+', str(name).strip())
+    starts = [i for i, word in enumerate(words) if word[:1].isalnum()] or [0] # Not from '&' ('and ...')
+    return list(dict.fromkeys(normalize_name(' '.join(words[i:])) for i in starts))
+
+
+class SearchIndex:
+    """Prefix index of entities (Kind, State, Name, Label); complete() returns the best matches of a prefix."""
+
+    def __init__(self, entities):
+        self.entities = entities.reset_index(drop=True)
+        entries = []
+        for i, (kind, name) in enumerate(zip(self.entities['Kind'], self.entities['Name'])):
+            for position, key in enumerate(_word_starts(name)):
+                # Lower priority is listed first: by kind, then whole-name matches before later words
+                entries.append((key, 2 * KIND_ORDER.index(kind) + (position > 0), i))
+        entries.sort()
+        self.keys = [key for key, _, _ in entries]
+        self.priority = np.array([priority for _, priority, _ in entries], dtype=int)
+        self.entity = np.array([i for _, _, i in entries], dtype=int)
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        parts = []
+        for kind, (datasets, _) in SEARCH_SOURCES.items():
+            if kind == 'State':
+                pairs = [(state, state) for dataset in datasets for state in catalog.options(dataset, 'State')]
+            else:
+                pairs = [pair for dataset in datasets for pair in catalog.scoped_pairs(dataset, kind)]
+            part = pd.DataFrame(sorted(set(pairs)), columns=['State', 'Name']).assign(Kind=kind)
+            part['Label'] = part['Name'] + (" (State)" if kind == 'State' else ", " + part['State'] + f" ({kind})")
+            parts.append(part)
+        return cls(pd.concat(parts, ignore_index=True)[['Kind', 'State', 'Name', 'Label']])
+
+    def complete(self, prefix, limit=RESULTS):
+        """Up to limit entities whose name (or a word of it) starts with prefix, best first."""
+        key = normalize_name(prefix)
+        if not key:
+            return self.entities.iloc[:0]
+        lo, hi = bisect_left(self.keys, key), bisect_left(self.keys, key + '{') # '{' sorts after every key character
+        priority, entity = self.priority[lo:hi], self.entity[lo:hi]
+        order = np.lexsort((entity, priority))
+        ranked = entity[order]
+        _, first = np.unique(ranked, return_index=True) # An entity can match on several words
+        return self.entities.iloc[ranked[np.sort(first)][:limit]]
+
+
+@st.cache_resource(ttl=3600, show_spinner=False)
+def load_search_index():
+    """SearchIndex of the filter catalog, built once per process."""
+    return SearchIndex.from_catalog(load_catalog())
+
+
+def link_params(entity):
+    """Query parameters that open a search result's views."""
+    if entity['Kind'] == 'State':
+        return {'state': entity['State']}
+    return {'state': entity['State'], entity['Kind'].lower(): entity['Name']}
+
+
+def entity_search():
+    """Sidebar search box: the best matches of the typed prefix, and links to the picked one's views."""
+    with st.sidebar:
+        query = st.text_input("Search states, districts, pincodes", key='entity_search', placeholder="e.g. Pune or 4110")
+        if not query or load_catalog().is_empty(): # Nothing to search (or the catalog could not be loaded)
+            return
+        matches = load_search_index().complete(query)
+        if matches.empty:
+            st.caption(f"No state, district or pincode starts with '{query}'.")
+            return
+        labels = matches['Label'].tolist()
+        picked = st.radio("Matches", labels, key='entity_search_pick', label_visibility='collapsed')
+        entity = matches.iloc[labels.index(picked) if picked in labels else 0]
+        for page, label in SEARCH_SOURCES[entity['Kind']][1]:
+            st.page_link(page, label=label, icon=":material/arrow_forward:", query_params=link_params(entity))
+
+
+def search_params():
+    """{state, district, pincode} picked through a search link, cleared from the URL once read."""
+    params = {name: st.query_params[name] for name in SEARCH_PARAMS if name in st.query_params}
+    for name in params:
+        del st.query_params[name]
+    return params
@@ -0,0 +1,61 @@
+# utils/spatial.py
+import numpy as np
+import pandas as pd
+
+BINS_TABLE = "district_bins"
+# Map detail levels: hexagon size (center to corner, in degrees of latitude) for the binned ones.
+# 'District' plots one point per district.
+HEX_SIZES = {
+    'Country': 1.5,
+    'Region': 0.6,
+}
+DISTRICT_DETAIL = 'District'
+MAP_DETAILS = list(HEX_SIZES) + [DISTRICT_DETAIL]
+MID_LATITUDE = 22.0 # Longitude degrees are scaled by cos(22°) so hexagons are not stretched east-west over India
+BIN_COLUMNS = ['District_id', 'Detail', 'Bin_q', 'Bin_r', 'Bin_lat', 'Bin_lon']
+
+
+def hex_bins(lat, lon, size):
+    """Pointy-top hexagon (axial q, r) containing each point, and the hexagon centers as (q, r, lat, lon) arrays."""
+    scale = np.cos(np.radians(MID_LATITUDE))
+    x = np.asarray(lon, dtype=float) * scale
+    y = np.asarray(lat, dtype=float)
+    q = (np.sqrt(3) / 3 * x - y / 3) / size
+    r = (2 / 3 * y) / size
+    s = -q - r
+    # Cube rounding: round all three coordinates, then recompute the one that moved the most
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    fix_q = (dq > dr) & (dq > ds)
+    fix_r = ~fix_q & (dr > ds)
+    rq = np.where(fix_q, -rr - rs, rq)
+    rr = np.where(fix_r, -rq - rs, rr)
+    center_x = size * (np.sqrt(3) * rq + np.sqrt(3) / 2 * rr)
+    center_y = size * 1.5 * rr
+    return rq.astype(int), rr.astype(int), center_y, center_x / scale
+
+
+def build_district_bins(resolution):
+    """Hexagon of every resolved district at each binned map detail, as BIN_COLUMNS rows for BINS_TABLE."""
+    districts = resolution.dropna(subset=['District_id', 'lat', 'lon']).drop_duplicates(subset=['District_id'])
+    if districts.empty:
+        return pd.DataFrame(columns=BIN_COLUMNS)
+    parts = []
+    for detail, size in HEX_SIZES.items():
+        q, r, lat, lon = hex_bins(districts['lat'], districts['lon'], size)
+        parts.append(pd.DataFrame({
+            'District_id': districts['District_id'].astype(int).to_numpy(),
+            'Detail': detail,
+            'Bin_q': q,
+            'Bin_r': r,
+            'Bin_lat': np.round(lat, 6),
+            'Bin_lon': np.round(lon, 6),
+        }))
+    return pd.concat(parts, ignore_index=True)
+
+
+def binned_query(table, sums, detail, where, having=None):
+    """SQL summing a map_* table per hexagon of one detail level, with the hexagon center as lat/lon."""
+    return (f"SELECT b.Bin_lat as lat, b.Bin_lon as lon, COUNT(DISTINCT m.District_id) as Districts, {sums} "
+            f"FROM {table} m JOIN {BINS_TABLE} b ON b.District_id = m.District_id AND b.Detail = '{detail}' "
+            f"WHERE {where} GROUP BY b.Bin_q, b.Bin_r, b.Bin_lat, b.Bin_lon{f' HAVING {having}' if having else ''}")
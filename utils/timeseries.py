@@ -0,0 +1,163 @@
+# utils/timeseries.py
+import numpy as np
+import pandas as pd
+import streamlit as st
+import mysql.connector
+
+from utils.db import run_query
+from utils.frames import optimize_dtypes
+
+# Dataset label: (table, {metric label: column})
+TREND_DATASETS = {
+    'Transactions': ('map_transaction', {'Transaction Count': 'Transaction_count', 'Transaction Amount': 'Transaction_amount'}),
+    'Users': ('map_user', {'Registered Users': 'RegisteredUsers', 'App Opens': 'AppOpens'}),
+    'Insurance': ('map_insurance', {'Policy Count': 'Count', 'Premium Amount': 'Amount'}),
+}
+LEVELS = ('District', 'State')
+ROLLING_QUARTERS = 4 # Rolling averages and the trailing-year totals behind CAGR
+# Growth measure: description shown next to rankings
+GROWTH_MEASURES = {
+    'CAGR': "Compound annual growth of trailing 4-quarter totals, first full year to latest",
+    'YoY': "Latest quarter vs. the same quarter a year earlier",
+    'QoQ': "Latest quarter vs. the previous quarter",
+}
+
+
+def _growth(values, lag):
+    """values[:, t] / values[:, t - lag] - 1, NaN where either side is missing or the base is not positive."""
+    growth = np.full(values.shape, np.nan)
+    if values.shape[1] > lag:
+        base, current = values[:, :-lag], values[:, lag:]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            growth[:, lag:] = np.where(base > 0, current / base - 1, np.nan)
+    return growth
+
+
+def _rolling(values, window, func=np.mean):
+    """Trailing window statistic along the period axis; NaN until a full window of data is available."""
+    result = np.full(values.shape, np.nan)
+    if values.shape[1] >= window:
+        result[:, window - 1:] = func(np.lib.stride_tricks.sliding_window_view(values, window, axis=1), axis=2)
+    return result
+
+
+def _last_valid(values):
+    """Each row's last finite value (NaN for rows with none)."""
+    finite = np.isfinite(values)
+    last = values.shape[1] - 1 - finite[:, ::-1].argmax(axis=1)
+    return np.where(finite.any(axis=1), values[np.arange(len(values)), last], np.nan)
+
+
+def log_values(values):
+    """log1p of a matrix's values, with zeros before an entity's first positive quarter treated as missing."""
+    y = np.log1p(np.clip(values, 0, None))
+    started = np.maximum.accumulate(np.nan_to_num(values) > 0, axis=1)
+    return np.where(started, y, np.nan)
+
+
+class TrendMatrix:
+    """Dense entity x quarter matrix of one metric, with growth measures computed for every entity at once."""
+
+    def __init__(self, entities, periods, values):
+        self.entities = entities.reset_index(drop=True)
+        self.periods = periods
+        self.values = values
+        self.labels = [f"{year}-Q{quarter}" for year, quarter in periods]
+        self.qoq = _growth(values, 1)
+        self.yoy = _growth(values, 4)
+        self.rolling = _rolling(values, ROLLING_QUARTERS)
+        self.cagr = self._cagr()
+        self._rows = {key: i for i, key in enumerate(self.entities.itertuples(index=False, name=None))}
+
+    @classmethod
+    def from_frame(cls, df, keys, value):
+        """Builds the matrix from long rows (keys..., Year, Quarter, value); repeated keys are summed."""
+        if df.empty:
+            return cls(pd.DataFrame(columns=keys), [], np.empty((0, 0)))
+        period_index = df['Year'].astype(int) * 4 + df['Quarter'].astype(int) - 1
+        first, last = int(period_index.min()), int(period_index.max())
+        periods = [(p // 4, p % 4 + 1) for p in range(first, last + 1)]
+        grouped = df.assign(_period=period_index - first).groupby(keys + ['_period'], observed=True)[value].sum(min_count=1)
+        entity_index = grouped.index.droplevel('_period').unique().sort_values()
+        values = np.full((len(entity_index), len(periods)), np.nan)
+        rows = entity_index.get_indexer(grouped.index.droplevel('_period'))
+        values[rows, grouped.index.get_level_values('_period')] = grouped.to_numpy(dtype=float)
+        return cls(entity_index.to_frame(index=False).astype(str), periods, values)
+
+    def rollup(self, key):
+        """Matrix summed to one key column (e.g. District -> State); a quarter is NaN only if every row is."""
+        groups = self.entities[key].to_numpy()
+        order = np.argsort(groups, kind='stable')
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(groups) else np.array([], dtype=int)
+        values = self.values[order]
+        sums = np.add.reduceat(np.nan_to_num(values), starts, axis=0) if len(starts) else np.empty((0, len(self.periods)))
+        counts = np.add.reduceat(np.isfinite(values).astype(int), starts, axis=0) if len(starts) else sums
+        sums[counts == 0] = np.nan
+        return TrendMatrix(pd.DataFrame({key: sorted_groups[starts]}), self.periods, sums)
+
+    def _cagr(self):
+        """Annualised growth between the first and the latest full trailing-year totals."""
+        yearly = _rolling(self.values, ROLLING_QUARTERS, np.sum)
+        valid = np.isfinite(yearly) & (yearly > 0)
+        if not valid.size:
+            return np.full(len(self.values), np.nan)
+        first = valid.argmax(axis=1)
+        last = valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+        rows = np.arange(len(yearly))
+        span_years = (last - first) / 4
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cagr = (yearly[rows, last] / yearly[rows, first]) ** (1 / span_years) - 1
+        return np.where(valid.any(axis=1) & (span_years >= 1), cagr, np.nan)
+
+    def row(self, *key):
+        """Row index of one entity, or None if it is unknown."""
+        return self._rows.get(tuple(str(k) for k in key))
+
+    def series(self, *key):
+        """Period-level frame for one entity (Period, Value, Rolling, QoQ, YoY), or None if it is unknown."""
+        row = self.row(*key)
+        if row is None:
+            return None
+        return pd.DataFrame({
+            'Year': [year for year, _ in self.periods], 'Quarter': [quarter for _, quarter in self.periods],
+            'Period': self.labels, 'Value': self.values[row], 'Rolling': self.rolling[row],
+            'QoQ': self.qoq[row], 'YoY': self.yoy[row],
+        }).dropna(subset=['Value']).reset_index(drop=True)
+
+    def cagr_of(self, *key):
+        """CAGR of one entity (NaN if unknown or without two full years of history)."""
+        row = self.row(*key)
+        return self.cagr[row] if row is not None else np.nan
+
+    def growth_table(self, measure):
+        """Every entity with its latest value and the growth measure ('CAGR', 'YoY' or 'QoQ')."""
+        growth = {'CAGR': self.cagr, 'YoY': _last_valid(self.yoy), 'QoQ': _last_valid(self.qoq)}[measure]
+        table = self.entities.copy()
+        table['Latest'] = _last_valid(self.values)
+        table['Growth'] = growth
+        return table
+
+    def ranking(self, measure, n=10, min_percentile=0):
+        """The n entities growing fastest by the measure, ignoring latest values below the given percentile."""
+        table = self.growth_table(measure)
+        floor = np.nanpercentile(table['Latest'], min_percentile) if min_percentile and table['Latest'].notna().any() else -np.inf
+        table = table[np.isfinite(table['Growth']) & (table['Latest'] >= floor)]
+        return table.sort_values('Growth', ascending=False).head(n).reset_index(drop=True)
+
+
+def trend_query(table, column):
+    return (f"SELECT State, District, Year, Quarter, SUM({column}) as Value FROM {table} "
+            f"GROUP BY State, District, Year, Quarter")
+
+
+@st.cache_resource(ttl=3600, show_spinner="Building trend matrix...", max_entries=32)
+def load_trend_matrices(table, column, data_version):
+    """{'District': TrendMatrix, 'State': TrendMatrix} of one metric, built once per process and data version."""
+    try:
+        df = optimize_dtypes(run_query(trend_query(table, column)))
+    except (mysql.connector.Error, pd.errors.DatabaseError) as err:
+        st.error(f"Database Error: {err}")
+        df = pd.DataFrame(columns=['State', 'District', 'Year', 'Quarter', 'Value'])
+    districts = TrendMatrix.from_frame(df, ['State', 'District'], 'Value')
+    return {'District': districts, 'State': districts.rollup('State')}
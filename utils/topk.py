@@ -0,0 +1,159 @@
+# utils/topk.py
+"""Top-K index: every leaderboard the pages show, precomputed by the ETL so a page reads it by key."""
+import numpy as np
+import pandas as pd
+
+TOPK_TABLE = "topk_index"
+TOP_K = 10
+ALL = 0 # Year / Quarter of the all-time and whole-year rows
+COUNTRY = '' # Scope of the country-wide rows (other rows are scoped to a state)
+# Source table: (entity column, metrics ranked). District tables are ranked at State level too.
+LEADERBOARDS = {
+    'aggregated_transaction': ('State', ['Transaction_count', 'Transaction_amount']),
+    'map_transaction': ('District', ['Transaction_count', 'Transaction_amount']),
+    'top_transaction': ('Pincode', ['Transaction_count', 'Transaction_amount']),
+    'map_user': ('District', ['RegisteredUsers', 'AppOpens']),
+    'top_user': ('Pincode', ['RegisteredUsers']),
+    'map_insurance': ('District', ['Count', 'Amount']),
+    'top_insurance': ('Pincode', ['Count', 'Amount']),
+}
+TOPK_COLUMNS = ['Dataset', 'Level', 'Metric', 'Scope', 'Year', 'Quarter', 'Position', 'Previous_position', 'State', 'Entity', 'Value']
+
+
+def cube_query(table):
+    entity, metrics = LEADERBOARDS[table]
+    keys = 'State' if entity == 'State' else f"State, {entity}"
+    sums = ', '.join(f"SUM({metric}) as {metric}" for metric in metrics)
+    return f"SELECT {keys}, Year, Quarter, {sums} FROM {table} GROUP BY {keys}, Year, Quarter"
+
+
+def topk_query(table, level, metric, year=None, quarter='All', state='All', value_as='Value'):
+    """The stored leaderboard for one period and scope, best first (year=None: all time; state='All': country)."""
+    scope = COUNTRY if state == 'All' else str(state).replace("'", "''")
+    year = ALL if year is None else int(year)
+    quarter = ALL if quarter == 'All' else int(quarter)
+    columns = f"Entity as {level}" if level == 'State' else f"State, Entity as {level}"
+    return (f"SELECT Position, Previous_position, {columns}, Value as {value_as} FROM {TOPK_TABLE} "
+            f"WHERE Dataset = '{table}' AND Level = '{level}' AND Metric = '{metric}' AND Scope = '{scope}' "
+            f"AND Year = {year} AND Quarter = {quarter} ORDER BY Position")
+
+
+def rank_movement(df):
+    """'▲2', '▼1', '=' per row of a topk_query frame ('' where the entity had no previous rank)."""
+    change = df['Previous_position'] - df['Position']
+    return np.where(change.isna(), '', np.where(change > 0, '▲' + change.abs().fillna(0).astype(int).astype(str),
+                                                 np.where(change < 0, '▼' + change.abs().fillna(0).astype(int).astype(str), '=')))
+
+
+def _slots(periods):
+    """(year, quarter), summed cube column and previous column (-1 for none) of every leaderboard slot."""
+    years = sorted({year for year, _ in periods})
+    slots = list(periods) + [(year, ALL) for year in years] + [(ALL, ALL)]
+    position = {slot: i for i, slot in enumerate(slots)}
+    previous = []
+    for year, quarter in slots:
+        if year == ALL:
+            previous.append(-1)
+        elif quarter == ALL:
+            previous.append(position.get((year - 1, ALL), -1))
+        else:
+            previous.append(position.get((year, quarter - 1) if quarter > 1 else (year - 1, 4), -1))
+    return np.array(slots), np.array(previous)
+
+
+def _cube(frame, keys, metrics):
+    """(entities, slots, previous, {metric: entity x slot matrix}); NaN where an entity has no data."""
+    groups = frame.groupby(keys, observed=True, sort=True)
+    codes = groups.ngroup().to_numpy()
+    period_index = frame['Year'].to_numpy(dtype=int) * 4 + frame['Quarter'].to_numpy(dtype=int) - 1
+    quarter_codes, quarter_index = np.unique(period_index, return_inverse=True)
+    periods = [(p // 4, p % 4 + 1) for p in quarter_codes]
+    slots, previous = _slots(periods)
+    year_of = np.array([year for year, _ in periods])
+    year_column = len(periods) + np.searchsorted(np.unique(year_of), year_of) # Year column of each quarter column
+    cube = {}
+    for metric in metrics:
+        quarters = np.full((groups.ngroups, len(periods)), np.nan)
+        quarters[codes, quarter_index] = frame[metric].to_numpy(dtype=float)
+        known = np.isfinite(quarters)
+        totals = np.zeros((groups.ngroups, len(slots)))
+        counts = np.zeros((groups.ngroups, len(slots)), dtype=int)
+        totals[:, :len(periods)], counts[:, :len(periods)] = np.nan_to_num(quarters), known
+        for column in np.unique(year_column): # A handful of years
+            in_year = year_column == column
+            totals[:, column] = np.nan_to_num(quarters[:, in_year]).sum(axis=1)
+            counts[:, column] = known[:, in_year].sum(axis=1)
+        totals[:, -1], counts[:, -1] = np.nan_to_num(quarters).sum(axis=1), known.sum(axis=1)
+        cube[metric] = np.where(counts > 0, totals, np.nan)
+    return groups.size().index.to_frame(index=False).astype(str), slots, previous, cube
+
+
+def _state_rollup(entities, cube):
+    """The cube summed from districts to states (entities are sorted by State, so states are contiguous)."""
+    states = entities['State'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, states[1:] != states[:-1]])
+    rolled = {}
+    for metric, matrix in cube.items():
+        sums = np.add.reduceat(np.nan_to_num(matrix), starts, axis=0)
+        counts = np.add.reduceat(np.isfinite(matrix).astype(int), starts, axis=0)
+        rolled[metric] = np.where(counts > 0, sums, np.nan)
+    return pd.DataFrame({'State': states[starts]}), rolled
+
+
+def top_k(matrix, previous, k=TOP_K):
+    """(rows, values, previous ranks) of the k largest entities of every column, best first."""
+    filled = np.where(np.isfinite(matrix), matrix, -np.inf)
+    n = len(filled)
+    k = min(k, n)
+    rows = np.argpartition(-filled, k - 1, axis=0)[:k] if n > k else np.tile(np.arange(n)[:, None], (1, filled.shape[1]))
+    values = np.take_along_axis(filled, rows, axis=0)
+    order = np.argsort(-values, axis=0, kind='stable')
+    rows, values = np.take_along_axis(rows, order, axis=0), np.take_along_axis(values, order, axis=0)
+    # Rank in the previous column: 1 + entities with a larger value there (no sort of the whole column)
+    before = np.where(previous >= 0, filled[:, np.maximum(previous, 0)], -np.inf)
+    own = np.take_along_axis(before, rows, axis=0)
+    previous_rank = 1 + (before[None, :, :] > own[:, None, :]).sum(axis=1)
+    return rows, values, np.where(np.isfinite(own), previous_rank, np.nan)
+
+
+def _leaderboard_rows(states, names, slots, previous, cube, table, level, scope):
+    """TOPK_COLUMNS arrays of the leaderboards of one scope, for every metric and period."""
+    parts = []
+    for metric, matrix in cube.items():
+        rows, values, previous_rank = top_k(matrix, previous)
+        valid = np.isfinite(values)
+        position = np.broadcast_to(np.arange(1, len(rows) + 1)[:, None], rows.shape)[valid]
+        picked, picked_slots = rows[valid], slots[np.nonzero(valid)[1]]
+        labels = np.array([table, level, metric, scope], dtype=object)
+        parts.append({
+            **dict(zip(TOPK_COLUMNS[:4], np.broadcast_to(labels[:, None], (4, len(picked))))),
+            'Year': picked_slots[:, 0], 'Quarter': picked_slots[:, 1], 'Position': position,
+            'Previous_position': previous_rank[valid], 'State': states[picked], 'Entity': names[picked], 'Value': values[valid],
+        })
+    return parts
+
+
+def build_topk_rows(frames):
+    """TOPK_COLUMNS rows from {table: cube_query frame}, country-wide and per state."""
+    parts = []
+    for table, frame in frames.items():
+        if frame.empty:
+            continue
+        entity, metrics = LEADERBOARDS[table]
+        keys = ['State'] if entity == 'State' else ['State', entity]
+        entities, slots, previous, cube = _cube(frame, keys, metrics)
+        states, names = entities['State'].to_numpy(), entities[entity].to_numpy()
+        parts += _leaderboard_rows(states, names, slots, previous, cube, table, entity, COUNTRY)
+        if entity == 'State':
+            continue
+        if entity == 'District':
+            state_entities, state_cube = _state_rollup(entities, cube)
+            state_names = state_entities['State'].to_numpy()
+            parts += _leaderboard_rows(state_names, state_names, slots, previous, state_cube, table, 'State', COUNTRY)
+        starts = np.flatnonzero(np.r_[True, states[1:] != states[:-1]]) # Entities are sorted by State
+        for start, end in zip(starts, np.r_[starts[1:], len(states)]):
+            parts += _leaderboard_rows(states[start:end], names[start:end], slots, previous,
+                                       {metric: matrix[start:end] for metric, matrix in cube.items()}, table, entity, states[start])
+    if not parts:
+        return pd.DataFrame(columns=TOPK_COLUMNS)
+    return pd.DataFrame({column: np.concatenate([part[column] for part in parts]) for column in TOPK_COLUMNS})